@@ -0,0 +1,349 @@
+"""
+Solver benchmark: generate timetables for synthetic schools and record
+wall time, success rate, search effort, peak memory and DB round trips.
+
+Usage (from the repository root, with the shared package installed):
+
+    python benchmarks/solver_benchmark.py --scenario small medium --output bench.json
+    python benchmarks/solver_benchmark.py --scenario medium --compare bench.json
+
+By default every scenario runs in a private in-memory SQLite database, so
+nothing touches the configured Postgres. `--database-url` points the run at a
+scratch database instead (its tables are dropped and recreated!), which is
+what to use when DB round trips are the thing being measured.
+
+Each (scenario, strategy, mode) group regenerates the school `--repeats`
+times; a job is one call of the generator, i.e. one class in per_class mode
+and all classes at once in school mode. Peak memory is taken from a second,
+identical run of the job under tracemalloc, so tracing does not distort the
+timings; pass --no-memory to skip it.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+
+# timetable_shared.db builds its engine from DATABASE_URL at import time;
+# the benchmark uses its own engine, so only make that import side-effect free.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from timetable_shared.db import Base
+from timetable_shared.models import TimetableEntry
+from timetable_shared.services.timetable_generator import (
+    STRATEGIES,
+    generate_timetable_for_class,
+    generate_timetables_for_school,
+)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from synthetic_school import SchoolSpec, build_synthetic_school  # noqa: E402
+
+MODES = ("per_class", "school")
+
+SCENARIOS: dict[str, SchoolSpec] = {
+    "small": SchoolSpec(classes=4, rooms=5, teacher_unavailability=0.05, tightness=0.2),
+    "medium": SchoolSpec(classes=12, rooms=12, teacher_unavailability=0.1, tightness=0.3),
+    "large": SchoolSpec(classes=30, rooms=28, teacher_unavailability=0.15, tightness=0.4),
+    "tight": SchoolSpec(classes=8, rooms=8, teacher_unavailability=0.25, tightness=0.9, teacher_load=28),
+    "secondary": SchoolSpec(classes=12, rooms=12, subjects=16, periods_per_day=9, teacher_load=26),
+}
+
+
+class StatementCounter:
+    """Counts SQL statements sent on an engine (one per cursor execute)."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+def _make_engine(database_url: str | None):
+    if database_url:
+        return create_engine(database_url, future=True)
+    return create_engine(
+        "sqlite://",
+        future=True,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+
+def _run_job(SessionFactory, mode: str, class_ids: list[int], **kwargs) -> tuple[bool, str | None, dict]:
+    """One generator call in a fresh session. Returns (ok, error, stats)."""
+    stats: dict = {}
+    db = SessionFactory()
+    try:
+        if mode == "school":
+            generate_timetables_for_school(db, class_ids, stats=stats, **kwargs)
+        else:
+            generate_timetable_for_class(db, class_ids[0], stats=stats, **kwargs)
+        return True, None, stats
+    except ValueError as e:
+        db.rollback()
+        return False, str(e), stats
+    finally:
+        db.close()
+
+
+def _clear_entries(SessionFactory) -> None:
+    db = SessionFactory()
+    try:
+        db.query(TimetableEntry).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_scenario(name: str, spec: SchoolSpec, args) -> list[dict]:
+    engine = _make_engine(args.database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    SessionFactory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    db = SessionFactory()
+    school = build_synthetic_school(db, spec)
+    db.close()
+    counter = StatementCounter(engine)
+
+    results = []
+    for strategy in args.strategy:
+        for mode in args.mode:
+            for repeat in range(args.repeats):
+                _clear_entries(SessionFactory)
+                jobs = [school.class_ids] if mode == "school" else [[cid] for cid in school.class_ids]
+                for class_ids in jobs:
+                    kwargs = dict(
+                        max_same_subject_per_day=spec.max_same_subject_per_day,
+                        seed=args.seed + repeat,
+                        strategy=strategy,
+                        optimize_seconds=args.optimize_seconds,
+                        workers=args.workers,
+                    )
+                    counter.count = 0
+                    started = time.perf_counter()
+                    ok, error, stats = _run_job(SessionFactory, mode, class_ids, **kwargs)
+                    seconds = time.perf_counter() - started
+                    statements = counter.count
+
+                    peak_kib = None
+                    if not args.no_memory:
+                        tracemalloc.start()
+                        _run_job(SessionFactory, mode, class_ids, **kwargs)
+                        peak_kib = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+                        tracemalloc.stop()
+
+                    results.append(
+                        {
+                            "scenario": name,
+                            "strategy": strategy,
+                            "mode": mode,
+                            "repeat": repeat,
+                            "class_ids": class_ids,
+                            "ok": ok,
+                            "error": error,
+                            "seconds": round(seconds, 6),
+                            "db_statements": statements,
+                            "attempts": stats.get("attempts", 0),
+                            "search_steps": stats.get("search_steps", 0),
+                            "backtracks": stats.get("backtracks", 0),
+                            "joint_restarts": stats.get("joint_restarts", 0),
+                            "room_fallbacks": stats.get("room_fallbacks", 0),
+                            "peak_kib": peak_kib,
+                        }
+                    )
+    engine.dispose()
+    return results
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(results: list[dict]) -> list[dict]:
+    groups: dict[tuple[str, str, str], list[dict]] = {}
+    for r in results:
+        groups.setdefault((r["scenario"], r["strategy"], r["mode"]), []).append(r)
+
+    summary = []
+    for (scenario, strategy, mode), rows in groups.items():
+        seconds = [r["seconds"] for r in rows]
+        peaks = [r["peak_kib"] for r in rows if r["peak_kib"] is not None]
+        summary.append(
+            {
+                "scenario": scenario,
+                "strategy": strategy,
+                "mode": mode,
+                "jobs": len(rows),
+                "success_rate": round(sum(r["ok"] for r in rows) / len(rows), 4),
+                "total_seconds": round(sum(seconds), 6),
+                "mean_seconds": round(statistics.fmean(seconds), 6),
+                "p50_seconds": round(_percentile(seconds, 0.5), 6),
+                "p95_seconds": round(_percentile(seconds, 0.95), 6),
+                "max_seconds": round(max(seconds), 6),
+                "mean_db_statements": round(statistics.fmean(r["db_statements"] for r in rows), 2),
+                "mean_attempts": round(statistics.fmean(r["attempts"] for r in rows), 2),
+                "mean_backtracks": round(statistics.fmean(r["backtracks"] for r in rows), 2),
+                "max_peak_kib": max(peaks) if peaks else None,
+            }
+        )
+    return summary
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(summary: list[dict], baseline_path: str, max_slowdown: float | None) -> bool:
+    """Print current/baseline ratios per group. Returns False if a group regressed past `max_slowdown`."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {
+            (g["scenario"], g["strategy"], g["mode"]): g for g in json.load(f)["summary"]
+        }
+    ok = True
+    print(f"\nCompared with {baseline_path} (current / baseline):")
+    for g in summary:
+        key = (g["scenario"], g["strategy"], g["mode"])
+        base = baseline.get(key)
+        if base is None:
+            print(f"  {'/'.join(key):40s} (not in baseline)")
+            continue
+
+        def ratio(field):
+            return g[field] / base[field] if base[field] else float("nan")
+
+        slowdown = ratio("p50_seconds")
+        print(
+            f"  {'/'.join(key):40s} p50 x{slowdown:.2f}  p95 x{ratio('p95_seconds'):.2f}"
+            f"  statements x{ratio('mean_db_statements'):.2f}"
+            f"  success {base['success_rate']:.0%} -> {g['success_rate']:.0%}"
+        )
+        if max_slowdown is not None and (
+            slowdown > max_slowdown or g["success_rate"] < base["success_rate"]
+        ):
+            ok = False
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", nargs="+", default=["small", "medium"], choices=sorted(SCENARIOS))
+    parser.add_argument("--strategy", nargs="+", default=list(STRATEGIES), choices=STRATEGIES)
+    parser.add_argument("--mode", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1, help="solver seed of the first repeat")
+    parser.add_argument("--optimize-seconds", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc re-run")
+    parser.add_argument("--database-url", help="scratch database to use instead of in-memory SQLite")
+    # Overrides applied to every selected scenario
+    parser.add_argument("--classes", type=int)
+    parser.add_argument("--rooms", type=int)
+    parser.add_argument("--subjects", type=int)
+    parser.add_argument("--teacher-load", type=int)
+    parser.add_argument("--teacher-unavailability", type=float)
+    parser.add_argument("--room-unavailability", type=float)
+    parser.add_argument("--tightness", type=float)
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--periods-per-day", type=int)
+    parser.add_argument("--school-seed", type=int, help="seed of the synthetic school")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--max-slowdown", type=float, help="with --compare: exit 1 if a group's p50 grows past this factor")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    overrides = {
+        field: getattr(args, field)
+        for field in (
+            "classes",
+            "rooms",
+            "subjects",
+            "teacher_load",
+            "teacher_unavailability",
+            "room_unavailability",
+            "tightness",
+            "days",
+            "periods_per_day",
+        )
+        if getattr(args, field) is not None
+    }
+    if args.school_seed is not None:
+        overrides["seed"] = args.school_seed
+
+    specs = {name: replace(SCENARIOS[name], **overrides) for name in args.scenario}
+    results = []
+    for name, spec in specs.items():
+        print(f"[bench] scenario {name}: {spec.as_dict()}", file=sys.stderr)
+        results.extend(run_scenario(name, spec, args))
+
+    summary = summarize(results)
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "sqlite-memory" if not args.database_url else args.database_url.split("://")[0],
+            "repeats": args.repeats,
+            "seed": args.seed,
+            "optimize_seconds": args.optimize_seconds,
+            "workers": args.workers,
+            "scenarios": {name: spec.as_dict() for name, spec in specs.items()},
+        },
+        "summary": summary,
+        "results": results,
+    }
+
+    for g in summary:
+        print(
+            f"[bench] {g['scenario']}/{g['strategy']}/{g['mode']}: "
+            f"{g['success_rate']:.0%} ok, p50 {g['p50_seconds'] * 1000:.1f} ms, "
+            f"p95 {g['p95_seconds'] * 1000:.1f} ms, {g['mean_db_statements']:.0f} statements/job, "
+            f"peak {g['max_peak_kib']} KiB",
+            file=sys.stderr,
+        )
+
+    data = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+
+    if args.compare:
+        return 0 if compare(summary, args.compare, args.max_slowdown) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+Synthetic school generator for solver benchmarks.
+
+Builds a complete, reproducible school (timeslots, subjects, classes,
+curricula, teachers, students, rooms, availability) into an empty database
+from a handful of knobs, so that solver changes can be measured on inputs of
+known size and difficulty instead of on whatever the demo seed contains.
+
+Difficulty knobs:
+- teacher_unavailability / room_unavailability: fraction of the weekly slots
+  blocked for every teacher / room (random, per seed);
+- tightness (0..1): how concentrated the weekly hours are on a few
+  subjects. At 0 hours are spread evenly; at 1 the heaviest subjects sit at
+  the per-day cap on every day, which leaves the solver little slack;
+- teacher_load: target hours per teacher; lower values mean more teachers
+  and fewer cross-class teacher clashes;
+- days / periods_per_day: shape of the (single) timeslot grid, e.g. 5 x 9
+  for a secondary school or 6 days with Saturday slots.
+"""
+from __future__ import annotations
+
+import math
+import random
+from dataclasses import asdict, dataclass, field
+
+from sqlalchemy.orm import Session
+
+from timetable_shared.models import (
+    Curriculum,
+    Room,
+    RoomAvailability,
+    SchoolClass,
+    Subject,
+    SubjectTeacher,
+    TeacherAvailability,
+    TimeSlot,
+    UserProfile,
+)
+
+# (short_code, name); SPORT must stay the code the snapshot loader looks for
+SUBJECT_CATALOG = [
+    ("RO", "Limba romana"),
+    ("MAT", "Matematica"),
+    ("ENG", "Limba engleza"),
+    ("FIZ", "Fizica"),
+    ("CH", "Chimie"),
+    ("BIO", "Biologie"),
+    ("IST", "Istorie"),
+    ("GEO", "Geografie"),
+    ("INFO", "Informatica"),
+    ("FR", "Limba franceza"),
+    ("SPORT", "Educatie fizica"),
+    ("REL", "Religie"),
+    ("DIR", "Dirigentie"),
+    ("ART", "Educatie plastica"),
+    ("MUZ", "Educatie muzicala"),
+    ("LAT", "Limba latina"),
+    ("ECO", "Economie"),
+    ("FIL", "Filosofie"),
+]
+
+
+@dataclass
+class SchoolSpec:
+    classes: int = 4
+    subjects: int = 13
+    students_per_class: int = 25
+    rooms: int = 6
+    teacher_load: int = 22
+    teacher_unavailability: float = 0.1
+    room_unavailability: float = 0.05
+    tightness: float = 0.3
+    max_same_subject_per_day: int = 2
+    days: int = 5
+    periods_per_day: int = 7
+    seed: int = 1
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class SyntheticSchool:
+    spec: SchoolSpec
+    class_ids: list[int] = field(default_factory=list)
+    teacher_ids: list[int] = field(default_factory=list)
+    room_ids: list[int] = field(default_factory=list)
+    # subject short_code -> hours per week (same for every class)
+    hours: dict[str, int] = field(default_factory=dict)
+
+
+def curriculum_hours(subjects: int, tightness: float, *, cap: int, days: int = 5, periods_per_day: int = 7) -> list[int]:
+    """
+    Split days*periods_per_day hours over `subjects` subjects, heaviest first.
+    Every subject gets at least one hour and at most `cap` per day.
+    """
+    total = days * periods_per_day
+    max_hours = cap * days
+    if not 1 <= subjects <= len(SUBJECT_CATALOG):
+        raise ValueError(f"subjects must be between 1 and {len(SUBJECT_CATALOG)}")
+    if subjects * max_hours < total:
+        raise ValueError(f"{subjects} subjects cannot fill {total} hours with at most {cap} per day")
+
+    alpha = 3.0 * max(0.0, min(1.0, tightness))
+    weights = [1.0 / (i + 1) ** alpha for i in range(subjects)]
+    hours = [1] * subjects
+    spare = total - subjects
+    # Largest-remainder apportionment of the hours left after the minimum
+    wsum = sum(weights)
+    shares = [spare * w / wsum for w in weights]
+    for i, share in enumerate(shares):
+        hours[i] += int(share)
+    rest = total - sum(hours)
+    for i in sorted(range(subjects), key=lambda i: shares[i] - int(shares[i]), reverse=True)[:rest]:
+        hours[i] += 1
+
+    # Clamp to the per-week maximum, pushing the overflow to lighter subjects
+    overflow = 0
+    for i in range(subjects):
+        if hours[i] > max_hours:
+            overflow += hours[i] - max_hours
+            hours[i] = max_hours
+    i = 0
+    while overflow:
+        if hours[i % subjects] < max_hours:
+            hours[i % subjects] += 1
+            overflow -= 1
+        i += 1
+    return hours
+
+
+def _blocked_slots(rng: random.Random, spec: SchoolSpec, fraction: float) -> list[tuple[int, int]]:
+    slots = [(d, p) for d in range(spec.days) for p in range(1, spec.periods_per_day + 1)]
+    return rng.sample(slots, round(len(slots) * max(0.0, min(1.0, fraction))))
+
+
+def build_synthetic_school(db: Session, spec: SchoolSpec) -> SyntheticSchool:
+    """Populate an empty database with the school described by `spec` and commit."""
+    rng = random.Random(spec.seed)
+    school = SyntheticSchool(spec=spec)
+
+    db.add_all(
+        TimeSlot(weekday=d, index_in_day=p)
+        for d in range(spec.days)
+        for p in range(1, spec.periods_per_day + 1)
+    )
+
+    catalog = SUBJECT_CATALOG[: spec.subjects]
+    # Keep SPORT in the school even with few subjects (it has its own room rules)
+    if all(code != "SPORT" for code, _ in catalog):
+        catalog = catalog[:-1] + [("SPORT", "Educatie fizica")]
+    hours = curriculum_hours(
+        len(catalog),
+        spec.tightness,
+        cap=spec.max_same_subject_per_day,
+        days=spec.days,
+        periods_per_day=spec.periods_per_day,
+    )
+    subjects = [Subject(name=name, short_code=code) for code, name in catalog]
+    db.add_all(subjects)
+    db.flush()
+    school.hours = {code: h for (code, _), h in zip(catalog, hours)}
+
+    # Teachers per subject proportional to the subject's load across classes
+    next_teacher = 1
+    teachers_of: list[list[int]] = []
+    for h in hours:
+        load = h * spec.classes
+        count = max(1, math.ceil(load / max(1, spec.teacher_load)))
+        teachers_of.append(list(range(next_teacher, next_teacher + count)))
+        next_teacher += count
+    school.teacher_ids = list(range(1, next_teacher))
+    db.add_all(
+        UserProfile(username=f"bench_prof{t:04d}", teacher_id=t) for t in school.teacher_ids
+    )
+
+    for k in range(spec.classes):
+        school_class = SchoolClass(name=f"B{k + 1:03d}")
+        db.add(school_class)
+        db.flush()
+        school.class_ids.append(school_class.id)
+        for s, (subject, h) in enumerate(zip(subjects, hours)):
+            teacher_id = teachers_of[s][k % len(teachers_of[s])]
+            curriculum = Curriculum(
+                class_id=school_class.id,
+                subject_id=subject.id,
+                hours_per_week=h,
+                teacher_id=teacher_id,
+            )
+            db.add(curriculum)
+            db.flush()
+            db.add(SubjectTeacher(curriculum_id=curriculum.id, teacher_id=teacher_id))
+        db.add_all(
+            UserProfile(username=f"bench_s{k + 1:03d}_{i:02d}", class_id=school_class.id)
+            for i in range(spec.students_per_class)
+        )
+
+    rooms = [
+        Room(name=f"Sala {100 + r + 1}", capacity=spec.students_per_class + rng.randint(0, 8))
+        for r in range(spec.rooms)
+    ]
+    rooms.append(Room(name="Sala Sport", capacity=max(50, spec.students_per_class)))
+    db.add_all(rooms)
+    db.flush()
+    school.room_ids = [r.id for r in rooms]
+
+    for t in school.teacher_ids:
+        db.add_all(
+            TeacherAvailability(teacher_id=t, weekday=d, index_in_day=p, available=False)
+            for d, p in _blocked_slots(rng, spec, spec.teacher_unavailability)
+        )
+    for room_id in school.room_ids:
+        db.add_all(
+            RoomAvailability(room_id=room_id, weekday=d, index_in_day=p, available=False)
+            for d, p in _blocked_slots(rng, spec, spec.room_unavailability)
+        )
+
+    db.commit()
+    return school
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from "react";
 import { apiGet, apiPost } from "../services/apiService";
 
-const WEEKDAY = ["Luni", "Marți", "Miercuri", "Joi", "Vineri"];
+const WEEKDAY = ["Luni", "Marți", "Miercuri", "Joi", "Vineri", "Sâmbătă", "Duminică"];
 
 export default function AvailabilityScreen({ accessToken }) {
   const [tab, setTab] = useState("teacher"); // teacher | room
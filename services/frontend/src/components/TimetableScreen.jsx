@@ -1,16 +1,15 @@
 import React, { useEffect, useMemo, useState } from "react";
 import { apiGet, apiPatch, apiDelete } from "../services/apiService";
 
-const WEEKDAY = ["Luni", "Marți", "Miercuri", "Joi", "Vineri"];
-const TIME_LABELS = {
-  1: "13:00–14:00",
-  2: "14:00–15:00",
-  3: "15:00–16:00",
-  4: "16:00–17:00",
-  5: "17:00–18:00",
-  6: "18:00–19:00",
-  7: "19:00–20:00",
-};
+const WEEKDAY = ["Luni", "Marți", "Miercuri", "Joi", "Vineri", "Sâmbătă", "Duminică"];
+// Periods 1..12 (longest supported grid), one hour each from 13:00
+const TIME_LABELS = Object.fromEntries(
+  Array.from({ length: 12 }, (_, i) => {
+    const h = (13 + i) % 24;
+    const pad = (n) => String(n).padStart(2, "0");
+    return [i + 1, `${pad(h)}:00–${pad((h + 1) % 24)}:00`];
+  })
+);
 
 const POLL_MS = 8000;
 
@@ -519,7 +518,8 @@ export default function TimetableScreen({ accessToken, roles, mode }) {
 
           const maxIdx = Math.max(7, ...entries.map((e) => e.index_in_day || 0));
           const rows = Array.from({ length: maxIdx }, (_, i) => i + 1);
-          const weekdays = [0, 1, 2, 3, 4];
+          const maxDay = Math.max(4, ...entries.map((e) => e.weekday || 0));
+          const weekdays = Array.from({ length: maxDay + 1 }, (_, i) => i);
 
           return (
             <div className="tableWrap">
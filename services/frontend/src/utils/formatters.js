@@ -3,7 +3,7 @@ export function formatTimetable(entries) {
     return '<p class="hint">Nu există intrări în orar.</p>';
   }
   
-  const days = ['Luni', 'Marți', 'Miercuri', 'Joi', 'Vineri'];
+  const days = ['Luni', 'Marți', 'Miercuri', 'Joi', 'Vineri', 'Sâmbătă', 'Duminică'];
   const timetable = {};
   
   entries.forEach(e => {
@@ -18,17 +18,21 @@ export function formatTimetable(entries) {
     };
   });
   
+  // Grids may have Saturday slots or more than 7 periods
+  const dayCount = Math.max(5, ...entries.map(e => (e.weekday ?? e.timeslot_weekday ?? 0) + 1));
+  const hourCount = Math.max(7, ...entries.map(e => e.index_in_day ?? e.timeslot_index ?? 1));
+
   let html = '<div class="timetable-container">';
   html += '<table class="timetable-table">';
   html += '<thead><tr><th>Ora</th>';
-  for (let d = 0; d < 5; d++) {
+  for (let d = 0; d < dayCount; d++) {
     html += `<th>${days[d]}</th>`;
   }
   html += '</tr></thead><tbody>';
   
-  for (let hour = 1; hour <= 7; hour++) {
+  for (let hour = 1; hour <= hourCount; hour++) {
     html += `<tr><td class="hour-label">${hour}</td>`;
-    for (let d = 0; d < 5; d++) {
+    for (let d = 0; d < dayCount; d++) {
       const entry = timetable[d]?.[hour];
       if (entry) {
         html += `<td class="timetable-cell">
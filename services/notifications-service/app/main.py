@@ -32,6 +32,9 @@ def process_notification_event(event_type: str, event_data: dict, db_session):
             
             if class_id:
                 message = f"Orarul pentru {class_name} a fost generat/actualizat."
+                changed_entries = event_data.get("changed_entries")
+                if changed_entries:
+                    message = f"Orarul pentru {class_name} a fost generat/actualizat ({changed_entries} ore modificate)."
                 notifications_service.send_to_class(db_session, class_id, message)
                 print(f"[Notifications] Sent notification to class {class_id}")
         
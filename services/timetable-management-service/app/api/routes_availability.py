@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import List
+import logging
+from typing import Dict, List
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, ConfigDict, Field
@@ -16,6 +17,18 @@ from app.models import (
     UserProfile,
     Room,
 )
+from app.services.availability_masks import (
+    MAX_DAYS_PER_WEEK,
+    MAX_PERIODS_PER_DAY,
+    get_availability_masks,
+    invalidate_availability_masks,
+)
+from app.services.timetable_repair import (
+    REPAIR_FAILED,
+    classes_affected_by_room,
+    classes_affected_by_teacher,
+    repair_or_regenerate,
+)
 
 router = APIRouter(
     prefix="",
@@ -23,6 +36,30 @@ router = APIRouter(
 )
 
 
+def _repair_timetables(db: Session, class_ids: list[int], current_user) -> dict[int, str] | None:
+    """
+    Re-solve only the timetable cells invalidated by an availability change
+    (entries keep their ids; only classes with changed entries are notified).
+    Classes that cannot be repaired, or whose teachers a running generation
+    holds, get a regular generation job instead.
+    Returns class_id -> status ("repaired", "unchanged", "queued", "failed",
+    "curriculum_incomplete").
+    """
+    if not class_ids:
+        return None
+    try:
+        return repair_or_regenerate(
+            db,
+            class_ids,
+            username=current_user.get("preferred_username", "sistem"),
+            availability=get_availability_masks(db),
+        )
+    except Exception:
+        db.rollback()
+        logging.exception(f"Timetable repair failed for classes {class_ids}")
+        return {cid: REPAIR_FAILED for cid in class_ids}
+
+
 # =====================
 # Schemas (Pydantic)
 # =====================
@@ -33,13 +70,15 @@ class TeacherAvailabilityRead(BaseModel):
     weekday: int
     index_in_day: int
     available: bool
+    # class_id -> repair status of the stored timetables the change affected
+    timetable_repair: Dict[int, str] | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class TeacherAvailabilityCreate(BaseModel):
-    weekday: int = Field(..., ge=0, le=4)
-    index_in_day: int = Field(..., ge=1, le=7)
+    weekday: int = Field(..., ge=0, le=MAX_DAYS_PER_WEEK - 1)
+    index_in_day: int = Field(..., ge=1, le=MAX_PERIODS_PER_DAY)
     available: bool = True
 
 
@@ -53,13 +92,15 @@ class RoomAvailabilityRead(BaseModel):
     weekday: int
     index_in_day: int
     available: bool
+    # class_id -> repair status of the stored timetables the change affected
+    timetable_repair: Dict[int, str] | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class RoomAvailabilityCreate(BaseModel):
-    weekday: int = Field(..., ge=0, le=4)
-    index_in_day: int = Field(..., ge=1, le=7)
+    weekday: int = Field(..., ge=0, le=MAX_DAYS_PER_WEEK - 1)
+    index_in_day: int = Field(..., ge=1, le=MAX_PERIODS_PER_DAY)
     available: bool = True
 
 
@@ -121,15 +162,19 @@ def create_teacher_availability(
     )
     db.add(availability)
     try:
+        invalidate_availability_masks(db)
         db.commit()
         db.refresh(availability)
-        return availability
     except IntegrityError:
         db.rollback()
         raise HTTPException(
             status_code=400,
             detail="Availability entry already exists for this teacher, weekday, and time slot"
         )
+    repair = None
+    if not availability.available:
+        repair = _repair_timetables(db, classes_affected_by_teacher(db, teacher_id), current_user)
+    return TeacherAvailabilityRead.model_validate(availability).model_copy(update={"timetable_repair": repair})
 
 
 @router.put("/teachers/{teacher_id}/availability/{availability_id}", response_model=TeacherAvailabilityRead)
@@ -161,9 +206,13 @@ def update_teacher_availability(
             raise HTTPException(status_code=403, detail="Can only modify own availability")
 
     availability.available = availability_in.available
+    invalidate_availability_masks(db)
     db.commit()
     db.refresh(availability)
-    return availability
+    repair = None
+    if not availability.available:
+        repair = _repair_timetables(db, classes_affected_by_teacher(db, teacher_id), current_user)
+    return TeacherAvailabilityRead.model_validate(availability).model_copy(update={"timetable_repair": repair})
 
 
 @router.delete("/teachers/{teacher_id}/availability/{availability_id}")
@@ -194,6 +243,7 @@ def delete_teacher_availability(
             raise HTTPException(status_code=403, detail="Can only modify own availability")
 
     db.delete(availability)
+    invalidate_availability_masks(db)
     db.commit()
     return {"detail": "Teacher availability deleted"}
 
@@ -242,15 +292,19 @@ def create_room_availability(
     )
     db.add(availability)
     try:
+        invalidate_availability_masks(db)
         db.commit()
         db.refresh(availability)
-        return availability
     except IntegrityError:
         db.rollback()
         raise HTTPException(
             status_code=400,
             detail="Availability entry already exists for this room, weekday, and time slot"
         )
+    repair = None
+    if not availability.available:
+        repair = _repair_timetables(db, classes_affected_by_room(db, room_id), current_user)
+    return RoomAvailabilityRead.model_validate(availability).model_copy(update={"timetable_repair": repair})
 
 
 @router.put("/rooms/{room_id}/availability/{availability_id}", response_model=RoomAvailabilityRead)
@@ -274,9 +328,13 @@ def update_room_availability(
         raise HTTPException(status_code=404, detail="Availability entry not found")
 
     availability.available = availability_in.available
+    invalidate_availability_masks(db)
     db.commit()
     db.refresh(availability)
-    return availability
+    repair = None
+    if not availability.available:
+        repair = _repair_timetables(db, classes_affected_by_room(db, room_id), current_user)
+    return RoomAvailabilityRead.model_validate(availability).model_copy(update={"timetable_repair": repair})
 
 
 @router.delete("/rooms/{room_id}/availability/{availability_id}")
@@ -299,5 +357,6 @@ def delete_room_availability(
         raise HTTPException(status_code=404, detail="Availability entry not found")
 
     db.delete(availability)
+    invalidate_availability_masks(db)
     db.commit()
     return {"detail": "Room availability deleted"}
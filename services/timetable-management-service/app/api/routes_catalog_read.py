@@ -1,4 +1,5 @@
-from typing import List
+import logging
+from typing import Dict, List
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, ConfigDict, Field
@@ -8,7 +9,18 @@ from sqlalchemy.exc import IntegrityError
 from app.core.rbac import require_roles
 from app.core.security import verify_token
 from app.db import get_db
-from app.models import SchoolClass, Subject, TimeSlot, Curriculum, UserProfile, SubjectTeacher
+from app.models import (
+    DEFAULT_TIMESLOT_GRID,
+    SchoolClass,
+    Subject,
+    TimeSlot,
+    TimetableEntry,
+    Curriculum,
+    UserProfile,
+    SubjectTeacher,
+)
+from app.services.availability_masks import MAX_DAYS_PER_WEEK, MAX_PERIODS_PER_DAY
+from app.services.timetable_repair import REPAIR_FAILED, repair_or_regenerate
 
 
 router = APIRouter(
@@ -17,21 +29,44 @@ router = APIRouter(
 )
 
 
+def _repair_class_timetable(db: Session, class_id: int, current_user) -> str | None:
+    """
+    Re-solve only the cells of the class's timetable that a curriculum change
+    invalidated; if that is not possible a regular generation job is queued.
+    Returns the status ("repaired", "unchanged", "queued", "failed", or
+    "curriculum_incomplete" while the hours do not fill the grid), or None
+    when the class has no stored timetable.
+    """
+    try:
+        statuses = repair_or_regenerate(
+            db, [class_id], username=current_user.get("preferred_username", "sistem")
+        )
+    except Exception:
+        db.rollback()
+        logging.exception(f"Timetable repair failed for class {class_id}")
+        return REPAIR_FAILED
+    return statuses.get(class_id)
+
+
 # ========= Classes =========
 
 class SchoolClassRead(BaseModel):
     id: int
     name: str
+    timeslot_grid: str = DEFAULT_TIMESLOT_GRID
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class SchoolClassCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=50)
+    timeslot_grid: str = Field(DEFAULT_TIMESLOT_GRID, min_length=1, max_length=50)
 
 
 class SchoolClassUpdate(BaseModel):
     name: str = Field(..., min_length=1, max_length=50)
+    # Changing the grid drops the class's timetable (its slots belong to the old grid)
+    timeslot_grid: str | None = Field(None, min_length=1, max_length=50)
 
 
 # ========= Subjects =========
@@ -67,6 +102,8 @@ class CurriculumRead(BaseModel):
     hours_per_week: int
     teacher_id: int | None = None  # Legacy, kept for backward compatibility
     teachers: List[TeacherInfo] = []  # List of 1-2 teachers via SubjectTeacher
+    # Repair status of the class's stored timetable after a write (see _repair_class_timetable)
+    timetable_repair: str | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -89,12 +126,24 @@ class CurriculumUpdate(BaseModel):
 
 class TimeSlotRead(BaseModel):
     id: int
+    grid: str = DEFAULT_TIMESLOT_GRID
     weekday: int
     index_in_day: int
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class TimeSlotGridDefine(BaseModel):
+    weekdays: List[int] = Field(default_factory=lambda: [0, 1, 2, 3, 4], min_length=1)
+    periods_per_day: int = Field(7, ge=1, le=MAX_PERIODS_PER_DAY)
+    # Optional per-day override, e.g. {5: 4} for a short Saturday
+    periods_by_weekday: Dict[int, int] | None = None
+
+
+def _grid_exists(db: Session, grid: str) -> bool:
+    return db.query(TimeSlot.id).filter(TimeSlot.grid == grid).first() is not None
+
+
 @router.get("/classes", response_model=List[SchoolClassRead])
 def list_classes(
     db: Session = Depends(get_db),
@@ -113,11 +162,64 @@ def list_subjects(
 
 @router.get("/timeslots", response_model=List[TimeSlotRead])
 def list_timeslots(
+    grid: str | None = Query(None, description="Only slots of this grid"),
     db: Session = Depends(get_db),
     current_user=Depends(verify_token),
 ):
+    query = db.query(TimeSlot)
+    if grid is not None:
+        query = query.filter(TimeSlot.grid == grid)
+    return query.order_by(TimeSlot.grid, TimeSlot.weekday, TimeSlot.index_in_day).all()
+
+
+@router.put("/timeslots/grids/{grid}", response_model=List[TimeSlotRead])
+def define_timeslot_grid(
+    grid: str,
+    grid_in: TimeSlotGridDefine,
+    db: Session = Depends(get_db),
+    current_user=Depends(require_roles(["secretariat", "admin", "sysadmin"])),
+):
+    """
+    Create or reshape a timeslot grid (e.g. 8-9 periods or Saturday slots).
+    Missing slots are added; slots outside the new shape are removed unless
+    a timetable entry still uses them.
+    """
+    if not 1 <= len(grid) <= 50:
+        raise HTTPException(status_code=400, detail="Grid name must have 1..50 characters")
+    periods = {}
+    for weekday in grid_in.weekdays:
+        count = (grid_in.periods_by_weekday or {}).get(weekday, grid_in.periods_per_day)
+        if not 0 <= weekday < MAX_DAYS_PER_WEEK:
+            raise HTTPException(status_code=400, detail=f"Weekday must be 0..{MAX_DAYS_PER_WEEK - 1}")
+        if not 1 <= count <= MAX_PERIODS_PER_DAY:
+            raise HTTPException(status_code=400, detail=f"Periods per day must be 1..{MAX_PERIODS_PER_DAY}")
+        periods[weekday] = count
+    wanted = {(d, i) for d, count in periods.items() for i in range(1, count + 1)}
+
+    existing = db.query(TimeSlot).filter(TimeSlot.grid == grid).all()
+    extra = [ts for ts in existing if (ts.weekday, ts.index_in_day) not in wanted]
+    if extra:
+        in_use = (
+            db.query(TimetableEntry.id)
+            .filter(TimetableEntry.timeslot_id.in_([ts.id for ts in extra]))
+            .first()
+        )
+        if in_use:
+            raise HTTPException(
+                status_code=409,
+                detail="Timetable entries still use slots outside the new grid; regenerate or delete them first",
+            )
+        for ts in extra:
+            db.delete(ts)
+
+    have = {(ts.weekday, ts.index_in_day) for ts in existing}
+    db.add_all(
+        TimeSlot(grid=grid, weekday=d, index_in_day=i) for d, i in sorted(wanted - have)
+    )
+    db.commit()
     return (
         db.query(TimeSlot)
+        .filter(TimeSlot.grid == grid)
         .order_by(TimeSlot.weekday, TimeSlot.index_in_day)
         .all()
     )
@@ -131,7 +233,9 @@ def create_class(
     db: Session = Depends(get_db),
     current_user=Depends(require_roles(["secretariat", "admin", "sysadmin"])),
 ):
-    school_class = SchoolClass(name=class_in.name)
+    if not _grid_exists(db, class_in.timeslot_grid):
+        raise HTTPException(status_code=400, detail=f"Timeslot grid '{class_in.timeslot_grid}' does not exist")
+    school_class = SchoolClass(name=class_in.name, timeslot_grid=class_in.timeslot_grid)
     db.add(school_class)
     try:
         db.commit()
@@ -154,6 +258,11 @@ def update_class(
         raise HTTPException(status_code=404, detail="Class not found")
 
     school_class.name = class_in.name
+    if class_in.timeslot_grid and class_in.timeslot_grid != school_class.timeslot_grid:
+        if not _grid_exists(db, class_in.timeslot_grid):
+            raise HTTPException(status_code=400, detail=f"Timeslot grid '{class_in.timeslot_grid}' does not exist")
+        db.query(TimetableEntry).filter(TimetableEntry.class_id == class_id).delete(synchronize_session=False)
+        school_class.timeslot_grid = class_in.timeslot_grid
     try:
         db.commit()
         db.refresh(school_class)
@@ -319,10 +428,11 @@ def create_curriculum(
     try:
         db.commit()
         db.refresh(curriculum)
-        return _curriculum_to_read_model(curriculum, db)
     except IntegrityError:
         db.rollback()
         raise HTTPException(status_code=400, detail="Curriculum for this class and subject already exists")
+    repair = _repair_class_timetable(db, curriculum.class_id, current_user)
+    return _curriculum_to_read_model(curriculum, db).model_copy(update={"timetable_repair": repair})
 
 
 @router.put("/curricula/{curriculum_id}", response_model=CurriculumRead)
@@ -357,7 +467,11 @@ def update_curriculum(
     
     db.commit()
     db.refresh(curriculum)
-    return _curriculum_to_read_model(curriculum, db)
+    repair = None
+    # New hours change the counts; new teachers may be away or busy at the stored slots
+    if curriculum_in.hours_per_week is not None or curriculum_in.teacher_ids is not None:
+        repair = _repair_class_timetable(db, curriculum.class_id, current_user)
+    return _curriculum_to_read_model(curriculum, db).model_copy(update={"timetable_repair": repair})
 
 
 @router.delete("/curricula/{curriculum_id}")
@@ -370,9 +484,11 @@ def delete_curriculum(
     if not curriculum:
         raise HTTPException(status_code=404, detail="Curriculum not found")
 
+    class_id = curriculum.class_id
     db.delete(curriculum)
     db.commit()
-    return {"detail": "Curriculum deleted"}
+    repair = _repair_class_timetable(db, class_id, current_user)
+    return {"detail": "Curriculum deleted", "timetable_repair": repair}
 
 
 # ========= Curriculum Teachers Management =========
@@ -524,6 +640,8 @@ def assign_teacher_to_subject(
     curriculum.teacher_id = request.teacher_id
     db.commit()
     db.refresh(curriculum)
+    # The new teacher may be away or busy elsewhere at the stored slots
+    repair = _repair_class_timetable(db, curriculum.class_id, current_user)
 
     class_obj = db.query(SchoolClass).filter(SchoolClass.id == request.class_id).first()
     return {
@@ -535,6 +653,7 @@ def assign_teacher_to_subject(
         "subject_name": subject.name,
         "teacher_id": request.teacher_id,
         "teacher_username": teacher_profile.username,
+        "timetable_repair": repair,
     }
 
 
@@ -15,6 +15,7 @@ from app.api.routes_timetables import (
     GenerateRequest,
 )
 from app.services.timetable_generator import generate_timetable_for_class
+from app.services.availability_masks import get_availability_masks
 from app.models import SchoolClass, Subject, TimeSlot
 
 
@@ -41,7 +42,7 @@ def schedule_run_compat(
 
     results: list[TimetableEntryRead] = []
     for cid in class_ids:
-        entries = generate_timetable_for_class(db, cid)
+        entries = generate_timetable_for_class(db, cid, availability=get_availability_masks(db))
         results.extend([_to_read_model(db, e) for e in entries])
 
         # Send notification to class (same as in routes_timetables)
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import json
 import logging
-from typing import List
+import os
+from datetime import datetime
+from typing import List, Literal
 from collections import Counter
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy.orm import Session
 
 from app.core.rbac import require_roles
@@ -25,19 +28,20 @@ from app.models import (
     RoomAvailability,
     SubjectTeacher,
 )
-from app.services.timetable_generator import generate_timetable_for_class
+from app.services.timetable_generator import generate_timetable_for_class, supersede_older_jobs
+from app.services.availability_masks import MAX_PERIODS_PER_DAY, get_availability_masks
 from app.services import notifications as notifications_service
+from app.services.timetable_scoring import class_terms, load_timetable_array, timetable_terms
 
 # Constants for error messages
-WEEKDAY_NAMES = {0: "Luni", 1: "Marți", 2: "Miercuri", 3: "Joi", 4: "Vineri"}
+WEEKDAY_NAMES = {0: "Luni", 1: "Marți", 2: "Miercuri", 3: "Joi", 4: "Vineri", 5: "Sâmbătă", 6: "Duminică"}
+# One-hour periods from TIMETABLE_DAY_START_HOUR on, for every supported period (1..12)
+DAY_START_HOUR = int(os.getenv("TIMETABLE_DAY_START_HOUR", "13"))
+# Largest per-class request that goes to the interactive lane by default
+INTERACTIVE_MAX_CLASSES = int(os.getenv("INTERACTIVE_MAX_CLASSES", "3"))
 TIME_LABELS = {
-    1: "13:00–14:00",
-    2: "14:00–15:00",
-    3: "15:00–16:00",
-    4: "16:00–17:00",
-    5: "17:00–18:00",
-    6: "18:00–19:00",
-    7: "19:00–20:00",
+    i: f"{(DAY_START_HOUR + i - 1) % 24:02d}:00–{(DAY_START_HOUR + i) % 24:02d}:00"
+    for i in range(1, MAX_PERIODS_PER_DAY + 1)
 }
 
 router = APIRouter(prefix="/timetables", tags=["timetables"])
@@ -46,6 +50,18 @@ router = APIRouter(prefix="/timetables", tags=["timetables"])
 class GenerateRequest(BaseModel):
     class_id: int | None = None
     class_ids: list[int] | None = None
+    # "per_class": one independent job per class (default)
+    # "school": one joint solve over all given classes (all classes if none given)
+    mode: Literal["per_class", "school"] = "per_class"
+    # "random_restart": randomized greedy passes (default)
+    # "backtracking": complete search that reports why no timetable exists
+    strategy: Literal["random_restart", "backtracking"] = "random_restart"
+    # Wall-clock budget per job in seconds; the best timetable found by then is kept
+    # (worker default GENERATION_DEADLINE_SECONDS when omitted)
+    deadline_seconds: float | None = Field(None, gt=0, le=3600)
+    # Queue lane: "interactive" jumps ahead of bulk runs in the workers; when omitted,
+    # requests for up to INTERACTIVE_MAX_CLASSES classes (per_class mode) are interactive
+    priority: Literal["interactive", "bulk"] | None = None
 
 
 class TimetableEntryRead(BaseModel):
@@ -94,12 +110,22 @@ def generate_timetables(
         class_ids = list(body.class_ids)
     elif body.class_id is not None:
         class_ids = [body.class_id]
+    elif body.mode == "school":
+        class_ids = [c.id for c in db.query(SchoolClass).order_by(SchoolClass.id).all()]
     else:
         raise HTTPException(status_code=400, detail="Provide class_id or class_ids")
 
     from app.services import audit as audit_service
     
     username = current_user.get("preferred_username", "unknown")
+
+    lane = body.priority
+    if lane is None:
+        small = body.mode == "per_class" and len(class_ids) <= INTERACTIVE_MAX_CLASSES
+        lane = rabbitmq_client.LANE_INTERACTIVE if small else rabbitmq_client.LANE_BULK
+
+    if body.mode == "school":
+        return _queue_school_generation(db, class_ids, username, body.strategy, body.deadline_seconds, lane)
     
     job_ids: list[int] = []
     for cid in class_ids:
@@ -108,14 +134,15 @@ def generate_timetables(
         if not class_obj:
             raise HTTPException(status_code=404, detail=f"Class {cid} not found")
         
-        # Create job record
-        job = TimetableJob(class_id=cid, status="pending")
+        # Create job record (committed before publishing: the worker drops messages of unknown jobs)
+        job = TimetableJob(class_id=cid, status="pending", deadline_seconds=body.deadline_seconds)
         db.add(job)
-        db.flush()  # Get ID without committing
+        db.flush()  # Get ID before superseding
+        supersede_older_jobs(db, [job])
+        db.commit()
         
         # Publish to RabbitMQ
-        if rabbitmq_client.publish_timetable_generation_job(cid, job.id):
-            db.commit()
+        if rabbitmq_client.publish_timetable_generation_job(cid, job.id, body.strategy, lane=lane):
             job_ids.append(job.id)
             
             # Log action
@@ -128,10 +155,71 @@ def generate_timetables(
                 details=f"Queued generation for class {cid}",
             )
         else:
-            db.rollback()
+            _fail_unqueued_jobs(db, [job])
             raise HTTPException(status_code=500, detail="Failed to queue generation job")
 
-    return {"job_ids": job_ids, "message": "Timetable generation jobs queued"}
+    return {"job_ids": job_ids, "lane": lane, "message": "Timetable generation jobs queued"}
+
+
+def _fail_unqueued_jobs(db: Session, jobs: list[TimetableJob]) -> None:
+    """Fail committed jobs whose message could not be published."""
+    now = datetime.utcnow()
+    for job in jobs:
+        job.status = "failed"
+        job.error_message = "Failed to queue generation job"
+        job.completed_at = now
+    db.commit()
+
+
+def _queue_school_generation(
+    db: Session,
+    class_ids: list[int],
+    username: str,
+    strategy: str | None = None,
+    deadline_seconds: float | None = None,
+    lane: str = "bulk",
+) -> dict:
+    """
+    Create one job per class but publish a single message, so the scheduling
+    engine solves all classes together against shared teacher/room occupancy.
+    """
+    from app.services import rabbitmq_client
+    from app.services import audit as audit_service
+
+    class_ids = list(dict.fromkeys(class_ids))
+    if not class_ids:
+        raise HTTPException(status_code=400, detail="No classes to generate")
+
+    found = {c.id for c in db.query(SchoolClass).filter(SchoolClass.id.in_(class_ids)).all()}
+    for cid in class_ids:
+        if cid not in found:
+            raise HTTPException(status_code=404, detail=f"Class {cid} not found")
+
+    jobs = [
+        TimetableJob(class_id=cid, status="pending", deadline_seconds=deadline_seconds)
+        for cid in class_ids
+    ]
+    db.add_all(jobs)
+    db.flush()  # Get IDs before superseding
+    supersede_older_jobs(db, jobs)
+    db.commit()
+    job_ids = [job.id for job in jobs]
+
+    if not rabbitmq_client.publish_school_generation_job(class_ids, job_ids, strategy, lane=lane):
+        _fail_unqueued_jobs(db, jobs)
+        raise HTTPException(status_code=500, detail="Failed to queue generation job")
+
+    for cid, job_id in zip(class_ids, job_ids):
+        audit_service.log_action(
+            db,
+            username=username,
+            action="timetable_generation_queued",
+            resource_type="timetable",
+            resource_id=job_id,
+            details=f"Queued whole-school generation for class {cid}",
+        )
+
+    return {"job_ids": job_ids, "lane": lane, "message": "Whole-school timetable generation job queued"}
 
 
 @router.get("/classes/{class_id}", response_model=List[TimetableEntryRead])
@@ -157,6 +245,53 @@ def get_timetable_for_class(
     return result
 
 
+@router.post("/classes/{class_id}/repair", response_model=dict)
+def repair_timetable(
+    class_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(require_roles(["scheduler", "secretariat", "admin", "sysadmin"])),
+):
+    """
+    Repair the class's timetable in place: only entries that violate the current
+    availability/curriculum are re-solved, every other entry keeps its id and version.
+    """
+    from app.services.timetable_repair import TeachersBusy, notify_repaired, repair_timetable_for_class
+    from app.services import audit as audit_service
+
+    school_class = db.query(SchoolClass).filter(SchoolClass.id == class_id).first()
+    if not school_class:
+        raise HTTPException(status_code=404, detail="Class not found")
+
+    try:
+        result = repair_timetable_for_class(db, class_id, availability=get_availability_masks(db))
+    except TeachersBusy as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    username = current_user.get("preferred_username", "unknown")
+    if result.changed:
+        notify_repaired(db, {class_id: result}, username)
+        audit_service.log_action(
+            db,
+            username=username,
+            action="timetable_repaired",
+            resource_type="timetable",
+            resource_id=class_id,
+            details=f"Repaired {len(result.changed)} timetable entries for class {school_class.name}",
+        )
+
+    return {
+        "class_id": class_id,
+        "changed_entry_ids": [e.id for e in result.changed],
+        "unchanged": result.unchanged,
+        "scope": result.scope,
+        "conflicts": result.conflicts,
+    }
+
+
 @router.delete("/classes/{class_id}")
 def delete_timetable_for_class(
     class_id: int,
@@ -322,7 +457,7 @@ def update_timetable_entry(
             detail=f"Version mismatch. Expected {entry.version}, got {entry_in.version}. Entry may have been modified or deleted by another user."
         )
 
-    from app.models import Curriculum, TeacherAvailability, TimeSlot, SubjectTeacher
+    from app.models import Curriculum, TimeSlot, SubjectTeacher
     timeslot = db.query(TimeSlot).filter(TimeSlot.id == entry.timeslot_id).first()
     if timeslot:
         subject_id_to_check = entry_in.subject_id if entry_in.subject_id is not None else entry.subject_id
@@ -352,18 +487,11 @@ def update_timetable_entry(
                 teacher_ids.append(curriculum.teacher_id)
             
             # Check for conflicts for each teacher
+            masks = get_availability_masks(db)
+            same_moment_ids = _same_moment_slot_ids(db, timeslot)
             for teacher_id in teacher_ids:
-                # Check teacher availability
-                teacher_avail = (
-                    db.query(TeacherAvailability)
-                    .filter(
-                        TeacherAvailability.teacher_id == teacher_id,
-                        TeacherAvailability.weekday == timeslot.weekday,
-                        TeacherAvailability.index_in_day == timeslot.index_in_day,
-                    )
-                    .first()
-                )
-                if teacher_avail and not teacher_avail.available:
+                # Check teacher availability (bit test on the cached availability mask)
+                if not masks.is_teacher_available(teacher_id, timeslot.weekday, timeslot.index_in_day):
                     raise HTTPException(
                         status_code=400,
                         detail=f"Teacher is not available at this time slot (weekday {timeslot.weekday}, hour {timeslot.index_in_day})"
@@ -376,7 +504,7 @@ def update_timetable_entry(
                     .join(Curriculum, TimetableEntry.subject_id == Curriculum.subject_id)
                     .filter(
                         Curriculum.teacher_id == teacher_id,
-                        TimetableEntry.timeslot_id == entry.timeslot_id,
+                        TimetableEntry.timeslot_id.in_(same_moment_ids),
                         TimetableEntry.id != entry_id,
                     )
                     .all()
@@ -389,7 +517,7 @@ def update_timetable_entry(
                     .join(SubjectTeacher, SubjectTeacher.curriculum_id == Curriculum.id)
                     .filter(
                         SubjectTeacher.teacher_id == teacher_id,
-                        TimetableEntry.timeslot_id == entry.timeslot_id,
+                        TimetableEntry.timeslot_id.in_(same_moment_ids),
                         TimetableEntry.id != entry_id,
                     )
                     .all()
@@ -444,20 +572,12 @@ def update_timetable_entry(
                     detail=f"Room capacity ({room.capacity}) is insufficient for class size ({student_count} students)"
                 )
             
-            # Advanced validation: Check room availability
-            from app.models import RoomAvailability, TimeSlot
+            # Advanced validation: Check room availability (bit test on the cached availability mask)
+            from app.models import TimeSlot
             timeslot = db.query(TimeSlot).filter(TimeSlot.id == entry.timeslot_id).first()
             if timeslot:
-                room_avail = (
-                    db.query(RoomAvailability)
-                    .filter(
-                        RoomAvailability.room_id == entry_in.room_id,
-                        RoomAvailability.weekday == timeslot.weekday,
-                        RoomAvailability.index_in_day == timeslot.index_in_day,
-                    )
-                    .first()
-                )
-                if room_avail and not room_avail.available:
+                masks = get_availability_masks(db)
+                if not masks.is_room_available(entry_in.room_id, timeslot.weekday, timeslot.index_in_day):
                     raise HTTPException(
                         status_code=400,
                         detail=f"Room is not available at this time slot (weekday {timeslot.weekday}, hour {timeslot.index_in_day})"
@@ -468,7 +588,9 @@ def update_timetable_entry(
                 db.query(TimetableEntry)
                 .filter(
                     TimetableEntry.room_id == entry_in.room_id,
-                    TimetableEntry.timeslot_id == entry.timeslot_id,
+                    TimetableEntry.timeslot_id.in_(
+                        _same_moment_slot_ids(db, timeslot) if timeslot else [entry.timeslot_id]
+                    ),
                     TimetableEntry.id != entry_id,  # Exclude current entry
                 )
                 .first()
@@ -553,6 +675,20 @@ def get_job_status(
         "started_at": job.started_at.isoformat() if job.started_at else None,
         "completed_at": job.completed_at.isoformat() if job.completed_at else None,
         "error_message": job.error_message,
+        # Transient failures so far (the job is "retrying" until the worker gives up)
+        "failed_attempts": job.failed_attempts,
+        "score": job.score,
+        "cache_status": job.cache_status,
+        "deadline_seconds": job.deadline_seconds,
+        "deadline_reached": job.deadline_reached,
+        "progress": {
+            "attempts": job.progress_attempts,
+            "best_score": job.progress_best_score,
+            "elapsed_seconds": job.progress_elapsed,
+            "updated_at": job.progress_updated_at.isoformat() if job.progress_updated_at else None,
+        },
+        # Seconds per phase and search/DB counters (set when the generator finishes)
+        "metrics": json.loads(job.metrics) if job.metrics else None,
     }
 
 
@@ -600,10 +736,11 @@ def get_job_conflicts(
 
 @router.get("/stats")
 def get_timetable_stats(
+    max_same_subject_per_day: int = Query(2, ge=1),
     db: Session = Depends(get_db),
     current_user=Depends(verify_token),
 ):
-    """Get statistics about timetables."""
+    """Get statistics about timetables, including quality terms and constraint violations."""
     from collections import Counter
     from app.models import TimetableJob, ConflictReport, TimeSlot
     
@@ -635,12 +772,23 @@ def get_timetable_stats(
                 if room:
                     room_usage[room.name] += 1
     
+    # Quality of the stored timetables (vectorized over all classes at once)
+    timetables = load_timetable_array(db)
+    class_names = dict(db.query(SchoolClass.id, SchoolClass.name).all())
+    quality = timetable_terms(timetables, max_same_subject_per_day=max_same_subject_per_day)
+    quality_by_class = {
+        class_names.get(cid, f"clasa {cid}"): terms
+        for cid, terms in class_terms(timetables, max_same_subject_per_day=max_same_subject_per_day).items()
+    }
+
     return {
         "total_timetables_generated": total_generated,
         "total_conflicts": total_conflicts,
         "subject_distribution_by_day": dict(subject_distribution),
         "room_usage": dict(room_usage),
         "total_timetable_entries": len(entries),
+        "quality": quality,
+        "quality_by_class": quality_by_class,
     }
 
 
@@ -745,6 +893,17 @@ def _get_teacher_display_name(db: Session, teacher_profile: UserProfile) -> str:
     return display_name
 
 
+def _same_moment_slot_ids(db: Session, timeslot: TimeSlot) -> list[int]:
+    """Ids of the slots at the same weekday/hour in every timeslot grid (clashes span grids)."""
+    return [
+        ts_id
+        for (ts_id,) in db.query(TimeSlot.id).filter(
+            TimeSlot.weekday == timeslot.weekday,
+            TimeSlot.index_in_day == timeslot.index_in_day,
+        )
+    ]
+
+
 def _to_read_model(db: Session, entry: TimetableEntry) -> TimetableEntryRead:
     # Validare: entry trebuie sa aiba id
     if not entry or not hasattr(entry, 'id') or entry.id is None:
@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 
 from app.db import SessionLocal
 from app.models import (
+    DEFAULT_TIMESLOT_GRID,
     SchoolClass,
     Subject,
     TimeSlot,
@@ -45,12 +46,14 @@ def seed_demo_data():
             cls = _get_or_create(session, SchoolClass, name=name)
             classes.append(cls)
 
-        # Time slots: weekdays 0..4, index_in_day 1..7
+        # Time slots of the default grid: weekdays 0..4, index_in_day 1..7
+        # (other grids are defined via PUT /timeslots/grids/{grid})
         for weekday in range(5):
             for index_in_day in range(1, 8):
                 _get_or_create(
                     session,
                     TimeSlot,
+                    grid=DEFAULT_TIMESLOT_GRID,
                     weekday=weekday,
                     index_in_day=index_in_day,
                 )
@@ -222,11 +225,14 @@ def seed_demo_data():
 # app/init_db.py
 from app.db import Base, engine
 from app import models
+from timetable_shared.schema import upgrade_schema
 
 
 def init_db():
     print("Creating tables in database...")
     Base.metadata.create_all(bind=engine)
+    for statement in upgrade_schema(engine, Base.metadata):
+        print(f"Upgraded schema: {statement}")
     print("Done.")
 
 
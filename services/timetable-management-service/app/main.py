@@ -14,6 +14,7 @@ from app.api.routes_profiles import router as profiles_router
 from app.db import Base, engine
 from app import models  
 from app.init_db import seed_demo_data
+from timetable_shared.schema import upgrade_schema
 
 
 app = FastAPI()
@@ -31,6 +32,8 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup() -> None:
     Base.metadata.create_all(bind=engine)
+    # create_all does not alter existing tables: add the columns/constraints of newer versions
+    upgrade_schema(engine, Base.metadata)
     seed_demo_data()
 
 
@@ -9,11 +9,16 @@ from sqlalchemy import (
     ForeignKey,
     UniqueConstraint,
     DateTime,
+    Float,
+    Text,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db import Base
 
+# Name of the timeslot grid used by classes that do not pick another one
+DEFAULT_TIMESLOT_GRID = "standard"
+
 
 class Lesson(Base):
     __tablename__ = "lessons"
@@ -38,6 +43,8 @@ class SchoolClass(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), nullable=False, unique=True)  # ex: IX-A
+    # Which TimeSlot.grid the class is scheduled on (e.g. "standard", "liceu-8", "sambata")
+    timeslot_grid = Column(String(50), nullable=False, default=DEFAULT_TIMESLOT_GRID, server_default=DEFAULT_TIMESLOT_GRID)
 
     # relationships
     curricula = relationship("Curriculum", back_populates="school_class")
@@ -58,18 +65,24 @@ class Subject(Base):
 
 class TimeSlot(Base):
     """
-    Represents a position in the weekly grid: weekday + index_in_day (1..7).
+    Represents a position in a weekly grid: weekday + index_in_day.
+    Grids are named sets of slots (default 5 days x 7 periods); classes pick
+    theirs via SchoolClass.timeslot_grid, so e.g. high-school classes can have
+    8-9 periods or Saturday slots. The same (weekday, index_in_day) in two
+    grids is the same moment, which is how teacher/room clashes across grids
+    are detected.
     We keep it simple (no concrete clock times for now).
     """
 
     __tablename__ = "time_slots"
 
     id = Column(Integer, primary_key=True, index=True)
-    weekday = Column(SmallInteger, nullable=False)  # 0 = Monday ... 4 = Friday
-    index_in_day = Column(SmallInteger, nullable=False)  # 1..7
+    grid = Column(String(50), nullable=False, default=DEFAULT_TIMESLOT_GRID, server_default=DEFAULT_TIMESLOT_GRID, index=True)
+    weekday = Column(SmallInteger, nullable=False)  # 0 = Monday ... 6 = Sunday
+    index_in_day = Column(SmallInteger, nullable=False)  # 1..12
 
     __table_args__ = (
-        UniqueConstraint("weekday", "index_in_day", name="uq_timeslot_weekday_index"),
+        UniqueConstraint("grid", "weekday", "index_in_day", name="uq_timeslot_grid_weekday_index"),
     )
 
     timetable_entries = relationship("TimetableEntry", back_populates="time_slot")
@@ -185,17 +198,57 @@ class TimetableJob(Base):
     id = Column(Integer, primary_key=True, index=True)
     class_id = Column(Integer, ForeignKey("school_classes.id"), nullable=False)
     
-    status = Column(String(20), nullable=False, default="pending")  # pending, processing, completed, failed
+    status = Column(String(20), nullable=False, default="pending")  # pending, processing, retrying, completed, failed, superseded
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     
     error_message = Column(String(500), nullable=True)
+
+    # Deliveries of the job's message that failed for a transient reason (status retrying until
+    # the scheduling engine gives up and the job fails)
+    failed_attempts = Column(Integer, nullable=True)
+
+    # Weighted soft-constraint penalty of the generated timetable (lower is better)
+    score = Column(Float, nullable=True)
+
+    # Result cache outcome: "miss" (solved), "hit" (cached result persisted), "unchanged" (nothing written)
+    cache_status = Column(String(20), nullable=True)
+
+    # Wall-clock budget (seconds) for the solve; when it runs out the best timetable found so far is kept
+    deadline_seconds = Column(Float, nullable=True)
+    # True when the deadline cut the search or the optimization short
+    deadline_reached = Column(Boolean, nullable=True)
+
+    # Live progress, written at a throttled rate while the job is processing
+    progress_attempts = Column(Integer, nullable=True)
+    progress_best_score = Column(Float, nullable=True)
+    progress_elapsed = Column(Float, nullable=True)
+    progress_updated_at = Column(DateTime, nullable=True)
+
+    # JSON: seconds per phase (load, precheck, cache, search, rooms, optimize, persist)
+    # and counters (attempts, buffer_rotations, backtracks, db_statements, ...)
+    metrics = Column(Text, nullable=True)
     
     # Relationship
     school_class = relationship("SchoolClass")
 
 
+class GenerationCache(Base):
+    """
+    Results of previous solves keyed by a fingerprint of all solver inputs
+    (curriculum, availability, occupancy, seed, strategy, ...).
+    """
+    __tablename__ = "generation_cache"
+
+    fingerprint = Column(String(64), primary_key=True)  # sha256 hex
+    class_ids = Column(String(500), nullable=False)  # comma separated, for inspection
+    payload = Column(Text, nullable=False)  # JSON: assignments + conflicts
+    score = Column(Float, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=True)
+
+
 class AuditLog(Base):
     """
     Logs important actions for audit purposes.
@@ -246,6 +299,17 @@ class RoomAvailability(Base):
 
     room = relationship("Room")
 
+class AvailabilityVersion(Base):
+    """
+    Single-row counter bumped with every TeacherAvailability/RoomAvailability
+    write, so each process can tell whether its cached availability masks
+    are current.
+    """
+    __tablename__ = "availability_version"
+
+    id = Column(Integer, primary_key=True)  # always 1
+    version = Column(Integer, nullable=False, default=0)
+
 
 class ConflictReport(Base):
     """
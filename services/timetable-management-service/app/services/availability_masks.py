@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+# Re-export from shared package for backward compatibility
+from timetable_shared.services.availability_masks import (
+    MAX_DAYS_PER_WEEK,
+    MAX_PERIODS_PER_DAY,
+    AvailabilityMasks,
+    get_availability_masks,
+    invalidate_availability_masks,
+    slot_bit,
+)
+
+__all__ = [
+    'MAX_DAYS_PER_WEEK',
+    'MAX_PERIODS_PER_DAY',
+    'AvailabilityMasks',
+    'get_availability_masks',
+    'invalidate_availability_masks',
+    'slot_bit',
+]
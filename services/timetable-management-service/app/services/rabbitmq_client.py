@@ -2,9 +2,21 @@ from __future__ import annotations
 
 # Re-export from shared package for backward compatibility
 from timetable_shared.services.rabbitmq_client import (
+    GENERATION_QUEUES,
+    LANE_BULK,
+    LANE_INTERACTIVE,
     get_rabbitmq_url,
     publish_timetable_generation_job,
+    publish_school_generation_job,
     publish_notification_event,
 )
 
-__all__ = ['get_rabbitmq_url', 'publish_timetable_generation_job', 'publish_notification_event']
+__all__ = [
+    'GENERATION_QUEUES',
+    'LANE_BULK',
+    'LANE_INTERACTIVE',
+    'get_rabbitmq_url',
+    'publish_timetable_generation_job',
+    'publish_school_generation_job',
+    'publish_notification_event',
+]
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
 # Re-export from shared package for backward compatibility
-from timetable_shared.services.timetable_generator import generate_timetable_for_class
+from timetable_shared.services.timetable_generator import (
+    generate_timetable_for_class,
+    generate_timetables_for_school,
+    supersede_older_jobs,
+)
 
-__all__ = ['generate_timetable_for_class']
+__all__ = ['generate_timetable_for_class', 'generate_timetables_for_school', 'supersede_older_jobs']
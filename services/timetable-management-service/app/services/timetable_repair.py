@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+# Re-export from shared package for backward compatibility
+from timetable_shared.services.timetable_repair import (
+    REPAIR_CHANGED,
+    REPAIR_FAILED,
+    REPAIR_INCOMPLETE,
+    REPAIR_QUEUED,
+    REPAIR_UNCHANGED,
+    RepairResult,
+    TeachersBusy,
+    classes_affected_by_room,
+    classes_affected_by_teacher,
+    incomplete_curricula,
+    notify_repaired,
+    queue_generation_jobs,
+    repair_or_regenerate,
+    repair_timetable_for_class,
+    repair_timetables,
+)
+
+__all__ = [
+    'REPAIR_CHANGED',
+    'REPAIR_FAILED',
+    'REPAIR_INCOMPLETE',
+    'REPAIR_QUEUED',
+    'REPAIR_UNCHANGED',
+    'RepairResult',
+    'TeachersBusy',
+    'classes_affected_by_room',
+    'classes_affected_by_teacher',
+    'incomplete_curricula',
+    'notify_repaired',
+    'queue_generation_jobs',
+    'repair_or_regenerate',
+    'repair_timetable_for_class',
+    'repair_timetables',
+]
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+# Re-export from shared package for backward compatibility
+from timetable_shared.services.timetable_scoring import (
+    HARD_TERMS,
+    SOFT_TERMS,
+    class_terms,
+    load_timetable_array,
+    timetable_terms,
+)
+
+__all__ = [
+    'HARD_TERMS',
+    'SOFT_TERMS',
+    'class_terms',
+    'load_timetable_array',
+    'timetable_terms',
+]
@@ -13,4 +13,8 @@ setup(
         "psycopg2-binary>=2.9.0",
         "pika>=1.3.0",
     ],
+    extras_require={
+        # Vectorized timetable scoring (timetable_scoring); pure Python without it
+        "fast": ["numpy"],
+    },
 )
@@ -0,0 +1,90 @@
+"""
+Startup schema upgrade for databases created by an older version.
+
+The services create their tables with Base.metadata.create_all, which adds
+missing tables but never changes existing ones. upgrade_schema runs after it
+and brings an existing database up to the models:
+
+- every column of the models that the table lacks is added (ALTER TABLE ...
+  ADD COLUMN, with the column's server default, NOT NULL only when it has
+  one, and its index). This covers e.g. school_classes.timeslot_grid,
+  time_slots.grid and the progress/metrics columns of timetable_jobs;
+- time_slots: the unique constraint on (weekday, index_in_day) is replaced
+  by the per-grid one on (grid, weekday, index_in_day).
+
+Every step checks the current schema first, so running it on an up-to-date
+database does nothing. SQLite cannot drop constraints; development databases
+there are simply recreated.
+"""
+from __future__ import annotations
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Engine
+
+# Unique constraint of time_slots before timeslot grids existed
+_LEGACY_TIMESLOT_CONSTRAINT = "uq_timeslot_weekday_index"
+_TIMESLOT_CONSTRAINT = "uq_timeslot_grid_weekday_index"
+
+
+def _column_ddl(engine: Engine, column) -> str:
+    ddl = f"{column.name} {column.type.compile(dialect=engine.dialect)}"
+    default = column.server_default
+    if default is not None:
+        ddl += f" DEFAULT '{default.arg}'" if isinstance(default.arg, str) else f" DEFAULT {default.arg.text}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def _add_missing_columns(engine: Engine, metadata: MetaData) -> list[str]:
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    # Several replicas may start at once; PostgreSQL can skip a column another one just added
+    if_not_exists = "IF NOT EXISTS " if engine.dialect.name == "postgresql" else ""
+    statements = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            statements.append(
+                f"ALTER TABLE {table.name} ADD COLUMN {if_not_exists}{_column_ddl(engine, column)}"
+            )
+            if column.index:
+                statements.append(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ({column.name})"
+                )
+    return statements
+
+
+def _timeslot_constraint(engine: Engine) -> list[str]:
+    if engine.dialect.name != "postgresql" or not inspect(engine).has_table("time_slots"):
+        return []
+    names = {c["name"] for c in inspect(engine).get_unique_constraints("time_slots")}
+    statements = []
+    if _LEGACY_TIMESLOT_CONSTRAINT in names:
+        statements.append(f"ALTER TABLE time_slots DROP CONSTRAINT IF EXISTS {_LEGACY_TIMESLOT_CONSTRAINT}")
+    if _TIMESLOT_CONSTRAINT not in names:
+        statements.append(
+            f"ALTER TABLE time_slots ADD CONSTRAINT {_TIMESLOT_CONSTRAINT} UNIQUE (grid, weekday, index_in_day)"
+        )
+    return statements
+
+
+def upgrade_schema(engine: Engine, metadata: MetaData) -> list[str]:
+    """
+    Bring the existing tables of `metadata` up to date (call after
+    create_all). Returns the statements that were executed.
+    """
+    statements = _add_missing_columns(engine, metadata)
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    # After the columns: the new constraint needs time_slots.grid
+    constraint_statements = _timeslot_constraint(engine)
+    with engine.begin() as connection:
+        for statement in constraint_statements:
+            connection.execute(text(statement))
+    return statements + constraint_statements
@@ -0,0 +1,166 @@
+"""
+Compact availability model: one integer bitmask per teacher and per room.
+
+Bit `weekday * MAX_PERIODS_PER_DAY + (index_in_day - 1)` is set when the
+teacher/room is explicitly marked unavailable in that slot. A missing
+TeacherAvailability / RoomAvailability row means "available", so only
+`available=False` rows end up in a mask and an unknown id maps to 0 (always
+available).
+
+The bit layout is fixed for the largest supported grid (7 days x 12 periods),
+so masks stay comparable between timeslot grids of different shapes: the same
+(weekday, index_in_day) is the same bit in every grid.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from timetable_shared.models import AvailabilityVersion, TeacherAvailability, RoomAvailability
+
+# Largest grid a TimeSlot may belong to (weekday 0..6, index_in_day 1..12)
+MAX_PERIODS_PER_DAY = 12
+MAX_DAYS_PER_WEEK = 7
+
+_DAY_MASK = (1 << MAX_PERIODS_PER_DAY) - 1
+
+
+def slot_position(weekday: int, index_in_day: int) -> int:
+    """Dense index of a (weekday, index_in_day) position; also its bit number."""
+    return int(weekday) * MAX_PERIODS_PER_DAY + int(index_in_day) - 1
+
+
+def is_valid_slot(weekday: int, index_in_day: int) -> bool:
+    return 0 <= int(weekday) < MAX_DAYS_PER_WEEK and 1 <= int(index_in_day) <= MAX_PERIODS_PER_DAY
+
+
+def slot_bit(weekday: int, index_in_day: int) -> int:
+    """Bit for a (weekday, index_in_day) position in the weekly grid."""
+    return 1 << slot_position(weekday, index_in_day)
+
+
+def day_mask(weekday: int) -> int:
+    """All bits belonging to one weekday."""
+    return _DAY_MASK << (int(weekday) * MAX_PERIODS_PER_DAY)
+
+
+@dataclass
+class AvailabilityMasks:
+    teacher_blocked: dict[int, int] = field(default_factory=dict)
+    room_blocked: dict[int, int] = field(default_factory=dict)
+
+    def teacher_mask(self, teacher_ids: Iterable[int | None]) -> int:
+        """Union of blocked slots for a group of teachers (e.g. co-teachers)."""
+        mask = 0
+        for teacher_id in teacher_ids:
+            if teacher_id is not None:
+                mask |= self.teacher_blocked.get(int(teacher_id), 0)
+        return mask
+
+    def is_teacher_available(self, teacher_id: int | None, weekday: int, index_in_day: int) -> bool:
+        if teacher_id is None:
+            return True
+        return not self.teacher_blocked.get(int(teacher_id), 0) & slot_bit(weekday, index_in_day)
+
+    def is_room_available(self, room_id: int, weekday: int, index_in_day: int) -> bool:
+        return not self.room_blocked.get(int(room_id), 0) & slot_bit(weekday, index_in_day)
+
+    def is_teacher_blocked_all_day(self, teacher_id: int | None, weekday: int) -> bool:
+        """True when the teacher cannot teach at all on `weekday` (prunes the whole day)."""
+        if teacher_id is None:
+            return False
+        day = day_mask(weekday)
+        return self.teacher_blocked.get(int(teacher_id), 0) & day == day
+
+
+def build_availability_masks(
+    db: Session,
+    *,
+    teacher_ids: Iterable[int] | None = None,
+    room_ids: Iterable[int] | None = None,
+) -> AvailabilityMasks:
+    """Build masks with one query per table (optionally restricted to some ids)."""
+    teacher_query = (
+        db.query(
+            TeacherAvailability.teacher_id,
+            TeacherAvailability.weekday,
+            TeacherAvailability.index_in_day,
+        )
+        .filter(TeacherAvailability.available.is_(False))
+    )
+    if teacher_ids is not None:
+        teacher_ids = set(teacher_ids)
+        if not teacher_ids:
+            teacher_query = None
+        else:
+            teacher_query = teacher_query.filter(TeacherAvailability.teacher_id.in_(teacher_ids))
+
+    room_query = (
+        db.query(
+            RoomAvailability.room_id,
+            RoomAvailability.weekday,
+            RoomAvailability.index_in_day,
+        )
+        .filter(RoomAvailability.available.is_(False))
+    )
+    if room_ids is not None:
+        room_ids = set(room_ids)
+        if not room_ids:
+            room_query = None
+        else:
+            room_query = room_query.filter(RoomAvailability.room_id.in_(room_ids))
+
+    masks = AvailabilityMasks()
+    if teacher_query is not None:
+        for teacher_id, weekday, index_in_day in teacher_query.all():
+            tid = int(teacher_id)
+            masks.teacher_blocked[tid] = masks.teacher_blocked.get(tid, 0) | slot_bit(weekday, index_in_day)
+    if room_query is not None:
+        for room_id, weekday, index_in_day in room_query.all():
+            rid = int(room_id)
+            masks.room_blocked[rid] = masks.room_blocked.get(rid, 0) | slot_bit(weekday, index_in_day)
+    return masks
+
+
+# Process-wide cache: (engine, availability version, masks), rebuilt when the
+# stored version moves (see AvailabilityVersion)
+_cached_masks: tuple[Engine, int, AvailabilityMasks] | None = None
+_cache_lock = threading.Lock()
+
+
+def availability_version(db: Session) -> int:
+    """Current availability version (0 before the first write)."""
+    return db.query(AvailabilityVersion.version).filter(AvailabilityVersion.id == 1).scalar() or 0
+
+
+def get_availability_masks(db: Session) -> AvailabilityMasks:
+    """
+    Return the cached school-wide masks. Each call reads the availability
+    version (one primary-key lookup) and rebuilds the masks when it moved,
+    so writes committed by any process are seen.
+    """
+    global _cached_masks
+    engine = db.get_bind()
+    with _cache_lock:
+        version = availability_version(db)
+        if _cached_masks is None or _cached_masks[0] is not engine or _cached_masks[1] != version:
+            _cached_masks = (engine, version, build_availability_masks(db))
+        return _cached_masks[2]
+
+
+def invalidate_availability_masks(db: Session) -> None:
+    """
+    Bump the availability version in the caller's transaction; call with every
+    TeacherAvailability/RoomAvailability write, before committing it.
+    """
+    bumped = (
+        db.query(AvailabilityVersion)
+        .filter(AvailabilityVersion.id == 1)
+        .update({AvailabilityVersion.version: AvailabilityVersion.version + 1}, synchronize_session=False)
+    )
+    if not bumped:
+        db.add(AvailabilityVersion(id=1, version=1))
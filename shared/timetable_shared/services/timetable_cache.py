@@ -0,0 +1,170 @@
+"""
+Result cache for timetable generation, keyed by an input fingerprint.
+
+The fingerprint is a sha256 over a canonical JSON form of everything the
+solver reads (timeslots, curriculum, class size, candidate rooms, the
+availability masks of the involved teachers/rooms, occupancy by other classes)
+plus the solver parameters (strategy, seed, per-day cap, optimization budget,
+weights). Equal fingerprints therefore mean the solve would face exactly the
+same problem, and a stored result can be reused without searching again.
+Nothing has to be invalidated: any input change simply yields a new key.
+
+Keys of old inputs are never asked for again, so storing a result also
+prunes the table: entries not used for GENERATION_CACHE_TTL_DAYS go, and
+beyond GENERATION_CACHE_MAX_ENTRIES the least recently used ones go too
+(last use = last_hit_at, or created_at for an entry never hit).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from timetable_shared.models import GenerationCache
+from timetable_shared.services.timetable_snapshot import GenerationSnapshot, SchoolSnapshot
+
+# Bump when solver behaviour changes so that old results stop matching
+FINGERPRINT_VERSION = 2
+
+# Entries unused for this many days are dropped (0 = no age limit)
+CACHE_TTL_DAYS = float(os.getenv("GENERATION_CACHE_TTL_DAYS", "30"))
+# Entries kept at most, the most recently used first (0 = no limit)
+CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "1000"))
+
+# timeslot_id -> (subject_id, room_id | None)
+Assignment = dict[int, tuple[int, int | None]]
+
+
+def _sorted_sets(mapping: dict[int, set[int]]) -> list:
+    return sorted([k, sorted(v)] for k, v in mapping.items() if v)
+
+
+def _canonical_class(snapshot: GenerationSnapshot) -> dict:
+    teacher_ids = {c.teacher_id for c in snapshot.curriculum if c.teacher_id is not None}
+    room_ids = {r.id for r in snapshot.rooms}
+    masks = snapshot.availability
+    return {
+        "class_id": snapshot.class_id,
+        "timeslots": [[ts.id, ts.weekday, ts.index_in_day] for ts in snapshot.timeslots],
+        "curriculum": sorted([c.subject_id, c.hours_per_week, c.teacher_id] for c in snapshot.curriculum),
+        "students": snapshot.student_count,
+        "rooms": sorted([r.id, r.capacity] for r in snapshot.rooms),
+        "sport": [snapshot.sport_subject_id, snapshot.sport_room_id],
+        "teacher_blocked": sorted(
+            [t, masks.teacher_blocked[t]] for t in teacher_ids if masks.teacher_blocked.get(t)
+        ),
+        "room_blocked": sorted(
+            [r, masks.room_blocked[r]] for r in room_ids if masks.room_blocked.get(r)
+        ),
+        "occupied_rooms": _sorted_sets(snapshot.occupied_rooms),
+        "occupied_teachers": _sorted_sets(snapshot.occupied_teachers),
+        "room_usage": sorted([r, u] for r, u in snapshot.room_usage.items() if u),
+    }
+
+
+def generation_fingerprint(problem: GenerationSnapshot | SchoolSnapshot, **params) -> str:
+    """Stable hash of a class or school problem plus the solver parameters in `params`."""
+    if isinstance(problem, SchoolSnapshot):
+        classes = [_canonical_class(problem.classes[cid]) for cid in sorted(problem.classes)]
+    else:
+        classes = [_canonical_class(problem)]
+    weights = params.get("weights")
+    if weights is not None:
+        params["weights"] = asdict(weights)
+    payload = {
+        "version": FINGERPRINT_VERSION,
+        "classes": classes,
+        "params": params,
+    }
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def load_cached_result(
+    db: Session,
+    fingerprint: str,
+) -> tuple[dict[int, Assignment], dict[int, list[dict]], float | None] | None:
+    """Return (assignments, conflicts, score) stored under `fingerprint`, or None."""
+    row = db.query(GenerationCache).filter(GenerationCache.fingerprint == fingerprint).first()
+    if row is None:
+        return None
+    payload = json.loads(row.payload)
+    assignments = {
+        int(cid): {int(ts_id): (int(subj_id), room_id) for ts_id, subj_id, room_id in cells}
+        for cid, cells in payload["assignments"].items()
+    }
+    conflicts = {int(cid): items for cid, items in payload.get("conflicts", {}).items()}
+    row.last_hit_at = datetime.utcnow()
+    return assignments, conflicts, row.score
+
+
+def prune_cache(
+    db: Session,
+    *,
+    ttl_days: float | None = None,
+    max_entries: int | None = None,
+    now: datetime | None = None,
+) -> int:
+    """
+    Drop expired and least recently used entries (the caller commits); the
+    limits default to CACHE_TTL_DAYS and CACHE_MAX_ENTRIES. Returns the rows deleted.
+    """
+    ttl_days = CACHE_TTL_DAYS if ttl_days is None else ttl_days
+    max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    last_used = func.coalesce(GenerationCache.last_hit_at, GenerationCache.created_at)
+    deleted = 0
+    if ttl_days > 0:
+        cutoff = (now or datetime.utcnow()) - timedelta(days=ttl_days)
+        deleted += db.query(GenerationCache).filter(last_used < cutoff).delete(synchronize_session=False)
+    if max_entries > 0:
+        surplus = (
+            select(GenerationCache.fingerprint)
+            .order_by(last_used.desc(), GenerationCache.fingerprint)
+            .offset(max_entries)
+        )
+        deleted += db.query(GenerationCache).filter(
+            GenerationCache.fingerprint.in_(surplus)
+        ).delete(synchronize_session=False)
+    return deleted
+
+
+def store_cached_result(
+    db: Session,
+    fingerprint: str,
+    assignments: dict[int, Assignment],
+    conflicts: dict[int, list[dict]],
+    score: float | None,
+) -> None:
+    """
+    Remember a solve result and prune the table to make room for it
+    (committed on its own; a concurrent insert of the same key is fine).
+    """
+    payload = {
+        "assignments": {
+            str(cid): [[ts_id, subj_id, room_id] for ts_id, (subj_id, room_id) in sorted(a.items())]
+            for cid, a in assignments.items()
+        },
+        "conflicts": {str(cid): items for cid, items in conflicts.items() if items},
+    }
+    db.add(
+        GenerationCache(
+            fingerprint=fingerprint,
+            class_ids=",".join(str(cid) for cid in sorted(assignments)),
+            payload=json.dumps(payload, separators=(",", ":")),
+            score=score,
+        )
+    )
+    try:
+        db.flush()
+        # After the insert: the new entry counts as the most recently used one
+        prune_cache(db)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+
@@ -0,0 +1,362 @@
+"""
+Constraint-propagating backtracking solver for placing a class's subjects.
+
+Variables are the class's timeslots, values are its curriculum subjects.
+The search uses:
+- most-constrained-slot-first ordering (smallest live domain, ties broken by
+  the preferred slot order, so earlier hours are filled first);
+- forward checking on per-day subject caps, remaining weekly hours and a
+  counting bound (a subject must still fit in the slots that can take it);
+- conflict-directed backjumping (FC-CBJ): on a dead end the search jumps back
+  to the deepest assignment that actually caused it instead of the previous one.
+
+Teacher availability masks and teacher occupancy from other classes are
+static, so they are applied once to the initial domains. Rooms are assigned
+afterwards by the caller.
+
+The search is complete: within `max_steps` (and before `deadline`, a
+time.monotonic() value, or `stop()` returning True) it either returns a
+placement or proves that none exists under the given constraints.
+
+Slots passed in `fixed` keep their subject and only count towards the per-day
+caps and weekly hours, which lets the repair path re-solve a few cells of an
+existing timetable; `hints` (timeslot_id -> subject_id) is tried first in
+each free cell so that the re-solved cells stay as close as possible to the
+previous timetable.
+"""
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from timetable_shared.services.timetable_snapshot import GenerationSnapshot, SlotInfo
+
+STATUS_SOLVED = "solved"
+STATUS_INFEASIBLE = "infeasible"
+STATUS_BUDGET_EXHAUSTED = "budget_exhausted"
+
+
+@dataclass
+class CSPResult:
+    status: str
+    # timeslot_id -> subject_id (only when solved)
+    placement: dict[int, int] = field(default_factory=dict)
+    steps: int = 0
+    backtracks: int = 0
+    reason: str | None = None
+
+    @property
+    def solved(self) -> bool:
+        return self.status == STATUS_SOLVED
+
+
+def _bits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def solve_class_csp(
+    snapshot: GenerationSnapshot,
+    *,
+    max_same_subject_per_day: int = 2,
+    preferred_slots: list[SlotInfo] | None = None,
+    taken_teachers: dict[int, set[int]] | None = None,
+    fixed: dict[int, int] | None = None,
+    hints: dict[int, int] | None = None,
+    max_steps: int = 200_000,
+    deadline: float | None = None,
+    rng: random.Random | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> CSPResult:
+    """
+    Place every curriculum hour of `snapshot` on a distinct timeslot.
+    `fixed` (timeslot_id -> subject_id) pins cells; the returned placement
+    includes them. `hints` (timeslot_id -> subject_id) are tried first.
+    Ties between equally constrained subjects are broken with `rng` (a
+    fresh unseeded one when None).
+    """
+    rng = rng or random.Random()
+    items = [c for c in snapshot.curriculum if c.hours_per_week > 0]
+    all_slots = list(preferred_slots or snapshot.timeslots)
+    taken_teachers = taken_teachers or {}
+    fixed = fixed or {}
+    cap = max_same_subject_per_day
+
+    if sum(c.hours_per_week for c in items) != len(all_slots):
+        return CSPResult(STATUS_INFEASIBLE, reason="Curriculum hours do not match the number of timeslots")
+
+    day_keys = sorted({ts.weekday for ts in all_slots})
+    day_of_key = {d: i for i, d in enumerate(day_keys)}
+
+    # Pinned cells only consume weekly hours and per-day room
+    index_of = {c.subject_id: s for s, c in enumerate(items)}
+    remaining = [c.hours_per_week for c in items]
+    day_count = [[0] * len(items) for _ in day_keys]
+    for ts in all_slots:
+        if ts.id not in fixed:
+            continue
+        s = index_of.get(fixed[ts.id])
+        if s is None or remaining[s] == 0:
+            return CSPResult(
+                STATUS_INFEASIBLE,
+                reason=f"Fixed entries exceed the curriculum hours of subject {fixed[ts.id]}",
+            )
+        remaining[s] -= 1
+        day_count[day_of_key[ts.weekday]][s] += 1
+        if day_count[day_of_key[ts.weekday]][s] > cap:
+            return CSPResult(
+                STATUS_INFEASIBLE,
+                reason=f"Fixed entries put subject {fixed[ts.id]} more than {cap} times on weekday {ts.weekday}",
+            )
+
+    slots = [ts for ts in all_slots if ts.id not in fixed]
+    n = len(slots)
+    hints = hints or {}
+    slot_hint = [index_of.get(hints.get(ts.id)) for ts in slots]
+    slot_day = [day_of_key[ts.weekday] for ts in slots]
+    day_slots: list[list[int]] = [[] for _ in day_keys]
+    for k, d in enumerate(slot_day):
+        day_slots[d].append(k)
+
+    # Static domains: teacher availability mask + teachers busy in other classes
+    # (+ subjects already used up by pinned cells)
+    dom: list[int] = []
+    for k, ts in enumerate(slots):
+        busy = taken_teachers.get(ts.id, ())
+        d = day_of_key[ts.weekday]
+        bits = 0
+        for s, c in enumerate(items):
+            if remaining[s] == 0 or day_count[d][s] >= cap:
+                continue
+            if c.teacher_id and (
+                c.teacher_id in busy
+                or not snapshot.is_teacher_available(c.teacher_id, ts.weekday, ts.index_in_day)
+            ):
+                continue
+            bits |= 1 << s
+        if not bits:
+            return CSPResult(
+                STATUS_INFEASIBLE,
+                reason=f"No subject can be taught at weekday {ts.weekday}, hour {ts.index_in_day}",
+            )
+        dom.append(bits)
+    static_dom = list(dom)
+
+    assigned: list[int | None] = [None] * n  # slot -> subject index
+    depth_slot: list[int] = []  # depth -> slot
+    slot_depth: list[int | None] = [None] * n
+    # slot -> depths whose assignments pruned its domain
+    past_fc: list[set[int]] = [set() for _ in range(n)]
+    # depth -> conflict set, candidate values still to try, pruning records
+    conf: list[set[int]] = []
+    candidates: list[list[int]] = []
+    prunes: list[list[tuple[int, int, frozenset[int]]]] = []
+
+    steps = 0
+    backtracks = 0
+
+    def capacity(s: int) -> int:
+        """Upper bound on how many more hours of subject `s` can still be placed."""
+        bit = 1 << s
+        total = 0
+        for d, members in enumerate(day_slots):
+            room = cap - day_count[d][s]
+            if room <= 0:
+                continue
+            free = 0
+            for k in members:
+                if assigned[k] is None and dom[k] & bit:
+                    free += 1
+                    if free >= room:
+                        break
+            total += min(room, free)
+        return total
+
+    def capacity_culprits(s: int) -> set[int]:
+        """Depths that shrank the room left for subject `s` (explains a counting-bound failure)."""
+        bit = 1 << s
+        culprits: set[int] = set()
+        for k in range(n):
+            if not static_dom[k] & bit:
+                continue
+            if assigned[k] is not None:
+                culprits.add(slot_depth[k])
+            elif not dom[k] & bit:
+                culprits |= past_fc[k]
+        return culprits
+
+    def select_slot() -> int:
+        best = -1
+        best_size = None
+        for k in range(n):
+            if assigned[k] is not None:
+                continue
+            size = bin(dom[k]).count("1")
+            if best_size is None or size < best_size:
+                best, best_size = k, size
+                if size <= 1:
+                    break
+        return best
+
+    def order_values(k: int) -> list[int]:
+        # Hinted subject first, then least slack (subjects that are running
+        # out of places), random tie-break
+        keyed = [
+            (s != slot_hint[k], capacity(s) - remaining[s], rng.random(), s)
+            for s in _bits(dom[k])
+        ]
+        keyed.sort()
+        return [s for _, _, _, s in keyed]
+
+    def push(k: int) -> None:
+        slot_depth[k] = len(depth_slot)
+        depth_slot.append(k)
+        conf.append(set())
+        candidates.append(order_values(k))
+        prunes.append([])
+
+    def unassign(depth: int) -> None:
+        """Undo the value currently held at `depth` (keeps the depth on the stack)."""
+        k = depth_slot[depth]
+        s = assigned[k]
+        if s is None:
+            return
+        for j, bit, added in reversed(prunes[depth]):
+            dom[j] |= bit
+            past_fc[j] -= added
+        prunes[depth] = []
+        remaining[s] += 1
+        day_count[slot_day[k]][s] -= 1
+        assigned[k] = None
+
+    def pop() -> None:
+        depth = len(depth_slot) - 1
+        unassign(depth)
+        k = depth_slot.pop()
+        slot_depth[k] = None
+        conf.pop()
+        candidates.pop()
+        prunes.pop()
+
+    def prune(depth: int, j: int, bit: int, culprits: set[int]) -> None:
+        dom[j] &= ~bit
+        added = frozenset(culprits - past_fc[j])
+        past_fc[j] |= added
+        prunes[depth].append((j, bit, added))
+
+    def try_assign(depth: int, s: int) -> set[int] | None:
+        """Assign and forward-check. Returns None on success, else the conflict set."""
+        k = depth_slot[depth]
+        d = slot_day[k]
+        bit = 1 << s
+        assigned[k] = s
+        remaining[s] -= 1
+        day_count[d][s] += 1
+
+        if day_count[d][s] >= cap:
+            culprits = {
+                slot_depth[j] for j in day_slots[d] if assigned[j] == s
+            }
+            for j in day_slots[d]:
+                if assigned[j] is None and dom[j] & bit:
+                    prune(depth, j, bit, culprits)
+        if remaining[s] == 0:
+            culprits = {
+                slot_depth[j] for j in range(n) if assigned[j] == s
+            }
+            for j in range(n):
+                if assigned[j] is None and dom[j] & bit:
+                    prune(depth, j, bit, culprits)
+
+        for j in range(n):
+            if assigned[j] is None and not dom[j]:
+                return set(past_fc[j])
+
+        # Counting bound: every subject that could have used slot k must still fit
+        for t in _bits(dom[k] | bit):
+            if remaining[t] and capacity(t) < remaining[t]:
+                return capacity_culprits(t)
+        return None
+
+    # Counting bound before any search: a subject needing more hours than
+    # its teacher's free slots and the per-day cap allow is infeasible outright.
+    for s, c in enumerate(items):
+        if capacity(s) < remaining[s]:
+            return CSPResult(
+                STATUS_INFEASIBLE,
+                reason=(
+                    f"Subject {c.subject_id} needs {remaining[s]} more hours but at most "
+                    f"{capacity(s)} fit (teacher availability, max {cap} per day)"
+                ),
+            )
+
+    if n == 0:
+        return CSPResult(STATUS_SOLVED, placement=dict(fixed))
+
+    first = select_slot()
+    push(first)
+    while True:
+        depth = len(depth_slot) - 1
+        k = depth_slot[depth]
+        unassign(depth)
+
+        placed = False
+        while candidates[depth]:
+            s = candidates[depth].pop(0)
+            if steps >= max_steps:
+                return CSPResult(
+                    STATUS_BUDGET_EXHAUSTED,
+                    steps=steps,
+                    backtracks=backtracks,
+                    reason=f"Search budget of {max_steps} steps exhausted",
+                )
+            if deadline is not None and steps % 1024 == 0 and time.monotonic() >= deadline:
+                return CSPResult(
+                    STATUS_BUDGET_EXHAUSTED,
+                    steps=steps,
+                    backtracks=backtracks,
+                    reason=f"Deadline reached after {steps} search steps",
+                )
+            if stop is not None and steps % 1024 == 0 and stop():
+                return CSPResult(
+                    STATUS_BUDGET_EXHAUSTED,
+                    steps=steps,
+                    backtracks=backtracks,
+                    reason=f"Stopped after {steps} search steps",
+                )
+            steps += 1
+            conflict = try_assign(depth, s)
+            if conflict is None:
+                placed = True
+                break
+            conf[depth] |= conflict - {depth}
+            unassign(depth)
+
+        if placed:
+            if len(depth_slot) == n:
+                placement = dict(fixed)
+                placement.update(
+                    (slots[j].id, items[assigned[j]].subject_id) for j in range(n)
+                )
+                return CSPResult(STATUS_SOLVED, placement=placement, steps=steps, backtracks=backtracks)
+            push(select_slot())
+            continue
+
+        # Dead end: jump back to the deepest assignment responsible for it
+        backtracks += 1
+        culprits = (conf[depth] | past_fc[k]) - {depth}
+        if not culprits:
+            return CSPResult(
+                STATUS_INFEASIBLE,
+                steps=steps,
+                backtracks=backtracks,
+                reason="Search space exhausted: no placement satisfies the constraints",
+            )
+        target = max(culprits)
+        while len(depth_slot) - 1 > target:
+            pop()
+        conf[target] |= culprits - {target}
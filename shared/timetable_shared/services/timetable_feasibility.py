@@ -0,0 +1,272 @@
+"""
+Pre-solve feasibility analysis.
+
+Cheap necessary conditions checked before any search, so that an impossible
+class fails in milliseconds with a report naming the bottleneck instead of
+after every solver attempt:
+
+- counting bounds: a subject cannot need more hours than the per-day cap
+  allows over the grid's days; a teacher cannot teach more hours than the
+  slots where they are available and not busy in other classes (per class,
+  and in joint solves across all classes of the run);
+- rooms: a class whose students fit in no room of the school;
+- max-flow between subject-hours and slots
+  (source -> subject -> subject x day -> slot -> sink, with the weekly hours,
+  the per-day cap and one lesson per slot as capacities, and subject -> slot
+  edges only where the subject's teacher can teach). If not every hour can be
+  routed, the subjects on the source side of the minimum cut are a set whose
+  hours do not fit in the slots they can use, and are reported together.
+
+The checks are relaxations of the real problem: passing them does not
+guarantee a timetable, failing them proves there is none.
+"""
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+
+from timetable_shared.services.timetable_snapshot import GenerationSnapshot, SchoolSnapshot
+
+
+@dataclass
+class FeasibilityReport:
+    class_id: int
+    # {"type": ..., "details": ...}, in the ConflictReport format of the generator
+    conflicts: list[dict] = field(default_factory=list)
+    # Hours the max-flow bound can place (None when the counting bounds already failed)
+    max_placeable_hours: int | None = None
+
+    @property
+    def feasible(self) -> bool:
+        return not self.conflicts
+
+
+class _FlowNetwork:
+    """Dinic's max-flow on a small graph of integer capacities."""
+
+    def __init__(self, size: int) -> None:
+        # node -> list of [to, capacity, index of the reverse edge]
+        self.edges: list[list[list[int]]] = [[] for _ in range(size)]
+
+    def add_edge(self, u: int, v: int, capacity: int) -> None:
+        self.edges[u].append([v, capacity, len(self.edges[v])])
+        self.edges[v].append([u, 0, len(self.edges[u]) - 1])
+
+    def _levels(self, source: int, sink: int) -> list[int] | None:
+        level = [-1] * len(self.edges)
+        level[source] = 0
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            for v, capacity, _ in self.edges[u]:
+                if capacity > 0 and level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level if level[sink] >= 0 else None
+
+    def _push(self, u: int, sink: int, limit: int, level: list[int], cursor: list[int]) -> int:
+        if u == sink:
+            return limit
+        while cursor[u] < len(self.edges[u]):
+            edge = self.edges[u][cursor[u]]
+            v, capacity, rev = edge
+            if capacity > 0 and level[v] == level[u] + 1:
+                pushed = self._push(v, sink, min(limit, capacity), level, cursor)
+                if pushed:
+                    edge[1] -= pushed
+                    self.edges[v][rev][1] += pushed
+                    return pushed
+            cursor[u] += 1
+        return 0
+
+    def max_flow(self, source: int, sink: int) -> int:
+        flow = 0
+        while (level := self._levels(source, sink)) is not None:
+            cursor = [0] * len(self.edges)
+            while pushed := self._push(source, sink, 1 << 30, level, cursor):
+                flow += pushed
+        return flow
+
+    def reachable(self, source: int) -> set[int]:
+        """Nodes reachable from `source` in the residual graph (source side of the min cut)."""
+        seen = {source}
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            for v, capacity, _ in self.edges[u]:
+                if capacity > 0 and v not in seen:
+                    seen.add(v)
+                    queue.append(v)
+        return seen
+
+
+def _teacher_free_slots(snapshot: GenerationSnapshot, teacher_id: int) -> list[int]:
+    """Ids of the class's slots where the teacher is available and not busy elsewhere."""
+    return [
+        ts.id
+        for ts in snapshot.timeslots
+        if snapshot.is_teacher_available(teacher_id, ts.weekday, ts.index_in_day)
+        and teacher_id not in snapshot.occupied_teachers.get(ts.id, ())
+    ]
+
+
+def _counting_bounds(snapshot: GenerationSnapshot, cap: int) -> list[dict]:
+    conflicts: list[dict] = []
+    class_id = snapshot.class_id
+    days = sorted({ts.weekday for ts in snapshot.timeslots})
+
+    if not snapshot.rooms and snapshot.largest_room_capacity > 0:
+        conflicts.append({
+            "type": "room_capacity",
+            "details": (
+                f"No room fits class {class_id}: {snapshot.student_count} students, "
+                f"largest room has {snapshot.largest_room_capacity} seats"
+            ),
+        })
+
+    for c in snapshot.curriculum:
+        if c.hours_per_week > cap * len(days):
+            conflicts.append({
+                "type": "no_solution",
+                "details": (
+                    f"Subject {c.subject_id} needs {c.hours_per_week} hours/week in class {class_id} "
+                    f"but at most {cap} per day over {len(days)} days fit ({cap * len(days)})"
+                ),
+            })
+
+    hours_by_teacher: dict[int, list] = defaultdict(list)
+    for c in snapshot.curriculum:
+        if c.teacher_id and c.hours_per_week > 0:
+            hours_by_teacher[c.teacher_id].append(c)
+    for teacher_id, items in sorted(hours_by_teacher.items()):
+        free = _teacher_free_slots(snapshot, teacher_id)
+        hours = sum(c.hours_per_week for c in items)
+        if hours > len(free):
+            subjects = ", ".join(str(c.subject_id) for c in items)
+            conflicts.append({
+                "type": "teacher_unavailable",
+                "details": (
+                    f"Teacher {teacher_id} teaches {hours} hours/week in class {class_id} "
+                    f"(subjects {subjects}) but is free in only {len(free)} of {len(snapshot.timeslots)} slots"
+                ),
+            })
+            continue
+        # With the per-day cap a single subject can use at most `cap` of the free slots per day
+        free_by_day: dict[int, int] = defaultdict(int)
+        for ts_id in free:
+            free_by_day[snapshot.slot_by_id[ts_id].weekday] += 1
+        for c in items:
+            usable = sum(min(cap, n) for n in free_by_day.values())
+            if c.hours_per_week > usable:
+                conflicts.append({
+                    "type": "teacher_unavailable",
+                    "details": (
+                        f"Subject {c.subject_id} needs {c.hours_per_week} hours/week in class {class_id} "
+                        f"but teacher {teacher_id}'s free slots allow at most {usable} "
+                        f"with {cap} per day"
+                    ),
+                })
+    return conflicts
+
+
+def _flow_bound(snapshot: GenerationSnapshot, cap: int) -> tuple[int, dict | None]:
+    """Max-flow bound; returns (placeable hours, conflict naming the min-cut subjects or None)."""
+    items = [c for c in snapshot.curriculum if c.hours_per_week > 0]
+    slots = snapshot.timeslots
+    days = sorted({ts.weekday for ts in slots})
+    day_index = {d: i for i, d in enumerate(days)}
+
+    # Node layout: source, sink, subjects, subject x day, slots
+    source, sink = 0, 1
+    subject_node = {s: 2 + s for s in range(len(items))}
+    day_base = 2 + len(items)
+    slot_base = day_base + len(items) * len(days)
+    slot_node = {ts.id: slot_base + k for k, ts in enumerate(slots)}
+    network = _FlowNetwork(slot_base + len(slots))
+
+    free_sets = {
+        c.teacher_id: set(_teacher_free_slots(snapshot, c.teacher_id))
+        for c in items
+        if c.teacher_id
+    }
+    for s, c in enumerate(items):
+        network.add_edge(source, subject_node[s], c.hours_per_week)
+        for d in range(len(days)):
+            network.add_edge(subject_node[s], day_base + s * len(days) + d, cap)
+        free = free_sets.get(c.teacher_id)
+        for ts in slots:
+            if free is None or ts.id in free:
+                network.add_edge(day_base + s * len(days) + day_index[ts.weekday], slot_node[ts.id], 1)
+    for ts in slots:
+        network.add_edge(slot_node[ts.id], sink, 1)
+
+    total = sum(c.hours_per_week for c in items)
+    flow = network.max_flow(source, sink)
+    if flow >= total:
+        return flow, None
+
+    side = network.reachable(source)
+    stuck = [c for s, c in enumerate(items) if subject_node[s] in side]
+    usable_slots = sum(1 for ts in slots if slot_node[ts.id] in side)
+    hours = sum(c.hours_per_week for c in stuck)
+    teachers = sorted({c.teacher_id for c in stuck if c.teacher_id})
+    return flow, {
+        "type": "no_solution",
+        "details": (
+            f"Subjects {', '.join(str(c.subject_id) for c in stuck)} of class {snapshot.class_id} "
+            f"(teachers {', '.join(str(t) for t in teachers) or '-'}) need {hours} hours/week "
+            f"but only {usable_slots} slots can take them; at most {flow} of {total} hours can be placed"
+        ),
+    }
+
+
+def check_class_feasibility(snapshot: GenerationSnapshot, *, max_same_subject_per_day: int = 2) -> FeasibilityReport:
+    """Counting bounds, then the max-flow bound, for one class."""
+    report = FeasibilityReport(snapshot.class_id)
+    report.conflicts = _counting_bounds(snapshot, max_same_subject_per_day)
+    if report.conflicts:
+        return report
+    report.max_placeable_hours, conflict = _flow_bound(snapshot, max_same_subject_per_day)
+    if conflict is not None:
+        report.conflicts.append(conflict)
+    return report
+
+
+def check_school_feasibility(
+    school: SchoolSnapshot,
+    *,
+    max_same_subject_per_day: int = 2,
+) -> dict[int, FeasibilityReport]:
+    """
+    Per-class checks plus the cross-class teacher bound: a teacher shared by
+    several classes of the run cannot teach more hours than their free slots.
+    Cross-class conflicts are attached to every class involved.
+    """
+    reports = {
+        cid: check_class_feasibility(snapshot, max_same_subject_per_day=max_same_subject_per_day)
+        for cid, snapshot in school.classes.items()
+    }
+
+    hours: dict[int, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    for cid, snapshot in school.classes.items():
+        for c in snapshot.curriculum:
+            if c.teacher_id and c.hours_per_week > 0:
+                hours[c.teacher_id][cid] += c.hours_per_week
+    any_class = next(iter(school.classes.values()), None)
+    for teacher_id, by_class in sorted(hours.items()):
+        if len(by_class) < 2:
+            continue
+        total = sum(by_class.values())
+        free = len(_teacher_free_slots(any_class, teacher_id))
+        if total <= free:
+            continue
+        conflict = {
+            "type": "teacher_unavailable",
+            "details": (
+                f"Teacher {teacher_id} teaches {total} hours/week across classes "
+                f"{', '.join(str(cid) for cid in sorted(by_class))} but is free in only {free} slots"
+            ),
+        }
+        for cid in by_class:
+            reports[cid].conflicts.append(conflict)
+    return reports
@@ -1,32 +1,365 @@
+"""
+Database adapters around the session-free solver core (timetable_solver).
+
+The public generators load the problem into snapshots (timetable_snapshot),
+run the feasibility pre-check and the result cache, call the core and
+persist its result together with the job's conflicts, score and progress.
+"""
 from __future__ import annotations
 
-import random
-from collections import Counter, defaultdict
-from typing import Iterable
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator
 
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
 
 from timetable_shared.models import (
-    Curriculum,
-    TimeSlot,
     TimetableEntry,
-    TeacherAvailability,
-    RoomAvailability,
-    Room,
-    UserProfile,
+    TimetableJob,
     ConflictReport,
-    Subject,
 )
+from timetable_shared.services.availability_masks import AvailabilityMasks
+from timetable_shared.services.timetable_cache import (
+    generation_fingerprint,
+    load_cached_result,
+    store_cached_result,
+)
+from timetable_shared.services.timetable_feasibility import (
+    check_class_feasibility,
+    check_school_feasibility,
+)
+from timetable_shared.services.timetable_locks import room_lock, teacher_locks
+from timetable_shared.services.timetable_metrics import SolveMetrics, count_statements
+from timetable_shared.services.timetable_persistence import apply_plan, diff_assignments
+from timetable_shared.services.timetable_optimizer import ScoreWeights
+from timetable_shared.services.timetable_rooms import assign_rooms
+from timetable_shared.services.timetable_snapshot import (
+    GenerationSnapshot,
+    load_class_grids,
+    load_generation_snapshot,
+    load_room_occupancy,
+    load_school_snapshot,
+)
+from timetable_shared.services.timetable_solver import (
+    PROGRESS_INTERVAL,
+    STRATEGIES,
+    STRATEGY_BACKTRACKING,
+    STRATEGY_RANDOM_RESTART,
+    Progress,
+    SolveResult,
+    solve_class,
+    solve_multi_start,
+    solve_school,
+    validate_snapshot,
+)
+
+# TimetableJob.cache_status values
+CACHE_MISS = "miss"
+CACHE_HIT = "hit"
+CACHE_UNCHANGED = "unchanged"
+
+# TimetableJob.status of a job whose class got a newer job before it was persisted
+JOB_SUPERSEDED = "superseded"
+# TimetableJob.status of a job whose run failed for a transient reason and is queued again
+JOB_RETRYING = "retrying"
+# A newer job in one of these makes an older job of the same class stale (a failed one does not)
+_LIVE_JOB_STATUSES = ("pending", JOB_RETRYING, "processing", "completed")
+
+
+class GenerationDeadlineExceeded(ValueError):
+    """The job's deadline ran out before any complete timetable was found."""
+
+
+class GenerationInfeasible(ValueError):
+    """The pre-solve analysis proved that no timetable exists (see timetable_feasibility)."""
+
+
+class GenerationSuperseded(ValueError):
+    """Every job of the run has a newer job for its class; nothing was persisted."""
+
+
+def superseded_classes(db: Session, job_ids: dict[int, int | None]) -> set[int]:
+    """
+    Classes of `job_ids` (class_id -> job id) that have a newer pending,
+    retrying, processing or completed job, i.e. whose result from this job would be
+    overwritten right away. One grouped query on timetable_jobs.
+    """
+    job_ids = {cid: job_id for cid, job_id in job_ids.items() if job_id}
+    if not job_ids:
+        return set()
+    rows = (
+        db.query(TimetableJob.class_id, func.max(TimetableJob.id))
+        .filter(
+            TimetableJob.class_id.in_(job_ids),
+            TimetableJob.status.in_(_LIVE_JOB_STATUSES),
+        )
+        .group_by(TimetableJob.class_id)
+    )
+    return {cid for cid, newest in rows if newest > job_ids[cid]}
+
+
+def supersede_jobs(db: Session, job_ids: Iterable[int | None]) -> None:
+    """Mark jobs as superseded (the caller commits)."""
+    _update_jobs(db, job_ids, {
+        TimetableJob.status: JOB_SUPERSEDED,
+        TimetableJob.completed_at: datetime.utcnow(),
+    })
+
+
+def supersede_older_jobs(db: Session, jobs: Iterable[TimetableJob]) -> None:
+    """
+    Mark older pending or retrying jobs of the new `jobs`' classes as
+    superseded (the jobs must be flushed; the caller commits): their result
+    would be overwritten right away, so the worker acks them without solving.
+    Jobs already running check again before they persist.
+    """
+    now = datetime.utcnow()
+    for job in jobs:
+        db.query(TimetableJob).filter(
+            TimetableJob.class_id == job.class_id,
+            TimetableJob.id < job.id,
+            TimetableJob.status.in_(("pending", JOB_RETRYING)),
+        ).update(
+            {TimetableJob.status: JOB_SUPERSEDED, TimetableJob.completed_at: now},
+            synchronize_session=False,
+        )
+
+
+def _job_progress(db: Session, job_ids: Iterable[int | None], started: float) -> Progress | None:
+    """
+    Progress reporter writing attempts / best score / elapsed time to the job
+    rows. Each report commits through a short-lived session of its own, so
+    nothing pending on the caller's session is committed with it.
+    """
+    job_ids = [job_id for job_id in job_ids if job_id]
+    if not job_ids:
+        return None
+    bind = db.get_bind()
+
+    def report(attempts: int, best_score: float | None) -> None:
+        with Session(bind) as progress_db:
+            _update_jobs(progress_db, job_ids, _progress_values(attempts, best_score, started))
+            progress_db.commit()
+
+    return Progress(report)
+
+
+def _progress_values(attempts: int, best_score: float | None, started: float) -> dict:
+    values = {
+        TimetableJob.progress_attempts: attempts,
+        TimetableJob.progress_elapsed: round(time.monotonic() - started, 2),
+        TimetableJob.progress_updated_at: datetime.utcnow(),
+    }
+    if best_score is not None:
+        values[TimetableJob.progress_best_score] = round(best_score, 2)
+    return values
+
+
+def _save_conflicts(db: Session, job_id: int | None, conflicts: list[dict]) -> None:
+    if not job_id or not conflicts:
+        return
+    for conflict in conflicts:
+        conflict_report = ConflictReport(
+            job_id=job_id,
+            conflict_type=conflict["type"],
+            details=conflict["details"],
+        )
+        db.add(conflict_report)
+
+
+def _reject_infeasible(db: Session, reports: dict, job_ids: dict[int, int | None]) -> None:
+    """Store the pre-check conflicts on the jobs and raise GenerationInfeasible (no search is run)."""
+    failing = [report for report in reports.values() if not report.feasible]
+    for report in failing:
+        _save_conflicts(db, job_ids.get(report.class_id), report.conflicts)
+    db.commit()
+    first = failing[0].conflicts[0]["details"]
+    more = sum(len(report.conflicts) for report in failing) - 1
+    raise GenerationInfeasible(
+        f"No timetable exists with the given constraints: {first}"
+        + (f" (+{more} more, see the job's conflicts)" if more else "")
+    )
+
+
+def _update_jobs(db: Session, job_ids: Iterable[int | None], values: dict) -> None:
+    job_ids = [job_id for job_id in job_ids if job_id]
+    if not job_ids or not values:
+        return
+    db.query(TimetableJob).filter(TimetableJob.id.in_(job_ids)).update(
+        values, synchronize_session=False
+    )
+
+
+def _store_metrics(
+    db: Session,
+    job_ids: Iterable[int | None],
+    metrics: SolveMetrics,
+    stats: dict | None,
+) -> None:
+    """
+    Attach the metrics to the job rows (and `stats`), also for failed jobs.
+    A failing write is rolled back so it never hides the job's own outcome.
+    """
+    if stats is not None:
+        stats.update(metrics.flat())
+    job_ids = [job_id for job_id in job_ids if job_id]
+    if not job_ids:
+        return
+    try:
+        _update_jobs(db, job_ids, {TimetableJob.metrics: metrics.to_json()})
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+
+
+def _refresh_rooms(
+    db: Session,
+    outcome: SolveResult,
+    snapshots: dict[int, GenerationSnapshot],
+    metrics: SolveMetrics,
+) -> bool:
+    """
+    Re-read the room occupancy of the other classes and, if a run that
+    committed after our snapshot took a room we use at the same slot, match
+    the rooms of the result again against the fresh occupancy (subjects stay).
+    Returns True when the rooms were matched again.
+    """
+    snapshots = {cid: snapshots[cid] for cid in outcome.assignments if cid in snapshots}
+    if not snapshots:
+        return False
+    grid = next(iter(snapshots.values())).grid
+    occupied_rooms, room_usage = load_room_occupancy(db, snapshots, grid)
+    if not any(
+        room_id in occupied_rooms.get(ts_id, ())
+        for assignment in outcome.assignments.values()
+        for ts_id, (_, room_id) in assignment.items()
+        if room_id is not None
+    ):
+        return False
+    placements = {
+        cid: {ts_id: subject_id for ts_id, (subject_id, _) in assignment.items()}
+        for cid, assignment in outcome.assignments.items()
+    }
+    assignments, room_conflicts = assign_rooms(
+        snapshots,
+        placements,
+        timeslots=next(iter(snapshots.values())).timeslots,
+        occupied_rooms=occupied_rooms,
+        room_usage=room_usage,
+    )
+    outcome.assignments = assignments
+    for cid in outcome.conflicts:
+        outcome.conflicts[cid] = [
+            c for c in outcome.conflicts[cid] if c["type"] != "room_unavailable"
+        ] + room_conflicts.get(cid, [])
+    metrics.counters["room_rematches"] += 1
+    return True
 
 
-def _group_timeslots_by_day(timeslots: Iterable[TimeSlot]):
-    by_day: dict[int, list[TimeSlot]] = defaultdict(list)
-    for ts in timeslots:
-        by_day[int(ts.weekday)].append(ts)
-    for d in by_day:
-        by_day[d].sort(key=lambda t: int(t.index_in_day))
-    return by_day
+@contextmanager
+def _locked(db: Session, class_ids: list[int], metrics: SolveMetrics) -> Iterator[None]:
+    """Hold the teacher locks of the run (see timetable_locks); the wait is the "lock" phase."""
+    with ExitStack() as stack:
+        with metrics.phase("lock"):
+            stack.enter_context(teacher_locks(db, class_ids))
+        yield
+
+
+def _finish(
+    db: Session,
+    outcome: SolveResult,
+    job_ids: dict[int, int | None],
+    *,
+    snapshots: dict[int, GenerationSnapshot] | None = None,
+    fingerprint: str | None = None,
+    from_cache: bool = False,
+    changes: dict | None = None,
+    started: float | None = None,
+    metrics: SolveMetrics | None = None,
+) -> dict[int, list[TimetableEntry]]:
+    """
+    Save conflicts/score/cache status/final progress on the jobs and persist
+    the result. Only cells that differ from the stored timetable are written;
+    a cached result equal to what is already stored writes nothing but the
+    jobs. Results cut short by a deadline are not cached.
+
+    Classes that got a newer job meanwhile are left out and their jobs are
+    marked superseded; if that is every class, GenerationSuperseded is raised.
+
+    With `snapshots`, rooms are re-checked against the current occupancy
+    first (see _refresh_rooms); that and the writes hold the room lock.
+    """
+    if metrics is None:
+        metrics = SolveMetrics()
+    with metrics.phase("persist"):
+        stale = superseded_classes(db, job_ids)
+        if stale:
+            supersede_jobs(db, [job_ids[cid] for cid in stale])
+            db.commit()
+            if stale >= set(outcome.assignments):
+                raise GenerationSuperseded(
+                    f"Superseded by a newer job for class(es) {', '.join(str(cid) for cid in sorted(stale))}"
+                )
+            # The remaining classes stay valid: dropping a class frees teachers and rooms only
+            outcome.assignments = {cid: a for cid, a in outcome.assignments.items() if cid not in stale}
+            outcome.conflicts = {cid: c for cid, c in outcome.conflicts.items() if cid not in stale}
+            job_ids = {cid: job_id for cid, job_id in job_ids.items() if cid not in stale}
+            # The fingerprint covers all classes of the run: a partial result is not cached
+            fingerprint = None
+        with room_lock(db):
+            return _persist(
+                db,
+                outcome,
+                job_ids,
+                snapshots=snapshots,
+                fingerprint=fingerprint,
+                from_cache=from_cache,
+                changes=changes,
+                started=started,
+                metrics=metrics,
+            )
+
+
+def _persist(
+    db: Session,
+    outcome: SolveResult,
+    job_ids: dict[int, int | None],
+    *,
+    snapshots: dict[int, GenerationSnapshot] | None,
+    fingerprint: str | None,
+    from_cache: bool,
+    changes: dict | None,
+    started: float | None,
+    metrics: SolveMetrics,
+) -> dict[int, list[TimetableEntry]]:
+    # A re-matched result differs from what the solve produced, so it is not cached
+    rematched = bool(snapshots) and _refresh_rooms(db, outcome, snapshots, metrics)
+    plan = diff_assignments(db, outcome.assignments)
+    values = {TimetableJob.score: round(outcome.score, 2)}
+    if started is not None:
+        values.update(_progress_values(outcome.stats.get("attempts", 0), outcome.score, started))
+        values[TimetableJob.deadline_reached] = outcome.deadline_reached
+    cache_status = None
+    if fingerprint:
+        cache_status = CACHE_MISS
+        if from_cache:
+            cache_status = CACHE_HIT if plan.changed else CACHE_UNCHANGED
+        values[TimetableJob.cache_status] = cache_status
+
+    for cid, class_conflicts in outcome.conflicts.items():
+        _save_conflicts(db, job_ids.get(cid), class_conflicts)
+    _update_jobs(db, job_ids.values(), values)
+
+    entries_by_class = apply_plan(db, plan)
+    if changes is not None:
+        changes.update(plan.changes)
+    if cache_status == CACHE_MISS and not outcome.deadline_reached and not rematched:
+        store_cached_result(db, fingerprint, outcome.assignments, outcome.conflicts, outcome.score)
+    return entries_by_class
 
 
 def generate_timetable_for_class(
@@ -36,290 +369,419 @@ def generate_timetable_for_class(
     max_same_subject_per_day: int = 2,
     seed: int | None = None,
     job_id: int | None = None,
+    availability: AvailabilityMasks | None = None,
+    strategy: str = STRATEGY_RANDOM_RESTART,
+    optimize_seconds: float = 0.0,
+    weights: ScoreWeights | None = None,
+    workers: int = 1,
+    use_cache: bool = False,
+    stats: dict | None = None,
+    changes: dict | None = None,
+    deadline_seconds: float | None = None,
 ) -> list[TimetableEntry]:
     """
-    Generate a full 5x7 timetable for a class (35 entries).
+    Generate a full timetable for a class: one entry per slot of the class's
+    timeslot grid (35 for the default 5x7 grid).
     Enhanced version that considers:
     - Teacher availability
     - Room availability and capacity
-    - Preference for earlier hours (avoid late hours 6-7)
+    - Preference for earlier hours (avoid hours 6 and later)
     - Conflict reporting
 
-    Assumes TimeSlot table contains 35 slots (weekday 0..4, index_in_day 1..7).
-    Curriculum must sum to 35 hours/week for the class.
+    All inputs are read up front into a GenerationSnapshot (a handful of bulk
+    queries); the search itself runs only against in-memory indexes.
+    Availability checks are bit tests on per-teacher/per-room masks; pass
+    `availability` to reuse cached masks instead of building them per call.
+
+    `strategy` selects the search: "random_restart" (up to 100 randomized
+    greedy passes) or "backtracking" (complete constraint-propagating search
+    that either finds a timetable or proves none exists).
+
+    With `optimize_seconds` > 0 the feasible result is then improved by local
+    search on the soft-constraint score (see timetable_optimizer). The final
+    score is stored on the TimetableJob when `job_id` is given.
+
+    With `workers` > 1 the attempts are spread over a process pool with
+    different seeds; the first complete timetable wins (the best-scoring one
+    when `optimize_seconds` > 0, since every worker then optimizes its own).
+
+    With `use_cache` the solver inputs are fingerprinted (see timetable_cache);
+    a previous result for the same fingerprint is reused without solving, and
+    if it equals the stored timetable no entry is written. The outcome
+    ("miss" / "hit" / "unchanged") is recorded on the TimetableJob.
+
+    Pass a dict as `stats` to receive the search counters of the winning solve
+    (attempts, search_steps, backtracks, room_fallbacks), and a dict as
+    `changes` to receive class_id -> EntryChanges (see timetable_persistence).
+    Entries whose cell did not change keep their id and version.
+
+    `deadline_seconds` bounds the whole solve: no attempt starts after it and
+    the optimization stops at it, keeping the best timetable found so far.
+    If no complete timetable exists by then GenerationDeadlineExceeded (a
+    ValueError) is raised. While solving, attempts, best score and elapsed
+    time are written to the TimetableJob every PROGRESS_INTERVAL seconds.
+
+    Before searching, counting bounds and a max-flow bound (see
+    timetable_feasibility) check that a timetable can exist at all; if not,
+    the bottlenecks are stored as ConflictReports on the job and
+    GenerationInfeasible (a ValueError) is raised without any search.
+
+    The curriculum must sum to the number of slots in the class's grid
+    (SchoolClass.timeslot_grid).
     """
 
-    if seed is not None:
-        random.seed(seed)
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown generation strategy: {strategy}")
+
+    metrics = SolveMetrics()
+    with count_statements(db, metrics), _locked(db, [class_id], metrics):
+        started = time.monotonic()
+        try:
+            return _generate_class(
+                db,
+                class_id,
+                metrics,
+                started=started,
+                max_same_subject_per_day=max_same_subject_per_day,
+                seed=seed,
+                job_id=job_id,
+                availability=availability,
+                strategy=strategy,
+                optimize_seconds=optimize_seconds,
+                weights=weights,
+                workers=workers,
+                use_cache=use_cache,
+                changes=changes,
+                deadline_seconds=deadline_seconds,
+            )
+        finally:
+            _store_metrics(db, [job_id], metrics, stats)
 
-    timeslots = (
-        db.query(TimeSlot)
-        .order_by(TimeSlot.weekday, TimeSlot.index_in_day)
-        .all()
-    )
-    if len(timeslots) != 35:
-        raise ValueError(f"Expected 35 timeslots, found {len(timeslots)}")
-
-    curricula = db.query(Curriculum).filter(Curriculum.class_id == class_id).all()
-    total_hours = sum(int(c.hours_per_week) for c in curricula)
-    if total_hours != 35:
-        raise ValueError(f"Curriculum must sum to 35, got {total_hours}")
-
-    # Get class student count for room capacity checks
-    student_count = (
-        db.query(UserProfile)
-        .filter(UserProfile.class_id == class_id)
-        .count()
-    )
 
-    # Get available rooms (capacity >= student_count)
-    available_rooms = (
-        db.query(Room)
-        .filter(Room.capacity >= student_count)
-        .all()
-    )
+def _generate_class(
+    db: Session,
+    class_id: int,
+    metrics: SolveMetrics,
+    *,
+    started: float,
+    max_same_subject_per_day: int,
+    seed: int | None,
+    job_id: int | None,
+    availability: AvailabilityMasks | None,
+    strategy: str,
+    optimize_seconds: float,
+    weights: ScoreWeights | None,
+    workers: int,
+    use_cache: bool,
+    changes: dict | None,
+    deadline_seconds: float | None,
+) -> list[TimetableEntry]:
 
-    # Identify "Sport" subject (short_code SPORT, e.g. Educație fizică) and Sala Sport
-    sport_subject = db.query(Subject).filter(Subject.short_code == "SPORT").first()
-    sport_room = db.query(Room).filter(Room.name == "Sala Sport").first()
-    sport_subject_id = sport_subject.id if sport_subject else None
-    sport_room_id = sport_room.id if sport_room else None
-
-    # Build curriculum with teacher mapping
-    curriculum_map: dict[int, Curriculum] = {}  # subject_id -> Curriculum
-    for c in curricula:
-        curriculum_map[int(c.subject_id)] = c
-
-    # Build a pool of (subject_id, curriculum) tuples
-    subject_curriculum_pool: list[tuple[int, Curriculum]] = []
-    for c in curricula:
-        subject_curriculum_pool.extend([(int(c.subject_id), c)] * int(c.hours_per_week))
-
-    # Shuffle and assign with constraints
-    timeslots_by_day = _group_timeslots_by_day(timeslots)
-    conflicts: list[dict] = []
-
-    def _is_teacher_available(teacher_id: int | None, weekday: int, index_in_day: int) -> bool:
-        """Check if teacher is available at given time slot."""
-        if teacher_id is None:
-            return True  # No teacher assigned, skip check
-        
-        teacher_avail = (
-            db.query(TeacherAvailability)
-            .filter(
-                TeacherAvailability.teacher_id == teacher_id,
-                TeacherAvailability.weekday == weekday,
-                TeacherAvailability.index_in_day == index_in_day,
+    with metrics.phase("load"):
+        snapshot = load_generation_snapshot(db, class_id, availability=availability)
+    validate_snapshot(snapshot)
+    with metrics.phase("precheck"):
+        report = check_class_feasibility(snapshot, max_same_subject_per_day=max_same_subject_per_day)
+    if not report.feasible:
+        _reject_infeasible(db, {class_id: report}, {class_id: job_id})
+
+    solve_kwargs = dict(
+        strategy=strategy,
+        max_same_subject_per_day=max_same_subject_per_day,
+        collect_conflicts=bool(job_id) or use_cache,
+        optimize_seconds=optimize_seconds,
+        weights=weights,
+        deadline=started + deadline_seconds if deadline_seconds is not None else None,
+        progress=_job_progress(db, [job_id], started),
+    )
+    fingerprint = None
+    if use_cache:
+        with metrics.phase("cache"):
+            fingerprint = generation_fingerprint(
+                snapshot,
+                seed=seed,
+                strategy=strategy,
+                max_same_subject_per_day=max_same_subject_per_day,
+                optimize_seconds=optimize_seconds,
+                weights=weights,
             )
-            .first()
+            cached = load_cached_result(db, fingerprint)
+        if cached is not None:
+            assignments, conflicts, score = cached
+            outcome = SolveResult(assignments, conflicts, score=score)
+            return _finish(
+                db,
+                outcome,
+                {class_id: job_id},
+                snapshots={class_id: snapshot},
+                fingerprint=fingerprint,
+                from_cache=True,
+                changes=changes,
+                started=started,
+                metrics=metrics,
+            )[class_id]
+
+    if workers > 1:
+        outcome = solve_multi_start(
+            solve_class,
+            snapshot=snapshot,
+            workers=workers,
+            seed=seed,
+            max_attempts=100,
+            wait_for_best=optimize_seconds > 0,
+            **solve_kwargs,
         )
-        # If no availability record exists, assume available (default=True)
-        if teacher_avail is None:
-            return True
-        return teacher_avail.available
-
-    def _is_room_available(room_id: int, weekday: int, index_in_day: int) -> bool:
-        """Check if room is available at given time slot."""
-        room_avail = (
-            db.query(RoomAvailability)
-            .filter(
-                RoomAvailability.room_id == room_id,
-                RoomAvailability.weekday == weekday,
-                RoomAvailability.index_in_day == index_in_day,
-            )
-            .first()
+    else:
+        outcome = solve_class(
+            snapshot,
+            max_attempts=100,  # More retries for complex constraints
+            seed=seed,
+            **solve_kwargs,
         )
-        if room_avail is None:
-            return True  # No availability record, assume available
-        return room_avail.available
-
-    def _get_preferred_timeslots(timeslots_by_day: dict[int, list[TimeSlot]]) -> list[TimeSlot]:
-        """Return timeslots sorted by preference (earlier hours preferred)."""
-        preferred = []
-        for day in sorted(timeslots_by_day.keys()):
-            day_slots = timeslots_by_day[day]
-            # Prefer hours 1-5, avoid 6-7
-            early_slots = [ts for ts in day_slots if 1 <= int(ts.index_in_day) <= 5]
-            late_slots = [ts for ts in day_slots if int(ts.index_in_day) >= 6]
-            preferred.extend(sorted(early_slots, key=lambda t: int(t.index_in_day)))
-            preferred.extend(sorted(late_slots, key=lambda t: int(t.index_in_day)))
-        return preferred
-
-    def try_build_assignment() -> dict[int, tuple[int, int | None]]:
-        """Returns dict: timeslot_id -> (subject_id, room_id | None)"""
-        random.shuffle(subject_curriculum_pool)
-        pool_iter = iter(subject_curriculum_pool)
-        assignment: dict[int, tuple[int, int | None]] = {}
-        used_per_day: dict[int, Counter[int]] = {d: Counter() for d in timeslots_by_day}
-        used_rooms: dict[int, set[int]] = defaultdict(set)  # timeslot_id -> set of room_ids
-        used_teachers: dict[int, set[int]] = defaultdict(set)  # timeslot_id -> set of teacher_ids
-
-        # Utilizare sali in DB (o singura data per incercare) pentru repartitie uniforma
-        room_usage = defaultdict(int)
-        for e in db.query(TimetableEntry).filter(TimetableEntry.room_id.isnot(None)).all():
-            room_usage[int(e.room_id)] += 1
-
-        # Use preferred timeslots (earlier hours first)
-        preferred_slots = _get_preferred_timeslots(timeslots_by_day)
-
-        for ts in preferred_slots:
-            day = int(ts.weekday)
-            picked_subj = None
-            picked_curriculum = None
-            buffer = []
-
-            # Try to find a subject that fits constraints
-            for _ in range(len(subject_curriculum_pool)):
-                try:
-                    subj_id, curr = next(pool_iter)
-                except StopIteration:
-                    break
-
-                # Check max per day constraint
-                if used_per_day[day][subj_id] >= max_same_subject_per_day:
-                    buffer.append((subj_id, curr))
-                    continue
-
-                # Check teacher availability
-                if curr.teacher_id:
-                    if not _is_teacher_available(curr.teacher_id, day, int(ts.index_in_day)):
-                        buffer.append((subj_id, curr))
-                        continue
-                    
-                    # Check teacher overlap
-                    if curr.teacher_id in used_teachers[int(ts.id)]:
-                        buffer.append((subj_id, curr))
-                        continue
-
-                picked_subj = subj_id
-                picked_curriculum = curr
-                break
-
-            # Put back buffered items
-            if buffer:
-                remaining = list(pool_iter)
-                random.shuffle(buffer)
-                pool_iter = iter(buffer + remaining)
-
-            if picked_subj is None:
-                return {}
-
-            # Try to assign a room (diverse sali, fara dubluri la acelasi timeslot)
-            assigned_room = None
-            if available_rooms:
-                occupied_room_ids = set()
-                existing_entries = (
-                    db.query(TimetableEntry)
-                    .filter(
-                        TimetableEntry.timeslot_id == ts.id,
-                        TimetableEntry.class_id != class_id,
-                        TimetableEntry.room_id.isnot(None),
-                    )
-                    .all()
+
+    metrics.add_counters(outcome.stats)
+    metrics.add_times(outcome.timings)
+    if not outcome.assignments:
+        error = GenerationDeadlineExceeded if outcome.deadline_reached else ValueError
+        raise error(f"Could not generate timetable with the given constraints ({outcome.reason})")
+
+    # Save conflict reports and score if job_id provided
+    return _finish(
+        db,
+        outcome,
+        {class_id: job_id},
+        snapshots={class_id: snapshot},
+        fingerprint=fingerprint,
+        changes=changes,
+        started=started,
+        metrics=metrics,
+    )[class_id]
+
+
+def generate_timetables_for_school(
+    db: Session,
+    class_ids: Iterable[int],
+    *,
+    max_same_subject_per_day: int = 2,
+    seed: int | None = None,
+    job_ids: dict[int, int] | None = None,
+    availability: AvailabilityMasks | None = None,
+    strategy: str = STRATEGY_RANDOM_RESTART,
+    optimize_seconds: float = 0.0,
+    weights: ScoreWeights | None = None,
+    workers: int = 1,
+    use_cache: bool = False,
+    stats: dict | None = None,
+    changes: dict | None = None,
+    deadline_seconds: float | None = None,
+    max_attempts: int = 100,
+    tries_per_class: int = 10,
+) -> dict[int, list[TimetableEntry]]:
+    """
+    Generate timetables for several classes (typically the whole school) in
+    one joint solve.
+
+    All classes are scheduled against one shared teacher x slot and
+    room x slot occupancy, so no teacher or room is double-booked across the
+    classes being generated or against classes outside the set. Classes are
+    placed one after another; when a class cannot be placed, the attempt is
+    restarted with that class moved to the front of the order.
+
+    `job_ids` maps class_id -> TimetableJob id for conflict reporting; every
+    job of the run gets the joint score. `optimize_seconds` enables the
+    local-search stage over all classes at once; `workers` > 1 runs seeded
+    joint attempts in parallel and `use_cache` reuses results as in
+    generate_timetable_for_class, and `changes` receives the per-class
+    EntryChanges. Everything is persisted in a single transaction.
+    `deadline_seconds`, the job progress and the feasibility pre-check behave
+    as for a single class; the pre-check also bounds the hours of teachers
+    shared by several classes of the run.
+
+    Classes on different timeslot grids are solved grid by grid (largest grid
+    first); each later grid sees the committed timetables of the earlier ones
+    as fixed teacher/room occupancy at the same weekday and hour.
+    """
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown generation strategy: {strategy}")
+
+    started = time.monotonic()
+    class_ids = sorted({int(cid) for cid in class_ids})
+    by_grid: dict[str, list[int]] = defaultdict(list)
+    for cid, grid in load_class_grids(db, class_ids).items():
+        by_grid[grid].append(cid)
+    if len(by_grid) > 1:
+        results: dict[int, list[TimetableEntry]] = {}
+        for grid in sorted(by_grid, key=lambda g: (-len(by_grid[g]), g)):
+            grid_stats: dict = {}
+            results.update(
+                generate_timetables_for_school(
+                    db,
+                    by_grid[grid],
+                    max_same_subject_per_day=max_same_subject_per_day,
+                    seed=seed,
+                    job_ids={cid: job_id for cid, job_id in (job_ids or {}).items() if cid in by_grid[grid]},
+                    availability=availability,
+                    strategy=strategy,
+                    optimize_seconds=optimize_seconds,
+                    weights=weights,
+                    workers=workers,
+                    use_cache=use_cache,
+                    stats=grid_stats,
+                    changes=changes,
+                    deadline_seconds=(
+                        max(0.0, deadline_seconds - (time.monotonic() - started))
+                        if deadline_seconds is not None
+                        else None
+                    ),
+                    max_attempts=max_attempts,
+                    tries_per_class=tries_per_class,
                 )
-                for entry in existing_entries:
-                    if entry.room_id:
-                        occupied_room_ids.add(int(entry.room_id))
-
-                # Reguli: Sport (short_code SPORT) -> doar Sala Sport; restul -> NU Sala Sport
-                free_rooms = []
-                for r in available_rooms:
-                    if r.id in occupied_room_ids:
-                        continue
-                    if picked_subj == sport_subject_id:
-                        if sport_room_id and r.id != sport_room_id:
-                            continue
-                    if sport_room_id and r.id == sport_room_id:
-                        if picked_subj != sport_subject_id:
-                            continue
-                    free_rooms.append(r)
-
-                if not free_rooms:
-                    free_rooms = [r for r in available_rooms if r.id not in occupied_room_ids]
-
-                # Sorteaza dupa utilizare (sali diverse, repartitie uniforma)
-                free_rooms.sort(key=lambda r: (room_usage[r.id], r.id))
-
-                for room in free_rooms:
-                    if not _is_room_available(room.id, day, int(ts.index_in_day)):
-                        continue
-                    if room.id in used_rooms[int(ts.id)]:
-                        continue
-                    if room.id in occupied_room_ids:
-                        continue
-                    assigned_room = room.id
-                    used_rooms[int(ts.id)].add(room.id)
-                    break
-
-                # Fallback: daca nu s-a ales inca, ia prima neocupata (evita room_id NULL)
-                if assigned_room is None and free_rooms:
-                    for room in free_rooms:
-                        if room.id not in occupied_room_ids:
-                            assigned_room = room.id
-                            used_rooms[int(ts.id)].add(room.id)
-                            break
-
-            if assigned_room is None and available_rooms and job_id:
-                conflicts.append({
-                    "type": "room_unavailable",
-                    "details": f"No available room for class {class_id} at weekday {day}, hour {ts.index_in_day}",
-                })
-
-            assignment[int(ts.id)] = (picked_subj, assigned_room)
-            used_per_day[day][picked_subj] += 1
-            
-            if picked_curriculum and picked_curriculum.teacher_id:
-                used_teachers[int(ts.id)].add(picked_curriculum.teacher_id)
-
-        return assignment
-
-    assignment: dict[int, tuple[int, int | None]] = {}
-    for attempt in range(100):  # More retries for complex constraints
-        assignment = try_build_assignment()
-        if assignment and len(assignment) == 35:
-            break
-    
-    if not assignment or len(assignment) < 35:
-        if job_id:
-            conflicts.append({
-                "type": "no_solution",
-                "details": f"Could not generate complete timetable for class {class_id} after 100 attempts",
-            })
-        raise ValueError("Could not generate timetable with the given constraints")
-
-    # Save conflict reports if job_id provided
-    if job_id and conflicts:
-        for conflict in conflicts:
-            conflict_report = ConflictReport(
-                job_id=job_id,
-                conflict_type=conflict["type"],
-                details=conflict["details"],
             )
-            db.add(conflict_report)
-
-    # Delete existing entries for class and recreate
-    db.query(TimetableEntry).filter(TimetableEntry.class_id == class_id).delete()
-    db.flush()
-
-    entries = [
-        TimetableEntry(
-            class_id=class_id,
-            timeslot_id=ts_id,
-            subject_id=subj_id,
-            room_id=room_id,
-            version=1,  # Initialize version for optimistic locking
+            if stats is not None:
+                for key, value in grid_stats.items():
+                    stats[key] = stats.get(key, 0) + value
+        return results
+
+    job_ids = job_ids or {}
+    metrics = SolveMetrics()
+    with count_statements(db, metrics), _locked(db, class_ids, metrics):
+        # The deadline counts from when the locks are held
+        started = time.monotonic()
+        try:
+            return _generate_school(
+                db,
+                class_ids,
+                metrics,
+                started=started,
+                max_same_subject_per_day=max_same_subject_per_day,
+                seed=seed,
+                job_ids=job_ids,
+                availability=availability,
+                strategy=strategy,
+                optimize_seconds=optimize_seconds,
+                weights=weights,
+                workers=workers,
+                use_cache=use_cache,
+                changes=changes,
+                deadline_seconds=deadline_seconds,
+                max_attempts=max_attempts,
+                tries_per_class=tries_per_class,
+            )
+        finally:
+            _store_metrics(db, job_ids.values(), metrics, stats)
+
+
+def _generate_school(
+    db: Session,
+    class_ids: list[int],
+    metrics: SolveMetrics,
+    *,
+    started: float,
+    max_same_subject_per_day: int,
+    seed: int | None,
+    job_ids: dict[int, int],
+    availability: AvailabilityMasks | None,
+    strategy: str,
+    optimize_seconds: float,
+    weights: ScoreWeights | None,
+    workers: int,
+    use_cache: bool,
+    changes: dict | None,
+    deadline_seconds: float | None,
+    max_attempts: int,
+    tries_per_class: int,
+) -> dict[int, list[TimetableEntry]]:
+
+    with metrics.phase("load"):
+        school = load_school_snapshot(db, class_ids, availability=availability)
+    if not school.classes:
+        raise ValueError("No classes to generate")
+    for snapshot in school.classes.values():
+        validate_snapshot(snapshot)
+    with metrics.phase("precheck"):
+        reports = check_school_feasibility(school, max_same_subject_per_day=max_same_subject_per_day)
+    if not all(report.feasible for report in reports.values()):
+        _reject_infeasible(db, reports, job_ids)
+
+    solve_kwargs = dict(
+        strategy=strategy,
+        max_same_subject_per_day=max_same_subject_per_day,
+        tries_per_class=tries_per_class,
+        collect_conflicts=(
+            frozenset(school.classes)
+            if use_cache
+            else frozenset(cid for cid, job_id in job_ids.items() if job_id)
+        ),
+        optimize_seconds=optimize_seconds,
+        weights=weights,
+        deadline=started + deadline_seconds if deadline_seconds is not None else None,
+        progress=_job_progress(db, job_ids.values(), started),
+    )
+    fingerprint = None
+    if use_cache:
+        with metrics.phase("cache"):
+            fingerprint = generation_fingerprint(
+                school,
+                mode="school",
+                seed=seed,
+                strategy=strategy,
+                max_same_subject_per_day=max_same_subject_per_day,
+                optimize_seconds=optimize_seconds,
+                weights=weights,
+                max_attempts=max_attempts,
+                tries_per_class=tries_per_class,
+            )
+            cached = load_cached_result(db, fingerprint)
+        if cached is not None:
+            assignments, conflicts, score = cached
+            outcome = SolveResult(assignments, conflicts, score=score)
+            return _finish(
+                db,
+                outcome,
+                job_ids,
+                snapshots=school.classes,
+                fingerprint=fingerprint,
+                from_cache=True,
+                changes=changes,
+                started=started,
+                metrics=metrics,
+            )
+
+    if workers > 1:
+        outcome = solve_multi_start(
+            solve_school,
+            school=school,
+            workers=workers,
+            seed=seed,
+            max_attempts=max_attempts,
+            wait_for_best=optimize_seconds > 0,
+            **solve_kwargs,
+        )
+    else:
+        outcome = solve_school(
+            school,
+            max_attempts=max_attempts,
+            seed=seed,
+            **solve_kwargs,
         )
-        for ts_id, (subj_id, room_id) in assignment.items()
-    ]
 
-    db.add_all(entries)
-    try:
-        db.commit()
-    except IntegrityError:
-        db.rollback()
-        raise
+    metrics.add_counters(outcome.stats)
+    metrics.add_times(outcome.timings)
+    if not outcome.assignments:
+        error = GenerationDeadlineExceeded if outcome.deadline_reached else ValueError
+        raise error(
+            f"Could not generate a joint timetable for classes {sorted(school.classes)} "
+            f"with the given constraints ({outcome.reason})"
+        )
 
-    # Refresh IDs
-    for e in entries:
-        db.refresh(e)
-    return entries
+    return _finish(
+        db,
+        outcome,
+        job_ids,
+        snapshots=school.classes,
+        fingerprint=fingerprint,
+        changes=changes,
+        started=started,
+        metrics=metrics,
+    )
@@ -0,0 +1,126 @@
+"""
+PostgreSQL advisory locks so that several scheduling-engine replicas can
+solve at the same time.
+
+A solve reads the timetables of the classes outside its run as fixed
+teacher/room occupancy and writes its own classes at the end. Two solves that
+share a teacher must not overlap, or both commit against occupancy read before
+the other's commit and the teacher ends up double-booked.
+
+- teacher locks: one advisory lock per teacher in the curriculum of the run's
+  classes, taken in ascending order (so two runs cannot deadlock) before the
+  snapshot is loaded and held until the result is committed. Runs with
+  disjoint teacher sets proceed in parallel, overlapping ones serialize; the
+  effect is that of locking the connected components of the teacher graph,
+  without computing them.
+- room lock: nearly every class can use most rooms, so locking rooms for the
+  whole solve would serialize everything. Instead one short lock covers
+  re-reading the room occupancy, re-matching rooms if another run took one
+  meanwhile, and writing the result (see timetable_generator._finish).
+
+Request handlers (the timetable repair) take the teacher locks with
+try_teacher_locks, which gives up instead of waiting for a running solve.
+
+The locks are session-level and live on a dedicated connection, because the
+job's own session commits several times (progress, conflicts) and may get a
+different pooled connection after each commit. On other databases (SQLite in
+development and in the benchmarks) they are no-ops.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from timetable_shared.models import Curriculum
+
+# First key of pg_advisory_lock(int, int): keeps these locks apart from other users
+LOCK_NAMESPACE_TEACHER = 0x5454  # "TT"
+LOCK_NAMESPACE_ROOMS = 0x5452  # "TR"
+
+
+def locks_supported(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def teacher_lock_keys(db: Session, class_ids: Iterable[int]) -> list[int]:
+    """Sorted ids of the teachers in the curriculum of `class_ids`."""
+    class_ids = list(class_ids)
+    if not class_ids:
+        return []
+    return sorted({
+        int(teacher_id)
+        for (teacher_id,) in (
+            db.query(Curriculum.teacher_id)
+            .filter(Curriculum.class_id.in_(class_ids), Curriculum.teacher_id.isnot(None))
+            .distinct()
+        )
+    })
+
+
+@contextmanager
+def _advisory_locks(db: Session, keys: list[tuple[int, int]], *, wait: bool = True) -> Iterator[bool]:
+    """
+    Take `keys` on a dedicated connection; yields whether they are held.
+    With wait=False a busy key gives up at once (releasing the keys taken so far).
+    """
+    connection = db.get_bind().connect()
+    try:
+        acquired = True
+        for namespace, key in keys:
+            params = {"ns": namespace, "key": key}
+            if wait:
+                connection.execute(text("SELECT pg_advisory_lock(:ns, :key)"), params)
+            elif not connection.execute(text("SELECT pg_try_advisory_lock(:ns, :key)"), params).scalar():
+                connection.execute(text("SELECT pg_advisory_unlock_all()"))
+                acquired = False
+                break
+        # Session-level locks survive the commit; the connection must not sit idle in a transaction
+        connection.commit()
+        yield acquired
+    finally:
+        try:
+            connection.execute(text("SELECT pg_advisory_unlock_all()"))
+        finally:
+            connection.close()
+
+
+@contextmanager
+def teacher_locks(db: Session, class_ids: Iterable[int]) -> Iterator[None]:
+    """Hold the advisory locks of every teacher of `class_ids` (blocks until free)."""
+    if not locks_supported(db):
+        yield
+        return
+    keys = [(LOCK_NAMESPACE_TEACHER, teacher_id) for teacher_id in teacher_lock_keys(db, class_ids)]
+    # Reading the curriculum opened a transaction on the job's session; do not keep it open while waiting
+    db.commit()
+    with _advisory_locks(db, keys):
+        yield
+
+
+@contextmanager
+def try_teacher_locks(db: Session, class_ids: Iterable[int]) -> Iterator[bool]:
+    """
+    As teacher_locks, without waiting: yields False (holding nothing) when
+    another run holds one of the teachers. For request handlers, which must
+    not hang behind a running solve.
+    """
+    if not locks_supported(db):
+        yield True
+        return
+    keys = [(LOCK_NAMESPACE_TEACHER, teacher_id) for teacher_id in teacher_lock_keys(db, class_ids)]
+    db.commit()
+    with _advisory_locks(db, keys, wait=False) as acquired:
+        yield acquired
+
+
+@contextmanager
+def room_lock(db: Session) -> Iterator[None]:
+    """Hold the school-wide room lock (short: room re-check and persist)."""
+    if not locks_supported(db):
+        yield
+        return
+    with _advisory_locks(db, [(LOCK_NAMESPACE_ROOMS, 0)]):
+        yield
@@ -0,0 +1,99 @@
+"""
+Per-job instrumentation of the generator: wall time per phase and counters.
+
+Phases (seconds, perf_counter):
+- lock:     waiting for the teacher advisory locks (timetable_locks)
+- load:     reading the snapshot (and availability masks) from the database
+- precheck: the feasibility analysis (timetable_feasibility)
+- cache:    fingerprinting and the result cache lookup
+- search:   placing the subjects (all attempts, timetable_solver)
+- rooms:    the per-timeslot room matching (timetable_rooms)
+- optimize: the local-search stage and final scoring
+- persist:  room re-check, diffing, writing the entries, conflicts and job rows
+
+Counters are the solver's (attempts, buffer_rotations, backtracks,
+search_steps, joint_restarts, room_fallbacks) plus db_statements, the SQL
+statements the job sent, and room_rematches (rooms matched again at persist
+time because another run took one meanwhile). Everything is a handful of
+perf_counter calls and one event listener, so it stays on in production; the
+result is stored as JSON on TimetableJob.metrics.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PHASES = ("lock", "load", "precheck", "cache", "search", "rooms", "optimize", "persist")
+
+
+class SolveMetrics:
+    """Phase timers and counters of one generation job."""
+
+    __slots__ = ("phases", "counters")
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+        self.counters: Counter = Counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_times(self, timings: dict[str, float]) -> None:
+        for name, seconds in timings.items():
+            self.add_time(name, seconds)
+
+    def add_counters(self, counters: dict[str, int]) -> None:
+        for key, value in counters.items():
+            self.counters[key] += value
+
+    def as_dict(self) -> dict:
+        return {
+            "phases": {name: round(self.phases[name], 4) for name in PHASES if name in self.phases},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), separators=(",", ":"))
+
+    def flat(self) -> dict[str, float]:
+        """Counters plus `<phase>_seconds` keys, for the generators' `stats` dict."""
+        values: dict[str, float] = dict(self.counters)
+        for name, seconds in self.phases.items():
+            values[f"{name}_seconds"] = seconds
+        return values
+
+
+@contextmanager
+def count_statements(db: Session, metrics: SolveMetrics) -> Iterator[None]:
+    """
+    Count the SQL statements sent while the block runs into
+    metrics.counters["db_statements"]. Only statements of the calling thread
+    are counted, so concurrent jobs on the same engine do not mix.
+    """
+    engine = db.get_bind()
+    owner = threading.get_ident()
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == owner:
+            metrics.counters["db_statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
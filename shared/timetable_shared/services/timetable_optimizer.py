@@ -0,0 +1,400 @@
+"""
+Local-search improvement of an already feasible timetable.
+
+The constructive strategies only handle soft preferences through ordering
+(early hours first, least used rooms first). This module takes their result
+and runs simulated annealing on a weighted penalty score (lower is better):
+
+- late hours:      lessons placed at LATE_HOUR_FROM or later (timetable_scoring)
+- student gaps:    free periods between a class's first and last lesson of a day
+- teacher idle:    free periods between a teacher's first and last lesson of a day
+                   (lessons in classes outside the solve count as fixed)
+- room balance:    sum of squared room usage counts (flat usage scores lowest)
+
+Two moves keep every hard constraint intact: swapping the lessons of two slots
+within a class, and moving a lesson to another eligible free room. Occupancy is
+kept as one integer bitmask per teacher/room/class (the same bit layout as the
+availability masks), so each move is checked and scored by touching only the
+handful of teacher-days and rooms it changes. Whole timetables are scored on
+the dense array view of timetable_scoring.
+"""
+from __future__ import annotations
+
+import math
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable
+
+from timetable_shared.services.availability_masks import MAX_PERIODS_PER_DAY
+from timetable_shared.services.timetable_scoring import (
+    SOFT_TERMS,
+    build_timetable_array,
+    timetable_terms,
+)
+from timetable_shared.services.timetable_snapshot import GenerationSnapshot, SlotInfo
+
+# timeslot_id -> (subject_id, room_id | None)
+Assignment = dict[int, tuple[int, int | None]]
+
+_DAY_BITS = (1 << MAX_PERIODS_PER_DAY) - 1
+
+
+def _idle_periods(day_bits: int) -> int:
+    """Empty periods between the first and last busy period of one day."""
+    if not day_bits:
+        return 0
+    span = day_bits.bit_length() - ((day_bits & -day_bits).bit_length() - 1)
+    return span - bin(day_bits).count("1")
+
+
+_IDLE = [_idle_periods(m) for m in range(1 << MAX_PERIODS_PER_DAY)]
+
+
+def _day_idle(mask: int, day: int) -> int:
+    return _IDLE[(mask >> (day * MAX_PERIODS_PER_DAY)) & _DAY_BITS]
+
+
+@dataclass(frozen=True)
+class ScoreWeights:
+    late_hours: float = 1.0
+    student_gaps: float = 3.0
+    teacher_idle: float = 2.0
+    room_balance: float = 0.05
+
+
+@dataclass
+class OptimizationResult:
+    assignments: dict[int, Assignment]
+    score: float
+    initial_score: float
+    terms: dict[str, float] = field(default_factory=dict)
+    moves: int = 0
+    accepted: int = 0
+    elapsed: float = 0.0
+
+
+class _State:
+    """Mutable occupancy of the classes being optimized plus fixed outside load."""
+
+    def __init__(
+        self,
+        snapshots: dict[int, GenerationSnapshot],
+        assignments: dict[int, Assignment],
+        timeslots: list[SlotInfo],
+        occupied_teachers: dict[int, set[int]],
+        occupied_rooms: dict[int, set[int]],
+    ) -> None:
+        self.snapshots = snapshots
+        self.slot_by_id = {ts.id: ts for ts in timeslots}
+        self.pos = {ts.id: ts.position for ts in timeslots}
+        self.teacher_of = {
+            cid: {c.subject_id: c.teacher_id for c in snap.curriculum}
+            for cid, snap in snapshots.items()
+        }
+
+        self.teacher_busy: dict[int, int] = defaultdict(int)
+        self.room_busy: dict[int, int] = defaultdict(int)
+        self.room_usage: dict[int, int] = defaultdict(int)
+        for ts_id, teachers in occupied_teachers.items():
+            if ts_id in self.pos:
+                for t in teachers:
+                    self.teacher_busy[t] |= 1 << self.pos[ts_id]
+        for ts_id, rooms in occupied_rooms.items():
+            if ts_id in self.pos:
+                for r in rooms:
+                    self.room_busy[r] |= 1 << self.pos[ts_id]
+                    self.room_usage[r] += 1
+
+        # class_id -> list of [ts_id, subject_id, room_id] (mutable lessons)
+        self.lessons: dict[int, list[list]] = {}
+        self.class_busy: dict[int, int] = {}
+        self.day_count: dict[int, dict[tuple[int, int], int]] = {}
+        for cid, assignment in assignments.items():
+            lessons = []
+            busy = 0
+            counts: dict[tuple[int, int], int] = defaultdict(int)
+            for ts_id, (subject_id, room_id) in assignment.items():
+                bit = 1 << self.pos[ts_id]
+                lessons.append([ts_id, subject_id, room_id])
+                busy |= bit
+                counts[(self.slot_by_id[ts_id].weekday, subject_id)] += 1
+                teacher_id = self.teacher_of[cid].get(subject_id)
+                if teacher_id:
+                    self.teacher_busy[teacher_id] |= bit
+                if room_id is not None:
+                    self.room_busy[room_id] |= bit
+                    self.room_usage[room_id] += 1
+            self.lessons[cid] = lessons
+            self.class_busy[cid] = busy
+            self.day_count[cid] = counts
+
+        # Rooms each subject may use (Sport only in Sala Sport, nothing else there)
+        self.eligible_rooms: dict[int, dict[int, list[int]]] = {}
+        for cid, snap in snapshots.items():
+            by_subject = {}
+            for c in snap.curriculum:
+                rooms = [
+                    r.id for r in snap.rooms
+                    if not snap.sport_room_id
+                    or (r.id == snap.sport_room_id) == (c.subject_id == snap.sport_subject_id)
+                ]
+                by_subject[c.subject_id] = rooms or [r.id for r in snap.rooms]
+            self.eligible_rooms[cid] = by_subject
+
+    def assignments(self) -> dict[int, Assignment]:
+        return {
+            cid: {ts_id: (subject_id, room_id) for ts_id, subject_id, room_id in lessons}
+            for cid, lessons in self.lessons.items()
+        }
+
+
+def _score(terms: dict[str, float], weights: ScoreWeights) -> float:
+    return sum(getattr(weights, name) * terms[name] for name in SOFT_TERMS)
+
+
+def _soft_terms(
+    snapshots: dict[int, GenerationSnapshot],
+    assignments: dict[int, Assignment],
+    timeslots: list[SlotInfo],
+    occupied_teachers: dict[int, set[int]] | None,
+    occupied_rooms: dict[int, set[int]] | None,
+) -> dict[str, float]:
+    arr = build_timetable_array(
+        snapshots,
+        assignments,
+        timeslots=timeslots,
+        occupied_teachers=occupied_teachers,
+        occupied_rooms=occupied_rooms,
+    )
+    terms = timetable_terms(arr)
+    return {name: terms[name] for name in SOFT_TERMS}
+
+
+def score_timetables(
+    snapshots: dict[int, GenerationSnapshot],
+    assignments: dict[int, Assignment],
+    *,
+    timeslots: list[SlotInfo],
+    occupied_teachers: dict[int, set[int]] | None = None,
+    occupied_rooms: dict[int, set[int]] | None = None,
+    weights: ScoreWeights | None = None,
+) -> tuple[float, dict[str, float]]:
+    """Weighted score and its raw terms for the given timetables."""
+    weights = weights or ScoreWeights()
+    terms = _soft_terms(snapshots, assignments, timeslots, occupied_teachers, occupied_rooms)
+    return _score(terms, weights), terms
+
+
+def optimize_timetables(
+    snapshots: dict[int, GenerationSnapshot],
+    assignments: dict[int, Assignment],
+    *,
+    timeslots: list[SlotInfo],
+    occupied_teachers: dict[int, set[int]] | None = None,
+    occupied_rooms: dict[int, set[int]] | None = None,
+    max_same_subject_per_day: int = 2,
+    time_budget: float = 1.0,
+    max_moves: int | None = None,
+    weights: ScoreWeights | None = None,
+    seed: int | None = None,
+    on_progress: Callable[[float], None] | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> OptimizationResult:
+    """
+    Improve feasible `assignments` (class_id -> Assignment) with simulated
+    annealing until `time_budget` seconds (or `max_moves`) are used up.
+    Returns the best timetables seen; they satisfy the same hard constraints
+    as the input (per-day cap, teacher/room availability, no double booking).
+    `on_progress` is called with the best score so far every 256 moves, and
+    the search ends early when `stop()` returns True there.
+    """
+    weights = weights or ScoreWeights()
+    rng = random.Random(seed)
+    state = _State(snapshots, assignments, timeslots, occupied_teachers or {}, occupied_rooms or {})
+    terms = _soft_terms(snapshots, assignments, timeslots, occupied_teachers, occupied_rooms)
+    score = _score(terms, weights)
+    initial_score = score
+    best_score = score
+    best = state.assignments()
+    best_terms = dict(terms)
+
+    class_ids = [cid for cid, lessons in state.lessons.items() if len(lessons) > 1]
+    if not class_ids:
+        return OptimizationResult(best, score, initial_score, terms)
+
+    P = MAX_PERIODS_PER_DAY
+    w_idle = weights.teacher_idle
+    w_room = weights.room_balance
+    avail = {cid: snap.availability for cid, snap in snapshots.items()}
+
+    def try_swap(cid: int) -> float | None:
+        """Swap two lessons of a class; returns the delta or None if illegal/no-op."""
+        lessons = state.lessons[cid]
+        la, lb = rng.sample(lessons, 2)
+        ts_a, sa, ra = la
+        ts_b, sb, rb = lb
+        if sa == sb:
+            return None
+        pa, pb = state.pos[ts_a], state.pos[ts_b]
+        da, db = pa // P, pb // P
+        counts = state.day_count[cid]
+        if da != db and (
+            counts[(da, sb)] + 1 > max_same_subject_per_day
+            or counts[(db, sa)] + 1 > max_same_subject_per_day
+        ):
+            return None
+
+        bit_a, bit_b = 1 << pa, 1 << pb
+        masks = avail[cid]
+        ta = state.teacher_of[cid].get(sa)
+        tb = state.teacher_of[cid].get(sb)
+        if ta and masks.teacher_blocked.get(ta, 0) & bit_b:
+            return None
+        if tb and masks.teacher_blocked.get(tb, 0) & bit_a:
+            return None
+        if ta != tb:
+            if ta and state.teacher_busy[ta] & bit_b:
+                return None
+            if tb and state.teacher_busy[tb] & bit_a:
+                return None
+        if ra != rb:
+            if ra is not None and (state.room_busy[ra] & bit_b or masks.room_blocked.get(ra, 0) & bit_b):
+                return None
+            if rb is not None and (state.room_busy[rb] & bit_a or masks.room_blocked.get(rb, 0) & bit_a):
+                return None
+
+        touched = [t for t in {ta, tb} if t] if ta != tb else []
+        days = {da, db}
+        before = sum(_day_idle(state.teacher_busy[t], d) for t in touched for d in days)
+
+        # Apply
+        la[1], la[2], lb[1], lb[2] = sb, rb, sa, ra
+        if da != db:
+            counts[(da, sa)] -= 1
+            counts[(da, sb)] += 1
+            counts[(db, sb)] -= 1
+            counts[(db, sa)] += 1
+        if ta != tb:
+            if ta:
+                state.teacher_busy[ta] ^= bit_a | bit_b
+            if tb:
+                state.teacher_busy[tb] ^= bit_a | bit_b
+        if ra != rb:
+            if ra is not None:
+                state.room_busy[ra] ^= bit_a | bit_b
+            if rb is not None:
+                state.room_busy[rb] ^= bit_a | bit_b
+
+        after = sum(_day_idle(state.teacher_busy[t], d) for t in touched for d in days)
+        undo.append(("swap", cid, la, lb, ta, tb, ra, rb, da, db, sa, sb, bit_a | bit_b))
+        return w_idle * (after - before)
+
+    def try_room(cid: int) -> float | None:
+        """Move one lesson to another eligible room."""
+        lesson = rng.choice(state.lessons[cid])
+        ts_id, subject_id, room_id = lesson
+        candidates = state.eligible_rooms[cid].get(subject_id) or ()
+        if len(candidates) < 2:
+            return None
+        new_room = rng.choice(candidates)
+        if new_room == room_id:
+            return None
+        bit = 1 << state.pos[ts_id]
+        if state.room_busy[new_room] & bit or avail[cid].room_blocked.get(new_room, 0) & bit:
+            return None
+
+        usage = state.room_usage
+        delta = 2 * usage[new_room] + 1
+        state.room_busy[new_room] |= bit
+        usage[new_room] += 1
+        if room_id is not None:
+            delta += 1 - 2 * usage[room_id]
+            state.room_busy[room_id] &= ~bit
+            usage[room_id] -= 1
+        lesson[2] = new_room
+        undo.append(("room", lesson, room_id, new_room, bit))
+        return w_room * delta
+
+    def revert() -> None:
+        op = undo.pop()
+        if op[0] == "swap":
+            _, cid, la, lb, ta, tb, ra, rb, da, db, sa, sb, bits = op
+            la[1], la[2], lb[1], lb[2] = sa, ra, sb, rb
+            if da != db:
+                counts = state.day_count[cid]
+                counts[(da, sa)] += 1
+                counts[(da, sb)] -= 1
+                counts[(db, sb)] += 1
+                counts[(db, sa)] -= 1
+            if ta != tb:
+                if ta:
+                    state.teacher_busy[ta] ^= bits
+                if tb:
+                    state.teacher_busy[tb] ^= bits
+            if ra != rb:
+                if ra is not None:
+                    state.room_busy[ra] ^= bits
+                if rb is not None:
+                    state.room_busy[rb] ^= bits
+        else:
+            _, lesson, old_room, new_room, bit = op
+            state.room_busy[new_room] &= ~bit
+            state.room_usage[new_room] -= 1
+            if old_room is not None:
+                state.room_busy[old_room] |= bit
+                state.room_usage[old_room] += 1
+            lesson[2] = old_room
+
+    undo: list[tuple] = []
+    temp_start = max(w_idle, w_room, 1e-6)
+    temp_end = temp_start * 1e-3
+    started = time.perf_counter()
+    deadline = started + max(time_budget, 0.0)
+    progress = 0.0
+    moves = 0
+    accepted = 0
+    while True:
+        if max_moves is not None and moves >= max_moves:
+            break
+        if moves % 256 == 0:
+            if on_progress is not None:
+                on_progress(best_score)
+            now = time.perf_counter()
+            if now >= deadline or (stop is not None and stop()):
+                break
+            if max_moves is not None:
+                progress = moves / max_moves
+            elif time_budget > 0:
+                progress = (now - started) / time_budget
+            temp = temp_start * (temp_end / temp_start) ** progress
+        moves += 1
+
+        cid = rng.choice(class_ids)
+        delta = try_swap(cid) if rng.random() < 0.8 else try_room(cid)
+        if delta is None:
+            continue
+        if delta <= 0 or rng.random() < math.exp(-delta / temp):
+            undo.clear()
+            accepted += 1
+            score += delta
+            if score < best_score - 1e-9:
+                best_score = score
+                best = state.assignments()
+        else:
+            revert()
+
+    if best_score < initial_score:
+        best_terms = _soft_terms(snapshots, best, timeslots, occupied_teachers, occupied_rooms)
+        best_score = _score(best_terms, weights)
+
+    return OptimizationResult(
+        assignments=best,
+        score=best_score,
+        initial_score=initial_score,
+        terms=best_terms,
+        moves=moves,
+        accepted=accepted,
+        elapsed=time.perf_counter() - started,
+    )
@@ -0,0 +1,262 @@
+"""
+Writing generated timetables to `timetable_entries`.
+
+The stored cells of the classes are read once and compared with the new
+assignments; only the difference is written:
+
+- cells whose subject and room are unchanged are left alone (same id, same
+  version), so clients holding entry ids keep working after a regeneration;
+- changed cells are updated in place with their version bumped;
+- new cells are inserted and cells at timeslots the result no longer uses are
+  deleted.
+
+On PostgreSQL and SQLite the inserts and updates go out as multi-row
+INSERT ... ON CONFLICT (class_id, timeslot_id) DO UPDATE ... RETURNING
+statements (one per UPSERT_CHUNK_ROWS rows), and the returned rows become the
+result entries, so there is no per-entry refresh afterwards. Other dialects
+use a bulk UPDATE by primary key plus add_all.
+
+diff_assignments computes the plan (one SELECT) before anything is written,
+so callers can act on whether anything changed within the same transaction;
+apply_plan writes and commits it. The resulting EntryChanges per class tell
+callers (notifications, caches) what actually changed.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from timetable_shared.models import TimetableEntry
+
+# timeslot_id -> (subject_id, room_id | None)
+Assignment = dict[int, tuple[int, int | None]]
+
+# Keeps bound parameters well below the PostgreSQL/SQLite limits (5 per row)
+UPSERT_CHUNK_ROWS = 2000
+
+_UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+# (id, class_id, timeslot_id, subject_id, room_id, version)
+_Row = tuple[int, int, int, int, int | None, int]
+
+
+@dataclass
+class EntryChanges:
+    """What persisting a result did to one class's stored entries (entry ids)."""
+
+    class_id: int
+    created: list[int] = field(default_factory=list)
+    updated: list[int] = field(default_factory=list)
+    deleted: list[int] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed_count(self) -> int:
+        return len(self.created) + len(self.updated) + len(self.deleted)
+
+    @property
+    def changed(self) -> bool:
+        return self.changed_count > 0
+
+    def as_dict(self) -> dict:
+        return {
+            "created": len(self.created),
+            "updated": len(self.updated),
+            "deleted": len(self.deleted),
+            "unchanged": self.unchanged,
+        }
+
+
+def _load_stored_rows(db: Session, class_ids: list[int]) -> dict[tuple[int, int], _Row]:
+    """(class_id, timeslot_id) -> stored row, for all entries of the classes."""
+    return {
+        (int(row[1]), int(row[2])): tuple(row)
+        for row in db.query(
+            TimetableEntry.id,
+            TimetableEntry.class_id,
+            TimetableEntry.timeslot_id,
+            TimetableEntry.subject_id,
+            TimetableEntry.room_id,
+            TimetableEntry.version,
+        )
+        .filter(TimetableEntry.class_id.in_(class_ids))
+        .all()
+    }
+
+
+def _upsert_rows(db: Session, insert, rows: list[dict]) -> list[_Row]:
+    table = TimetableEntry.__table__
+    returned: list[_Row] = []
+    for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+        stmt = insert(TimetableEntry).values(rows[start:start + UPSERT_CHUNK_ROWS])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.class_id, table.c.timeslot_id],
+            set_={
+                "subject_id": stmt.excluded.subject_id,
+                "room_id": stmt.excluded.room_id,
+                "version": table.c.version + 1,
+            },
+        ).returning(
+            table.c.id,
+            table.c.class_id,
+            table.c.timeslot_id,
+            table.c.subject_id,
+            table.c.room_id,
+            table.c.version,
+        )
+        returned.extend(tuple(r) for r in db.execute(stmt).all())
+    return returned
+
+
+def _write_rows_portable(db: Session, rows: list[dict], stored: dict[tuple[int, int], _Row]) -> list[_Row]:
+    """Dialects without ON CONFLICT ... RETURNING: bulk UPDATE by id, add_all for new cells."""
+    updates = []
+    created = []
+    for row in rows:
+        old = stored.get((row["class_id"], row["timeslot_id"]))
+        if old is None:
+            created.append(TimetableEntry(**row))
+        else:
+            updates.append({**row, "id": old[0], "version": old[5] + 1})
+    if updates:
+        db.execute(update(TimetableEntry), updates)
+    if created:
+        db.add_all(created)
+        db.flush()
+    return [
+        (u["id"], u["class_id"], u["timeslot_id"], u["subject_id"], u["room_id"], u["version"])
+        for u in updates
+    ] + [(e.id, e.class_id, e.timeslot_id, e.subject_id, e.room_id, e.version) for e in created]
+
+
+@dataclass
+class PersistPlan:
+    """The writes needed to make the stored entries equal a result (see diff_assignments)."""
+
+    class_ids: list[int]
+    # Stored rows of the planned classes, keyed by (class_id, timeslot_id)
+    stored: dict[tuple[int, int], _Row]
+    # Stored rows that stay as they are
+    kept: list[_Row] = field(default_factory=list)
+    # New and changed cells, as insert parameters
+    rows: list[dict] = field(default_factory=list)
+    deleted_ids: list[int] = field(default_factory=list)
+    # Per class; created/updated ids are filled in by apply_plan
+    changes: dict[int, EntryChanges] = field(default_factory=dict)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.rows or self.deleted_ids)
+
+
+def diff_assignments(
+    db: Session,
+    assignments: dict[int, Assignment],
+    *,
+    only_changed: bool = True,
+) -> PersistPlan:
+    """
+    Compare `assignments` with the stored entries of its classes (one SELECT).
+    With `only_changed` False every cell is planned for rewriting.
+    """
+    class_ids = list(assignments)
+    plan = PersistPlan(class_ids=class_ids, stored=_load_stored_rows(db, class_ids) if class_ids else {})
+    plan.changes = {cid: EntryChanges(cid) for cid in class_ids}
+    for cid, assignment in assignments.items():
+        for ts_id, (subj_id, room_id) in sorted(assignment.items()):
+            old = plan.stored.get((cid, ts_id))
+            if old is not None and only_changed and (old[3], old[4]) == (subj_id, room_id):
+                plan.kept.append(old)
+                plan.changes[cid].unchanged += 1
+                continue
+            plan.rows.append(
+                {
+                    "class_id": cid,
+                    "timeslot_id": ts_id,
+                    "subject_id": subj_id,
+                    "room_id": room_id,
+                    "version": 1,
+                }
+            )
+    for (cid, ts_id), old in plan.stored.items():
+        if ts_id not in assignments[cid]:
+            plan.deleted_ids.append(old[0])
+            plan.changes[cid].deleted.append(old[0])
+    return plan
+
+
+def apply_plan(db: Session, plan: PersistPlan) -> dict[int, list[TimetableEntry]]:
+    """
+    Execute the writes of `plan` and commit (together with anything else
+    pending in the session). Returns class_id -> entries ordered by timeslot
+    and records the created/updated entry ids on plan.changes.
+    """
+    written: list[_Row] = []
+    try:
+        if plan.deleted_ids:
+            db.query(TimetableEntry).filter(TimetableEntry.id.in_(plan.deleted_ids)).delete(
+                synchronize_session=False
+            )
+        if plan.rows:
+            dialect = db.get_bind().dialect
+            insert = _UPSERT_INSERTS.get(dialect.name) if dialect.insert_returning else None
+            if insert is not None:
+                written = _upsert_rows(db, insert, plan.rows)
+            else:
+                written = _write_rows_portable(db, plan.rows, plan.stored)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise
+
+    stored_ids = {old[0] for old in plan.stored.values()}
+    for row in written:
+        bucket = plan.changes[row[1]].updated if row[0] in stored_ids else plan.changes[row[1]].created
+        bucket.append(row[0])
+
+    # Build the entries from the rows already in hand and attach them as
+    # clean, loaded objects (no SELECT per entry)
+    entries_by_class: dict[int, list[TimetableEntry]] = {cid: [] for cid in plan.class_ids}
+    for entry_id, cid, ts_id, subj_id, room_id, version in sorted(plan.kept + written, key=lambda r: (r[1], r[2])):
+        entry = TimetableEntry(
+            id=entry_id,
+            class_id=cid,
+            timeslot_id=ts_id,
+            subject_id=subj_id,
+            room_id=room_id,
+            version=version,
+        )
+        make_transient_to_detached(entry)
+        entries_by_class[cid].append(db.merge(entry, load=False))
+    return entries_by_class
+
+
+def persist_assignments(
+    db: Session,
+    assignments: dict[int, Assignment],
+    *,
+    only_changed: bool = True,
+    changes: dict[int, EntryChanges] | None = None,
+) -> dict[int, list[TimetableEntry]]:
+    """
+    Make the stored entries of every class in `assignments` equal to it, in
+    one transaction, writing only the cells that differ (with `only_changed`
+    False every cell is rewritten and gets a new version). Returns
+    class_id -> entries ordered by timeslot; pass a dict as `changes` to
+    receive the EntryChanges of each class.
+    """
+    if not assignments:
+        return {}
+    plan = diff_assignments(db, assignments, only_changed=only_changed)
+    entries_by_class = apply_plan(db, plan)
+    if changes is not None:
+        changes.update(plan.changes)
+    return entries_by_class
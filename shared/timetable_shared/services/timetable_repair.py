@@ -0,0 +1,522 @@
+"""
+Minimal-perturbation repair of an existing class timetable.
+
+After a TeacherAvailability/RoomAvailability or curriculum change only a few
+cells of a timetable usually become invalid. Instead of deleting the class's
+entries and generating from scratch, the repair:
+
+1. finds the affected cells (teacher now unavailable, surplus hours of a
+   subject, per-day cap exceeded, missing slots; or only the room is wrong);
+2. re-solves just those cells with the backtracking solver, every other cell
+   pinned to its current subject, widening to the whole affected days and
+   finally to the whole class only if the smaller neighbourhood has no solution
+   (freed cells that were not affected prefer their current subject);
+3. updates the changed entries in place (ids kept, version bumped), so
+   unrelated entries, client state and caches stay valid.
+
+Teachers busy in other classes count as unavailable, and the repair holds the
+same advisory locks as a generation run (see timetable_locks): the teacher
+locks for the whole repair, the room lock while rooms are re-checked against
+the current occupancy and the entries are written. The repair runs inside
+request handlers, so it does not wait for teacher locks held by a running
+solve: the class gets a regular generation job instead. A cell left without
+a usable room keeps no room and is reported as a conflict.
+"""
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from timetable_shared.models import Curriculum, TimeSlot, TimetableEntry, TimetableJob
+from timetable_shared.services.availability_masks import AvailabilityMasks
+from timetable_shared.services.timetable_csp import solve_class_csp
+from timetable_shared.services.timetable_generator import supersede_older_jobs
+from timetable_shared.services.timetable_locks import room_lock, try_teacher_locks
+from timetable_shared.services.timetable_rooms import assign_rooms
+from timetable_shared.services.timetable_solver import (
+    get_preferred_timeslots,
+    group_timeslots_by_day,
+    validate_snapshot,
+)
+from timetable_shared.services.timetable_snapshot import (
+    GenerationSnapshot,
+    SlotInfo,
+    load_class_grids,
+    load_generation_snapshot,
+    load_room_occupancy,
+)
+
+# Neighbourhoods tried in order, smallest first
+SCOPE_CELLS = "cells"
+SCOPE_DAYS = "days"
+SCOPE_CLASS = "class"
+
+# Per-class outcome of repair_or_regenerate
+REPAIR_CHANGED = "repaired"
+REPAIR_UNCHANGED = "unchanged"
+REPAIR_QUEUED = "queued"  # could not be repaired, a generation job was queued
+REPAIR_FAILED = "failed"  # could not be repaired nor queued
+REPAIR_INCOMPLETE = "curriculum_incomplete"  # hours do not fill the grid (yet); left as is
+
+
+class TeachersBusy(ValueError):
+    """A running solve holds the advisory lock of a teacher of the class."""
+
+
+@dataclass
+class RepairResult:
+    class_id: int
+    # Entries whose subject/room changed or that were created
+    changed: list[TimetableEntry] = field(default_factory=list)
+    unchanged: int = 0
+    # Cells whose subject had to be re-solved / whose room had to be re-picked
+    affected_cells: int = 0
+    affected_rooms: int = 0
+    scope: str | None = None
+    # Cells left without a usable room, in the ConflictReport format
+    conflicts: list[dict] = field(default_factory=list)
+    # Why the class could not be repaired (repair_timetables only; nothing was changed)
+    error: str | None = None
+
+
+def _room_is_valid(snapshot: GenerationSnapshot, ts, subject_id: int, room_id: int | None) -> bool:
+    if room_id is None:
+        return not snapshot.rooms
+    if room_id not in {r.id for r in snapshot.rooms}:
+        return False
+    if room_id in snapshot.occupied_rooms.get(ts.id, ()):
+        return False
+    if not snapshot.is_room_available(room_id, ts.weekday, ts.index_in_day):
+        return False
+    if snapshot.sport_room_id:
+        is_sport_room = room_id == snapshot.sport_room_id
+        is_sport_subject = subject_id == snapshot.sport_subject_id
+        if is_sport_room != is_sport_subject:
+            return False
+    return True
+
+
+def find_affected_cells(
+    snapshot: GenerationSnapshot,
+    entries: Iterable[TimetableEntry],
+    *,
+    max_same_subject_per_day: int = 2,
+) -> tuple[set[int], set[int]]:
+    """
+    Return (subject_cells, room_cells) as timeslot ids: cells whose subject must
+    be re-solved and cells that keep their subject but need another room.
+    """
+    slot_by_id = snapshot.slot_by_id
+    hours = {c.subject_id: c.hours_per_week for c in snapshot.curriculum}
+    teacher_of = {c.subject_id: c.teacher_id for c in snapshot.curriculum}
+    entry_by_ts = {e.timeslot_id: e for e in entries if e.timeslot_id in slot_by_id}
+
+    subject_cells: set[int] = {ts_id for ts_id in slot_by_id if ts_id not in entry_by_ts}
+    for ts_id, e in entry_by_ts.items():
+        ts = slot_by_id[ts_id]
+        if e.subject_id not in hours:
+            subject_cells.add(ts_id)
+        elif not snapshot.is_teacher_available(teacher_of[e.subject_id], ts.weekday, ts.index_in_day):
+            subject_cells.add(ts_id)
+        elif teacher_of[e.subject_id] in snapshot.occupied_teachers.get(ts_id, ()):
+            # The teacher teaches another class at this slot
+            subject_cells.add(ts_id)
+
+    # Latest cells give way first when a subject has too many hours
+    def latest_first(ts_ids):
+        return sorted(ts_ids, key=lambda t: (slot_by_id[t].index_in_day, slot_by_id[t].weekday), reverse=True)
+
+    kept_by_subject: dict[int, list[int]] = defaultdict(list)
+    for ts_id, e in entry_by_ts.items():
+        if ts_id not in subject_cells:
+            kept_by_subject[e.subject_id].append(ts_id)
+    for subject_id, ts_ids in kept_by_subject.items():
+        surplus = len(ts_ids) - hours[subject_id]
+        if surplus > 0:
+            subject_cells.update(latest_first(ts_ids)[:surplus])
+
+    per_day: dict[tuple[int, int], list[int]] = defaultdict(list)
+    for ts_id, e in entry_by_ts.items():
+        if ts_id not in subject_cells:
+            per_day[(slot_by_id[ts_id].weekday, e.subject_id)].append(ts_id)
+    for ts_ids in per_day.values():
+        extra = len(ts_ids) - max_same_subject_per_day
+        if extra > 0:
+            subject_cells.update(latest_first(ts_ids)[:extra])
+
+    room_cells = {
+        ts_id
+        for ts_id, e in entry_by_ts.items()
+        if ts_id not in subject_cells
+        and not _room_is_valid(snapshot, slot_by_id[ts_id], e.subject_id, e.room_id)
+    }
+    return subject_cells, room_cells
+
+
+def repair_timetable_for_class(
+    db: Session,
+    class_id: int,
+    *,
+    max_same_subject_per_day: int = 2,
+    availability: AvailabilityMasks | None = None,
+) -> RepairResult:
+    """
+    Repair the stored timetable of `class_id` in place, re-solving only the
+    cells that no longer satisfy the constraints. Raises ValueError when the
+    class cannot be repaired (e.g. curriculum does not sum to the slot count),
+    TeachersBusy when a running solve holds one of its teachers.
+    """
+    with try_teacher_locks(db, [class_id]) as locked:
+        if not locked:
+            raise TeachersBusy(f"A running generation holds teachers of class {class_id}")
+        return _repair_class(
+            db,
+            class_id,
+            max_same_subject_per_day=max_same_subject_per_day,
+            availability=availability,
+        )
+
+
+def _repair_class(
+    db: Session,
+    class_id: int,
+    *,
+    max_same_subject_per_day: int,
+    availability: AvailabilityMasks | None,
+) -> RepairResult:
+    snapshot = load_generation_snapshot(db, class_id, availability=availability)
+    validate_snapshot(snapshot)
+
+    entries = db.query(TimetableEntry).filter(TimetableEntry.class_id == class_id).all()
+    result = RepairResult(class_id=class_id)
+    subject_cells, room_cells = find_affected_cells(
+        snapshot, entries, max_same_subject_per_day=max_same_subject_per_day
+    )
+    result.affected_cells = len(subject_cells)
+    result.affected_rooms = len(room_cells)
+    if not subject_cells and not room_cells:
+        result.unchanged = len(entries)
+        return result
+
+    slot_by_id = snapshot.slot_by_id
+    entry_by_ts = {e.timeslot_id: e for e in entries if e.timeslot_id in slot_by_id}
+    preferred_slots = get_preferred_timeslots(group_timeslots_by_day(snapshot.timeslots))
+
+    placement = {ts_id: e.subject_id for ts_id, e in entry_by_ts.items()}
+    if subject_cells:
+        affected_days = {slot_by_id[ts_id].weekday for ts_id in subject_cells}
+        neighbourhoods = [
+            (SCOPE_CELLS, subject_cells),
+            (SCOPE_DAYS, {ts.id for ts in snapshot.timeslots if ts.weekday in affected_days}),
+            (SCOPE_CLASS, set(slot_by_id)),
+        ]
+        reason = None
+        for scope, free in neighbourhoods:
+            solved = solve_class_csp(
+                snapshot,
+                max_same_subject_per_day=max_same_subject_per_day,
+                preferred_slots=preferred_slots,
+                taken_teachers=snapshot.occupied_teachers,
+                fixed={ts_id: s for ts_id, s in placement.items() if ts_id not in free},
+                hints={ts_id: s for ts_id, s in placement.items() if ts_id not in subject_cells},
+                max_steps=20_000 if scope != SCOPE_CLASS else 200_000,
+            )
+            if solved.solved:
+                placement = solved.placement
+                result.scope = scope
+                break
+            reason = solved.reason
+        else:
+            raise ValueError(f"Could not repair timetable for class {class_id} ({reason})")
+
+    with room_lock(db):
+        # Other runs may have taken rooms since the snapshot was loaded
+        occupied_rooms, room_usage = load_room_occupancy(db, [class_id], snapshot.grid)
+        snapshot = replace(snapshot, occupied_rooms=occupied_rooms, room_usage=room_usage)
+        rooms = _repair_rooms(snapshot, placement, entry_by_ts, preferred_slots, result)
+
+        for ts in preferred_slots:
+            subject_id = placement[ts.id]
+            entry = entry_by_ts.get(ts.id)
+            if ts.id not in rooms:
+                result.unchanged += 1
+                continue
+            room_id = rooms[ts.id]
+            if entry is None:
+                entry = TimetableEntry(
+                    class_id=class_id,
+                    timeslot_id=ts.id,
+                    subject_id=subject_id,
+                    room_id=room_id,
+                    version=1,
+                )
+                db.add(entry)
+            elif entry.subject_id == subject_id and entry.room_id == room_id:
+                result.unchanged += 1
+                continue
+            else:
+                entry.subject_id = subject_id
+                entry.room_id = room_id
+                entry.version = (entry.version or 1) + 1
+            result.changed.append(entry)
+
+        if result.changed:
+            db.commit()
+    for entry in result.changed:
+        db.refresh(entry)
+    return result
+
+
+def _repair_rooms(
+    snapshot: GenerationSnapshot,
+    placement: dict[int, int],
+    entry_by_ts: dict[int, TimetableEntry],
+    preferred_slots: list[SlotInfo],
+    result: RepairResult,
+) -> dict[int, int | None]:
+    """
+    Rooms for the cells whose subject changed or whose room is no longer
+    valid (timeslot_id -> room_id), matched like a generation run against
+    the other classes and the cells that keep their room. A room blocked at
+    the slot is never given: the cell gets no room and a conflict instead.
+    """
+    kept: set[int] = set()
+    for ts in preferred_slots:
+        entry = entry_by_ts.get(ts.id)
+        if (
+            entry is not None
+            and entry.subject_id == placement[ts.id]
+            and _room_is_valid(snapshot, ts, entry.subject_id, entry.room_id)
+        ):
+            kept.add(ts.id)
+    usage = Counter(snapshot.room_usage)
+    usage.update(entry_by_ts[ts_id].room_id for ts_id in kept if entry_by_ts[ts_id].room_id is not None)
+
+    cells = {ts.id: placement[ts.id] for ts in preferred_slots if ts.id not in kept}
+    assignments, _ = assign_rooms(
+        {snapshot.class_id: snapshot},
+        {snapshot.class_id: cells},
+        timeslots=preferred_slots,
+        occupied_rooms=snapshot.occupied_rooms,
+        room_usage=usage,
+    )
+    rooms: dict[int, int | None] = {}
+    for ts_id, (_, room_id) in assignments[snapshot.class_id].items():
+        ts = snapshot.slot_by_id[ts_id]
+        if room_id is not None and not snapshot.is_room_available(room_id, ts.weekday, ts.index_in_day):
+            room_id = None
+        if room_id is None and snapshot.rooms:
+            result.conflicts.append({
+                "type": "room_unavailable",
+                "details": (
+                    f"No available room for class {snapshot.class_id} "
+                    f"at weekday {ts.weekday}, hour {ts.index_in_day}"
+                ),
+            })
+        rooms[ts_id] = room_id
+    return rooms
+
+
+def classes_affected_by_teacher(db: Session, teacher_id: int) -> list[int]:
+    """Classes with a stored timetable in which `teacher_id` teaches."""
+    return [
+        int(cid)
+        for (cid,) in (
+            db.query(Curriculum.class_id)
+            .filter(Curriculum.teacher_id == teacher_id)
+            .filter(
+                Curriculum.class_id.in_(db.query(TimetableEntry.class_id).distinct())
+            )
+            .distinct()
+            .all()
+        )
+    ]
+
+
+def classes_affected_by_room(db: Session, room_id: int) -> list[int]:
+    """Classes with at least one entry in `room_id`."""
+    return [
+        int(cid)
+        for (cid,) in (
+            db.query(TimetableEntry.class_id)
+            .filter(TimetableEntry.room_id == room_id)
+            .distinct()
+            .all()
+        )
+    ]
+
+
+def incomplete_curricula(db: Session, class_ids: Iterable[int]) -> dict[int, tuple[int, int]]:
+    """
+    class_id -> (curriculum hours, slots of its grid) for the classes whose
+    curriculum does not fill their timeslot grid exactly, e.g. while it is
+    edited row by row. Neither a repair nor a generation job can succeed
+    for them.
+    """
+    grids = load_class_grids(db, class_ids)
+    if not grids:
+        return {}
+    hours = dict(
+        db.query(Curriculum.class_id, func.sum(Curriculum.hours_per_week))
+        .filter(Curriculum.class_id.in_(list(grids)))
+        .group_by(Curriculum.class_id)
+        .all()
+    )
+    slots = dict(
+        db.query(TimeSlot.grid, func.count(TimeSlot.id))
+        .filter(TimeSlot.grid.in_(set(grids.values())))
+        .group_by(TimeSlot.grid)
+        .all()
+    )
+    incomplete: dict[int, tuple[int, int]] = {}
+    for cid, grid in grids.items():
+        total, slot_count = int(hours.get(cid) or 0), int(slots.get(grid) or 0)
+        if total != slot_count or not slot_count:
+            incomplete[cid] = (total, slot_count)
+    return incomplete
+
+
+def repair_timetables(
+    db: Session,
+    class_ids: Iterable[int],
+    *,
+    max_same_subject_per_day: int = 2,
+    availability: AvailabilityMasks | None = None,
+) -> dict[int, RepairResult]:
+    """
+    Repair several classes one after another (each commits its own changes,
+    so later classes see the rooms taken by earlier ones). Classes without a
+    stored timetable are skipped; classes that cannot be repaired are left
+    untouched and reported with the reason in `error` (see
+    queue_generation_jobs for a fallback).
+    """
+    results: dict[int, RepairResult] = {}
+    for class_id in dict.fromkeys(int(cid) for cid in class_ids):
+        has_entries = (
+            db.query(TimetableEntry.id).filter(TimetableEntry.class_id == class_id).first()
+        )
+        if not has_entries:
+            continue
+        try:
+            results[class_id] = repair_timetable_for_class(
+                db,
+                class_id,
+                max_same_subject_per_day=max_same_subject_per_day,
+                availability=availability,
+            )
+        except ValueError as e:
+            db.rollback()
+            print(f"Timetable repair skipped for class {class_id}: {e}")
+            results[class_id] = RepairResult(class_id=class_id, error=str(e))
+    return results
+
+
+def queue_generation_jobs(db: Session, class_ids: Iterable[int], username: str = "sistem") -> dict[int, int]:
+    """
+    Queue a regular generation job (bulk lane) for each class, e.g. for the
+    classes a repair could not fix, so the outcome shows up in the job table.
+    Older pending or retrying jobs of the classes are superseded as by
+    POST /generate.
+    Returns class_id -> job id for the jobs that were published.
+    """
+    from timetable_shared.services import audit as audit_service
+    from timetable_shared.services.rabbitmq_client import LANE_BULK, publish_timetable_generation_job
+
+    queued: dict[int, int] = {}
+    for class_id in dict.fromkeys(int(cid) for cid in class_ids):
+        job = TimetableJob(class_id=class_id, status="pending")
+        db.add(job)
+        db.flush()  # Get ID before superseding
+        supersede_older_jobs(db, [job])
+        # Committed before publishing: the worker drops messages of unknown jobs
+        db.commit()
+        if not publish_timetable_generation_job(class_id, job.id, lane=LANE_BULK):
+            print(f"Failed to queue generation job for class {class_id}")
+            job.status = "failed"
+            job.error_message = "Failed to queue generation job"
+            job.completed_at = datetime.utcnow()
+            db.commit()
+            continue
+        queued[class_id] = job.id
+        audit_service.log_action(
+            db,
+            username=username,
+            action="timetable_generation_queued",
+            resource_type="timetable",
+            resource_id=job.id,
+            details=f"Queued generation for class {class_id} (timetable repair failed)",
+        )
+    return queued
+
+
+def repair_or_regenerate(
+    db: Session,
+    class_ids: Iterable[int],
+    *,
+    username: str = "sistem",
+    max_same_subject_per_day: int = 2,
+    availability: AvailabilityMasks | None = None,
+) -> dict[int, str]:
+    """
+    Repair the classes (see repair_timetables), notify the changed ones and
+    queue a regular generation job for every class that could not be
+    repaired. Classes whose curriculum does not fill their grid are left
+    alone (REPAIR_INCOMPLETE): a job for them could only fail. Returns
+    class_id -> REPAIR_* status for the classes that have a stored timetable.
+    """
+    class_ids = list(dict.fromkeys(int(cid) for cid in class_ids))
+    incomplete = incomplete_curricula(db, class_ids)
+    results = repair_timetables(
+        db,
+        [cid for cid in class_ids if cid not in incomplete],
+        max_same_subject_per_day=max_same_subject_per_day,
+        availability=availability,
+    )
+    notify_repaired(db, results, username)
+    unrepaired = [cid for cid, r in results.items() if r.error]
+    queued = queue_generation_jobs(db, unrepaired, username) if unrepaired else {}
+    statuses: dict[int, str] = {}
+    if incomplete:
+        for (cid,) in (
+            db.query(TimetableEntry.class_id)
+            .filter(TimetableEntry.class_id.in_(list(incomplete)))
+            .distinct()
+        ):
+            statuses[int(cid)] = REPAIR_INCOMPLETE
+    for cid, r in results.items():
+        if r.error:
+            statuses[cid] = REPAIR_QUEUED if cid in queued else REPAIR_FAILED
+        else:
+            statuses[cid] = REPAIR_CHANGED if r.changed else REPAIR_UNCHANGED
+    return statuses
+
+
+def notify_repaired(db: Session, results: dict[int, RepairResult], username: str = "sistem") -> None:
+    """Publish one "timetable_updated" event per class whose entries actually changed."""
+    from timetable_shared.models import SchoolClass
+    from timetable_shared.services.rabbitmq_client import publish_notification_event
+
+    changed_ids = [cid for cid, r in results.items() if r.changed]
+    if not changed_ids:
+        return
+    class_names = {
+        c.id: c.name
+        for c in db.query(SchoolClass).filter(SchoolClass.id.in_(changed_ids)).all()
+    }
+    for cid in changed_ids:
+        try:
+            publish_notification_event(
+                "timetable_updated",
+                {
+                    "class_id": cid,
+                    "class_name": class_names.get(cid, f"clasa {cid}"),
+                    "username": username,
+                },
+            )
+        except Exception as e:
+            print(f"Failed to publish notification event: {e}")
@@ -0,0 +1,177 @@
+"""
+Room assignment as a separate stage after the subjects are placed.
+
+The constructive strategies only decide which subject a class has at each
+slot. Rooms are then given slot by slot: at every timeslot the classes having
+a lesson there and the rooms free there form a min-cost bipartite assignment
+(solved exactly with the Hungarian method), instead of each class grabbing
+the least used room in turn and leaving a later class without one.
+
+Cost of giving room r to the lesson of class c:
+
+- not a room of c (too small) or taken by a class outside the solve: forbidden;
+- Sport rule broken (Sport outside Sala Sport, or another subject in it):
+  COST_INCOMPATIBLE, so it only happens when nothing compatible is left;
+- room blocked at the slot: COST_BLOCKED (a conflict is reported);
+- spare seats: COST_SPARE_SEAT per seat, so large rooms stay free for large
+  classes;
+- usage balance: 2u + 1 for a room already used u times, i.e. the growth of
+  the optimizer's squared-usage room balance term.
+
+Every lesson can also stay without a room at COST_NO_ROOM (reported as a
+room_unavailable conflict), so the assignment always exists.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+
+from timetable_shared.services.timetable_snapshot import GenerationSnapshot, SlotInfo
+
+# timeslot_id -> (subject_id, room_id | None)
+Assignment = dict[int, tuple[int, int | None]]
+# timeslot_id -> subject_id (a class's lessons before rooms are given)
+Placement = dict[int, int]
+
+COST_SPARE_SEAT = 2.0
+COST_INCOMPATIBLE = 1_000.0
+COST_BLOCKED = 100_000.0
+COST_NO_ROOM = 1_000_000.0
+_FORBIDDEN = 10 * COST_NO_ROOM
+
+
+def min_cost_assignment(costs: list[list[float]]) -> list[int]:
+    """
+    Hungarian method (shortest augmenting paths with potentials), O(n^2 m)
+    for n rows and m >= n columns. Returns the column of every row.
+    """
+    n = len(costs)
+    if not n:
+        return []
+    m = len(costs[0])
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    # match[j]: row (1-based) matched to column j (1-based); 0 = free
+    match = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_to = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            row = costs[i0 - 1]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                reduced = row[j - 1] - u[i0] - v[j]
+                if reduced < min_to[j]:
+                    min_to[j] = reduced
+                    way[j] = j0
+                if min_to[j] < delta:
+                    delta = min_to[j]
+                    j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_to[j] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    result = [0] * n
+    for j in range(1, m + 1):
+        if match[j]:
+            result[match[j] - 1] = j - 1
+    return result
+
+
+def _room_cost(snapshot: GenerationSnapshot, ts: SlotInfo, subject_id: int, room, usage: int) -> float:
+    cost = 2 * usage + 1 + COST_SPARE_SEAT * max(0, room.capacity - snapshot.student_count)
+    sport_room_id = snapshot.sport_room_id
+    if sport_room_id and (room.id == sport_room_id) != (subject_id == snapshot.sport_subject_id):
+        cost += COST_INCOMPATIBLE
+    if not snapshot.is_room_available(room.id, ts.weekday, ts.index_in_day):
+        cost += COST_BLOCKED
+    return cost
+
+
+def assign_rooms(
+    snapshots: dict[int, GenerationSnapshot],
+    placements: dict[int, Placement],
+    *,
+    timeslots: list[SlotInfo],
+    occupied_rooms: dict[int, set[int]],
+    room_usage: dict[int, int],
+) -> tuple[dict[int, Assignment], dict[int, list[dict]]]:
+    """
+    Give every placed lesson of `placements` (class_id -> timeslot_id ->
+    subject_id) a room, one min-cost assignment per timeslot.
+    `occupied_rooms` (timeslot_id -> room ids) are rooms used by classes
+    outside the solve and `room_usage` their usage counts (not modified).
+    Returns (class_id -> Assignment, class_id -> room conflicts).
+    """
+    usage = defaultdict(int, room_usage)
+    assignments: dict[int, Assignment] = {cid: {} for cid in placements}
+    conflicts: dict[int, list[dict]] = {cid: [] for cid in placements}
+
+    for ts in timeslots:
+        lessons = [
+            (cid, placement[ts.id])
+            for cid, placement in placements.items()
+            if ts.id in placement
+        ]
+        if not lessons:
+            continue
+        busy = occupied_rooms.get(ts.id, ())
+        columns: dict[int, int] = {}
+        rooms = []
+        for cid, _ in lessons:
+            for room in snapshots[cid].rooms:
+                if room.id not in busy and room.id not in columns:
+                    columns[room.id] = len(rooms)
+                    rooms.append(room)
+
+        costs = []
+        for cid, subject_id in lessons:
+            snapshot = snapshots[cid]
+            row = [_FORBIDDEN] * len(rooms) + [COST_NO_ROOM] * len(lessons)
+            for room in snapshot.rooms:
+                column = columns.get(room.id)
+                if column is not None:
+                    row[column] = _room_cost(snapshot, ts, subject_id, room, usage[room.id])
+            costs.append(row)
+
+        if len(lessons) == 1:
+            row = costs[0]
+            picks = [min(range(len(row)), key=row.__getitem__)]
+        else:
+            picks = min_cost_assignment(costs)
+
+        for (cid, subject_id), column in zip(lessons, picks):
+            snapshot = snapshots[cid]
+            room_id = rooms[column].id if column < len(rooms) else None
+            assignments[cid][ts.id] = (subject_id, room_id)
+            if room_id is not None:
+                usage[room_id] += 1
+                if snapshot.is_room_available(room_id, ts.weekday, ts.index_in_day):
+                    continue
+                details = f"Room {room_id} is unavailable but the only one left for class {cid}"
+            elif snapshot.rooms:
+                details = f"No available room for class {cid}"
+            else:
+                continue
+            conflicts[cid].append({
+                "type": "room_unavailable",
+                "details": f"{details} at weekday {ts.weekday}, hour {ts.index_in_day}",
+            })
+    return assignments, conflicts
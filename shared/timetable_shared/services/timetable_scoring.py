@@ -0,0 +1,301 @@
+"""
+Dense array view of timetables for scoring and reporting.
+
+A set of class timetables is held as integer arrays of shape
+[classes, days, periods] (period p is index_in_day p + 1, 0 means empty):
+
+- subjects: subject id of every cell
+- teachers: teacher id teaching the cell (from the class's curriculum)
+- rooms:    room id of the cell
+
+Lessons of classes outside the set are carried as fixed teacher/room
+bookings, so teacher-side terms see the whole school. All terms are computed
+with vectorized NumPy operations over these arrays:
+
+- late_hours, student_gaps, teacher_idle, room_balance: the soft terms of
+  timetable_optimizer (same definitions, same numbers);
+- subject_day_overflow: lessons above the per-day cap of a subject;
+- teacher_conflicts / room_conflicts: extra bookings of a teacher / room at
+  the same weekday and hour.
+
+NumPy is optional: without it the same terms are computed with plain loops
+over nested lists.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from timetable_shared.models import Curriculum, TimeSlot, TimetableEntry
+from timetable_shared.services.timetable_snapshot import GenerationSnapshot, SlotInfo
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python fallback below
+    np = None
+
+# timeslot_id -> (subject_id, room_id | None)
+Assignment = dict[int, tuple[int, int | None]]
+
+# Lessons at this index_in_day or later count as late
+LATE_HOUR_FROM = 6
+
+SOFT_TERMS = ("late_hours", "student_gaps", "teacher_idle", "room_balance")
+HARD_TERMS = ("subject_day_overflow", "teacher_conflicts", "room_conflicts")
+
+
+@dataclass
+class TimetableArray:
+    class_ids: list[int]
+    days: int
+    periods: int
+    # [classes, days, periods] arrays (nested lists without NumPy)
+    subjects: Any
+    teachers: Any
+    rooms: Any
+    # (teacher_id | room_id, day, period) bookings of classes outside the set
+    fixed_teachers: list[tuple[int, int, int]] = field(default_factory=list)
+    fixed_rooms: list[tuple[int, int, int]] = field(default_factory=list)
+
+    @property
+    def vectorized(self) -> bool:
+        return np is not None and not isinstance(self.subjects, list)
+
+
+def _new_layers(classes: int, days: int, periods: int) -> list[list[list[list[int]]]]:
+    return [
+        [[[0] * periods for _ in range(days)] for _ in range(classes)]
+        for _ in range(3)
+    ]
+
+
+def _finish_array(
+    class_ids: list[int],
+    days: int,
+    periods: int,
+    layers: list,
+    fixed_teachers: list[tuple[int, int, int]],
+    fixed_rooms: list[tuple[int, int, int]],
+) -> TimetableArray:
+    if np is not None:
+        shape = (len(class_ids), days, periods)
+        layers = [np.array(layer, dtype=np.int64).reshape(shape) for layer in layers]
+    subjects, teachers, rooms = layers
+    return TimetableArray(class_ids, days, periods, subjects, teachers, rooms, fixed_teachers, fixed_rooms)
+
+
+def build_timetable_array(
+    snapshots: dict[int, GenerationSnapshot],
+    assignments: dict[int, Assignment],
+    *,
+    timeslots: list[SlotInfo],
+    occupied_teachers: dict[int, set[int]] | None = None,
+    occupied_rooms: dict[int, set[int]] | None = None,
+) -> TimetableArray:
+    """Array view of solver output (class_id -> Assignment) on one timeslot grid."""
+    cell = {ts.id: (ts.weekday, ts.index_in_day - 1) for ts in timeslots}
+    days = max((d for d, _ in cell.values()), default=-1) + 1
+    periods = max((p for _, p in cell.values()), default=-1) + 1
+    class_ids = sorted(assignments)
+    layers = _new_layers(len(class_ids), days, periods)
+    subjects, teachers, rooms = layers
+    for c, cid in enumerate(class_ids):
+        teacher_of = {item.subject_id: item.teacher_id for item in snapshots[cid].curriculum}
+        for ts_id, (subject_id, room_id) in assignments[cid].items():
+            d, p = cell[ts_id]
+            subjects[c][d][p] = subject_id
+            teachers[c][d][p] = teacher_of.get(subject_id) or 0
+            rooms[c][d][p] = room_id or 0
+
+    fixed_teachers = [
+        (t, *cell[ts_id])
+        for ts_id, ids in (occupied_teachers or {}).items()
+        if ts_id in cell
+        for t in ids
+    ]
+    fixed_rooms = [
+        (r, *cell[ts_id])
+        for ts_id, ids in (occupied_rooms or {}).items()
+        if ts_id in cell
+        for r in ids
+    ]
+    return _finish_array(class_ids, days, periods, layers, fixed_teachers, fixed_rooms)
+
+
+def load_timetable_array(db: Session, class_ids: list[int] | None = None) -> TimetableArray:
+    """
+    Array view of the stored timetables (all classes when `class_ids` is None),
+    in three bulk queries. Classes on different grids share the weekday/hour
+    axes, so a teacher at the same weekday and hour in two grids is a conflict.
+    """
+    query = db.query(
+        TimetableEntry.class_id,
+        TimetableEntry.subject_id,
+        TimetableEntry.room_id,
+        TimeSlot.weekday,
+        TimeSlot.index_in_day,
+    ).join(TimeSlot, TimeSlot.id == TimetableEntry.timeslot_id)
+    teacher_query = db.query(Curriculum.class_id, Curriculum.subject_id, Curriculum.teacher_id)
+    if class_ids is not None:
+        query = query.filter(TimetableEntry.class_id.in_(class_ids))
+        teacher_query = teacher_query.filter(Curriculum.class_id.in_(class_ids))
+    rows = query.all()
+    teacher_of = {(cid, sid): tid for cid, sid, tid in teacher_query.all()}
+
+    ids = sorted(set(class_ids) if class_ids is not None else {int(r[0]) for r in rows})
+    index = {cid: c for c, cid in enumerate(ids)}
+    days = max((int(r[3]) for r in rows), default=-1) + 1
+    periods = max((int(r[4]) for r in rows), default=0)
+    layers = _new_layers(len(ids), days, periods)
+    subjects, teachers, rooms = layers
+    for cid, subject_id, room_id, weekday, index_in_day in rows:
+        c, d, p = index[cid], int(weekday), int(index_in_day) - 1
+        subjects[c][d][p] = subject_id
+        teachers[c][d][p] = teacher_of.get((cid, subject_id)) or 0
+        rooms[c][d][p] = room_id or 0
+    return _finish_array(ids, days, periods, layers, [], [])
+
+
+# --- vectorized terms -------------------------------------------------------
+
+def _idle_np(busy):
+    """Free periods between the first and last busy period, per [..., day]."""
+    periods = busy.shape[-1]
+    if not periods:
+        return np.zeros(busy.shape[:-1], dtype=np.int64)
+    first = busy.argmax(axis=-1)
+    last = periods - 1 - busy[..., ::-1].argmax(axis=-1)
+    span = np.where(busy.any(axis=-1), last - first + 1, 0)
+    return span - busy.sum(axis=-1)
+
+
+def _occupancy_np(layer, fixed: list[tuple[int, int, int]], days: int, periods: int):
+    """[resource, days, periods] booking counts of every id in `layer` and `fixed`."""
+    c_idx, d_idx, p_idx = np.nonzero(layer)
+    ids = layer[c_idx, d_idx, p_idx]
+    if fixed:
+        extra = np.array(fixed, dtype=np.int64)
+        ids = np.concatenate([ids, extra[:, 0]])
+        d_idx = np.concatenate([d_idx, extra[:, 1]])
+        p_idx = np.concatenate([p_idx, extra[:, 2]])
+    uniq, inverse = np.unique(ids, return_inverse=True)
+    cells = days * periods
+    counts = np.bincount(inverse * cells + d_idx * periods + p_idx, minlength=len(uniq) * cells)
+    return counts.reshape(len(uniq), days, periods)
+
+
+def _subject_day_counts_np(arr: TimetableArray):
+    """[classes, days, subjects] lesson counts (subjects re-indexed densely)."""
+    c_idx, d_idx, p_idx = np.nonzero(arr.subjects)
+    _, inverse = np.unique(arr.subjects[c_idx, d_idx, p_idx], return_inverse=True)
+    n_subjects = int(inverse.max()) + 1 if len(inverse) else 0
+    key = (c_idx * arr.days + d_idx) * n_subjects + inverse
+    counts = np.bincount(key, minlength=len(arr.class_ids) * arr.days * n_subjects)
+    return counts.reshape(len(arr.class_ids), arr.days, n_subjects)
+
+
+def _class_terms_np(arr: TimetableArray, cap: int | None) -> dict[str, Any]:
+    busy = arr.subjects > 0
+    terms = {
+        "late_hours": busy[:, :, LATE_HOUR_FROM - 1:].sum(axis=(1, 2)),
+        "student_gaps": _idle_np(busy).sum(axis=1),
+    }
+    if cap is not None:
+        counts = _subject_day_counts_np(arr)
+        terms["subject_day_overflow"] = np.clip(counts - cap, 0, None).sum(axis=(1, 2))
+    return terms
+
+
+def _school_terms_np(arr: TimetableArray, cap: int | None) -> dict[str, float]:
+    per_class = _class_terms_np(arr, cap)
+    teacher_occ = _occupancy_np(arr.teachers, arr.fixed_teachers, arr.days, arr.periods)
+    room_occ = _occupancy_np(arr.rooms, arr.fixed_rooms, arr.days, arr.periods)
+    terms = {name: float(values.sum()) for name, values in per_class.items()}
+    terms["teacher_idle"] = float(_idle_np(teacher_occ > 0).sum())
+    terms["room_balance"] = float((room_occ.sum(axis=(1, 2)) ** 2).sum())
+    terms["teacher_conflicts"] = float(np.clip(teacher_occ - 1, 0, None).sum())
+    terms["room_conflicts"] = float(np.clip(room_occ - 1, 0, None).sum())
+    return terms
+
+
+# --- pure-Python fallback ---------------------------------------------------
+
+def _idle_py(day: list) -> int:
+    busy = [p for p, v in enumerate(day) if v]
+    return busy[-1] - busy[0] + 1 - len(busy) if busy else 0
+
+
+def _occupancy_py(layer: list, fixed: list[tuple[int, int, int]]) -> dict[int, dict[tuple[int, int], int]]:
+    occupancy: dict[int, dict[tuple[int, int], int]] = {}
+    cells = [
+        (v, d, p)
+        for days in layer
+        for d, periods in enumerate(days)
+        for p, v in enumerate(periods)
+        if v
+    ]
+    for v, d, p in cells + list(fixed):
+        by_cell = occupancy.setdefault(v, {})
+        by_cell[(d, p)] = by_cell.get((d, p), 0) + 1
+    return occupancy
+
+
+def _class_terms_py(arr: TimetableArray, cap: int | None) -> dict[str, list[int]]:
+    terms: dict[str, list[int]] = {"late_hours": [], "student_gaps": []}
+    if cap is not None:
+        terms["subject_day_overflow"] = []
+    for days in arr.subjects:
+        terms["late_hours"].append(sum(1 for day in days for v in day[LATE_HOUR_FROM - 1:] if v))
+        terms["student_gaps"].append(sum(_idle_py(day) for day in days))
+        if cap is not None:
+            overflow = 0
+            for day in days:
+                counts: dict[int, int] = {}
+                for v in day:
+                    if v:
+                        counts[v] = counts.get(v, 0) + 1
+                overflow += sum(max(0, n - cap) for n in counts.values())
+            terms["subject_day_overflow"].append(overflow)
+    return terms
+
+
+def _school_terms_py(arr: TimetableArray, cap: int | None) -> dict[str, float]:
+    terms = {name: float(sum(values)) for name, values in _class_terms_py(arr, cap).items()}
+    teacher_occ = _occupancy_py(arr.teachers, arr.fixed_teachers)
+    room_occ = _occupancy_py(arr.rooms, arr.fixed_rooms)
+    idle = 0
+    for by_cell in teacher_occ.values():
+        for d in {d for d, _ in by_cell}:
+            idle += _idle_py([(d, p) in by_cell for p in range(arr.periods)])
+    terms["teacher_idle"] = float(idle)
+    terms["room_balance"] = float(sum(sum(by_cell.values()) ** 2 for by_cell in room_occ.values()))
+    terms["teacher_conflicts"] = float(sum(n - 1 for by_cell in teacher_occ.values() for n in by_cell.values()))
+    terms["room_conflicts"] = float(sum(n - 1 for by_cell in room_occ.values() for n in by_cell.values()))
+    return terms
+
+
+# --- public API -------------------------------------------------------------
+
+def timetable_terms(arr: TimetableArray, *, max_same_subject_per_day: int | None = None) -> dict[str, float]:
+    """
+    Soft terms (SOFT_TERMS) and hard-constraint violation counts (HARD_TERMS)
+    over all classes of `arr`. subject_day_overflow is only reported when
+    `max_same_subject_per_day` is given.
+    """
+    if arr.vectorized:
+        return _school_terms_np(arr, max_same_subject_per_day)
+    return _school_terms_py(arr, max_same_subject_per_day)
+
+
+def class_terms(arr: TimetableArray, *, max_same_subject_per_day: int | None = None) -> dict[int, dict[str, int]]:
+    """class_id -> the per-class terms (late_hours, student_gaps[, subject_day_overflow])."""
+    if arr.vectorized:
+        per_class = {name: values.tolist() for name, values in _class_terms_np(arr, max_same_subject_per_day).items()}
+    else:
+        per_class = _class_terms_py(arr, max_same_subject_per_day)
+    return {
+        cid: {name: int(values[c]) for name, values in per_class.items()}
+        for c, cid in enumerate(arr.class_ids)
+    }
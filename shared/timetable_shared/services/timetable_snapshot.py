@@ -0,0 +1,400 @@
+"""
+In-memory snapshot of the data the timetable generator needs.
+
+The snapshot is loaded with a fixed number of bulk queries at the start of a
+solve, so the search itself never goes back to the database.
+
+A class only sees the slots of its own timeslot grid. Entries of classes on
+other grids are translated by position (same weekday and index_in_day), so
+their teachers and rooms still count as busy at that moment.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from timetable_shared.models import (
+    DEFAULT_TIMESLOT_GRID,
+    Curriculum,
+    SchoolClass,
+    TimeSlot,
+    TimetableEntry,
+    Room,
+    UserProfile,
+    Subject,
+)
+from timetable_shared.services.availability_masks import (
+    AvailabilityMasks,
+    build_availability_masks,
+    is_valid_slot,
+    slot_position,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class SlotInfo:
+    id: int
+    weekday: int
+    index_in_day: int
+    # slot_position(weekday, index_in_day): bit number in the availability masks
+    position: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "position", slot_position(self.weekday, self.index_in_day))
+
+
+@dataclass(frozen=True, slots=True)
+class CurriculumItem:
+    subject_id: int
+    hours_per_week: int
+    teacher_id: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class RoomInfo:
+    id: int
+    name: str
+    capacity: int
+
+
+@dataclass(frozen=True)
+class GenerationSnapshot:
+    """
+    Plain-data view of one class's scheduling problem (the input of the
+    session-free solver core, see timetable_solver).
+    """
+
+    class_id: int
+    timeslots: list[SlotInfo]
+    curriculum: list[CurriculumItem]
+    student_count: int
+    rooms: list[RoomInfo]  # only rooms large enough for the class
+    sport_subject_id: int | None = None
+    sport_room_id: int | None = None
+    availability: AvailabilityMasks = field(default_factory=AvailabilityMasks)
+    # timeslot_id -> room ids already used by other classes
+    occupied_rooms: dict[int, set[int]] = field(default_factory=dict)
+    # timeslot_id -> teacher ids already teaching other classes (for a single
+    # class only its own teachers, see load_generation_snapshot)
+    occupied_teachers: dict[int, set[int]] = field(default_factory=dict)
+    # room_id -> number of entries using the room in classes outside the solve
+    room_usage: dict[int, int] = field(default_factory=dict)
+    grid: str = DEFAULT_TIMESLOT_GRID
+    # Seats in the largest room of the school (0 when there are no rooms)
+    largest_room_capacity: int = 0
+    # Precomputed lookups over `timeslots`
+    slot_by_id: dict[int, SlotInfo] = field(init=False, repr=False)
+    slot_at: dict[tuple[int, int], SlotInfo] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "slot_by_id", {ts.id: ts for ts in self.timeslots})
+        object.__setattr__(self, "slot_at", {(ts.weekday, ts.index_in_day): ts for ts in self.timeslots})
+
+    def is_teacher_available(self, teacher_id: int | None, weekday: int, index_in_day: int) -> bool:
+        return self.availability.is_teacher_available(teacher_id, weekday, index_in_day)
+
+    def is_room_available(self, room_id: int, weekday: int, index_in_day: int) -> bool:
+        return self.availability.is_room_available(room_id, weekday, index_in_day)
+
+
+@dataclass(frozen=True)
+class SchoolSnapshot:
+    """Several classes solved together; they share slots, rooms, masks and occupancy."""
+
+    classes: dict[int, GenerationSnapshot]
+    timeslots: list[SlotInfo]
+    availability: AvailabilityMasks
+    grid: str = DEFAULT_TIMESLOT_GRID
+    # Occupancy from classes outside the solved set (kept fixed during the solve)
+    occupied_rooms: dict[int, set[int]] = field(default_factory=dict)
+    occupied_teachers: dict[int, set[int]] = field(default_factory=dict)
+    room_usage: dict[int, int] = field(default_factory=dict)
+
+
+def _load_timeslots(db: Session) -> dict[str, list[SlotInfo]]:
+    """Slots of every grid (one query), each grid ordered by weekday and hour."""
+    grids: dict[str, list[SlotInfo]] = defaultdict(list)
+    for ts_id, grid, weekday, index_in_day in (
+        db.query(TimeSlot.id, TimeSlot.grid, TimeSlot.weekday, TimeSlot.index_in_day)
+        .order_by(TimeSlot.weekday, TimeSlot.index_in_day)
+        .all()
+    ):
+        if not is_valid_slot(weekday, index_in_day):
+            raise ValueError(
+                f"Timeslot {ts_id} (weekday {weekday}, hour {index_in_day}) is outside the supported grid"
+            )
+        grids[grid or DEFAULT_TIMESLOT_GRID].append(SlotInfo(int(ts_id), int(weekday), int(index_in_day)))
+    return dict(grids)
+
+
+def load_class_grids(db: Session, class_ids: Iterable[int]) -> dict[int, str]:
+    """class_id -> name of its timeslot grid."""
+    return {
+        int(cid): grid or DEFAULT_TIMESLOT_GRID
+        for cid, grid in (
+            db.query(SchoolClass.id, SchoolClass.timeslot_grid)
+            .filter(SchoolClass.id.in_(list(class_ids)))
+            .all()
+        )
+    }
+
+
+def _slot_translation(grids: dict[str, list[SlotInfo]], grid: str) -> dict[int, int]:
+    """timeslot id in any grid -> id of the slot at the same position in `grid`."""
+    own_at = {ts.position: ts.id for ts in grids.get(grid, [])}
+    return {
+        ts.id: own_at[ts.position]
+        for slots in grids.values()
+        for ts in slots
+        if ts.position in own_at
+    }
+
+
+def _load_rooms(db: Session) -> tuple[list[RoomInfo], int | None]:
+    """All rooms plus the id of "Sala Sport" (if any)."""
+    rooms = [
+        RoomInfo(int(room_id), name, int(capacity))
+        for room_id, name, capacity in db.query(Room.id, Room.name, Room.capacity).all()
+    ]
+    sport_room_id = next((r.id for r in rooms if r.name == "Sala Sport"), None)
+    return rooms, sport_room_id
+
+
+def _load_sport_subject_id(db: Session) -> int | None:
+    sport_subject_id = (
+        db.query(Subject.id).filter(Subject.short_code == "SPORT").scalar()
+    )
+    return int(sport_subject_id) if sport_subject_id is not None else None
+
+
+def _curriculum_item(subject_id, hours, teacher_id) -> CurriculumItem:
+    return CurriculumItem(
+        int(subject_id),
+        int(hours),
+        int(teacher_id) if teacher_id is not None else None,
+    )
+
+
+def load_generation_snapshot(
+    db: Session,
+    class_id: int,
+    *,
+    availability: AvailabilityMasks | None = None,
+) -> GenerationSnapshot:
+    """
+    Load everything needed to generate a timetable for `class_id`.
+    Pass `availability` to reuse already built masks (e.g. the process cache);
+    otherwise they are built here for the class's teachers and all rooms.
+
+    Entries of every other class become fixed occupancy: their rooms, and
+    the slots where they keep one of this class's teachers busy.
+    """
+    grid = load_class_grids(db, [class_id]).get(class_id, DEFAULT_TIMESLOT_GRID)
+    grids = _load_timeslots(db)
+    timeslots = grids.get(grid, [])
+    to_own_slot = _slot_translation(grids, grid)
+
+    curriculum = [
+        _curriculum_item(subject_id, hours, teacher_id)
+        for subject_id, hours, teacher_id in (
+            db.query(Curriculum.subject_id, Curriculum.hours_per_week, Curriculum.teacher_id)
+            .filter(Curriculum.class_id == class_id)
+            .all()
+        )
+    ]
+    teacher_ids = {c.teacher_id for c in curriculum if c.teacher_id is not None}
+
+    student_count = (
+        db.query(UserProfile)
+        .filter(UserProfile.class_id == class_id)
+        .count()
+    )
+
+    all_rooms, sport_room_id = _load_rooms(db)
+    rooms = [r for r in all_rooms if r.capacity >= student_count]
+
+    if availability is None:
+        availability = build_availability_masks(db, teacher_ids=teacher_ids)
+
+    occupied_rooms: dict[int, set[int]] = defaultdict(set)
+    occupied_teachers: dict[int, set[int]] = defaultdict(set)
+    room_usage: dict[int, int] = defaultdict(int)
+    # The class's own entries are about to be replaced, so they count for nothing
+    for ts_id, room_id, teacher_id in (
+        db.query(TimetableEntry.timeslot_id, TimetableEntry.room_id, Curriculum.teacher_id)
+        .outerjoin(
+            Curriculum,
+            and_(
+                Curriculum.class_id == TimetableEntry.class_id,
+                Curriculum.subject_id == TimetableEntry.subject_id,
+            ),
+        )
+        .filter(TimetableEntry.class_id != class_id)
+        .all()
+    ):
+        if room_id is not None:
+            room_usage[int(room_id)] += 1
+        own_ts_id = to_own_slot.get(int(ts_id))
+        if own_ts_id is None:
+            continue
+        if room_id is not None:
+            occupied_rooms[own_ts_id].add(int(room_id))
+        if teacher_id is not None and int(teacher_id) in teacher_ids:
+            occupied_teachers[own_ts_id].add(int(teacher_id))
+
+    return GenerationSnapshot(
+        class_id=class_id,
+        timeslots=timeslots,
+        curriculum=curriculum,
+        student_count=student_count,
+        rooms=rooms,
+        sport_subject_id=_load_sport_subject_id(db),
+        sport_room_id=sport_room_id,
+        availability=availability,
+        occupied_rooms=dict(occupied_rooms),
+        occupied_teachers=dict(occupied_teachers),
+        room_usage=dict(room_usage),
+        grid=grid,
+        largest_room_capacity=max((r.capacity for r in all_rooms), default=0),
+    )
+
+
+def load_school_snapshot(
+    db: Session,
+    class_ids: Iterable[int],
+    *,
+    availability: AvailabilityMasks | None = None,
+) -> SchoolSnapshot:
+    """
+    Load a joint problem for several classes with the same constant number of
+    queries as a single class. Entries of the classes being solved are ignored
+    (they will be replaced); entries of every other class become fixed
+    teacher/room occupancy. All classes must share one timeslot grid.
+    """
+    class_ids = sorted({int(cid) for cid in class_ids})
+
+    class_grids = load_class_grids(db, class_ids)
+    used_grids = set(class_grids.values()) or {DEFAULT_TIMESLOT_GRID}
+    if len(used_grids) > 1:
+        raise ValueError(f"Classes of a joint solve must share one timeslot grid, got {sorted(used_grids)}")
+    grid = used_grids.pop()
+    grids = _load_timeslots(db)
+    timeslots = grids.get(grid, [])
+    to_own_slot = _slot_translation(grids, grid)
+    all_rooms, sport_room_id = _load_rooms(db)
+    sport_subject_id = _load_sport_subject_id(db)
+
+    curricula: dict[int, list[CurriculumItem]] = defaultdict(list)
+    for cid, subject_id, hours, teacher_id in (
+        db.query(
+            Curriculum.class_id,
+            Curriculum.subject_id,
+            Curriculum.hours_per_week,
+            Curriculum.teacher_id,
+        )
+        .filter(Curriculum.class_id.in_(class_ids))
+        .all()
+    ):
+        curricula[int(cid)].append(_curriculum_item(subject_id, hours, teacher_id))
+
+    student_counts: dict[int, int] = {
+        int(cid): int(count)
+        for cid, count in (
+            db.query(UserProfile.class_id, func.count(UserProfile.id))
+            .filter(UserProfile.class_id.in_(class_ids))
+            .group_by(UserProfile.class_id)
+            .all()
+        )
+    }
+
+    if availability is None:
+        availability = build_availability_masks(db)
+
+    occupied_rooms: dict[int, set[int]] = defaultdict(set)
+    occupied_teachers: dict[int, set[int]] = defaultdict(set)
+    room_usage: dict[int, int] = defaultdict(int)
+    for ts_id, room_id, teacher_id in (
+        db.query(TimetableEntry.timeslot_id, TimetableEntry.room_id, Curriculum.teacher_id)
+        .outerjoin(
+            Curriculum,
+            and_(
+                Curriculum.class_id == TimetableEntry.class_id,
+                Curriculum.subject_id == TimetableEntry.subject_id,
+            ),
+        )
+        .filter(TimetableEntry.class_id.notin_(class_ids))
+        .all()
+    ):
+        if room_id is not None:
+            room_usage[int(room_id)] += 1
+        own_ts_id = to_own_slot.get(int(ts_id))
+        if own_ts_id is None:
+            continue
+        if room_id is not None:
+            occupied_rooms[own_ts_id].add(int(room_id))
+        if teacher_id is not None:
+            occupied_teachers[own_ts_id].add(int(teacher_id))
+
+    occupied_rooms = dict(occupied_rooms)
+    occupied_teachers = dict(occupied_teachers)
+    room_usage = dict(room_usage)
+
+    classes: dict[int, GenerationSnapshot] = {}
+    for cid in class_ids:
+        student_count = student_counts.get(cid, 0)
+        classes[cid] = GenerationSnapshot(
+            class_id=cid,
+            timeslots=timeslots,
+            curriculum=curricula.get(cid, []),
+            student_count=student_count,
+            rooms=[r for r in all_rooms if r.capacity >= student_count],
+            sport_subject_id=sport_subject_id,
+            sport_room_id=sport_room_id,
+            availability=availability,
+            occupied_rooms=occupied_rooms,
+            occupied_teachers=occupied_teachers,
+            room_usage=room_usage,
+            grid=grid,
+            largest_room_capacity=max((r.capacity for r in all_rooms), default=0),
+        )
+
+    return SchoolSnapshot(
+        classes=classes,
+        timeslots=timeslots,
+        availability=availability,
+        grid=grid,
+        occupied_rooms=occupied_rooms,
+        occupied_teachers=occupied_teachers,
+        room_usage=room_usage,
+    )
+
+
+def load_room_occupancy(
+    db: Session,
+    class_ids: Iterable[int],
+    grid: str,
+) -> tuple[dict[int, set[int]], dict[int, int]]:
+    """
+    Current room occupancy (timeslot_id of `grid` -> room ids) and room usage
+    of the classes outside `class_ids`, as the snapshots see them. Used to
+    re-check rooms right before persisting, when other runs may have
+    committed since the snapshot was loaded.
+    """
+    class_ids = [int(cid) for cid in class_ids]
+    to_own_slot = _slot_translation(_load_timeslots(db), grid)
+    occupied_rooms: dict[int, set[int]] = defaultdict(set)
+    room_usage: dict[int, int] = defaultdict(int)
+    for ts_id, room_id in (
+        db.query(TimetableEntry.timeslot_id, TimetableEntry.room_id)
+        .filter(TimetableEntry.room_id.isnot(None), TimetableEntry.class_id.notin_(class_ids))
+        .all()
+    ):
+        room_usage[int(room_id)] += 1
+        own_ts_id = to_own_slot.get(int(ts_id))
+        if own_ts_id is not None:
+            occupied_rooms[own_ts_id].add(int(room_id))
+    return dict(occupied_rooms), dict(room_usage)
@@ -0,0 +1,700 @@
+"""
+Session-free core of the timetable generator.
+
+Everything here works on plain data: the problem is a GenerationSnapshot (one
+class) or a SchoolSnapshot (a joint solve), both frozen dataclasses holding
+the slots, curriculum items, rooms, availability masks and the fixed
+occupancy of the classes outside the solve, and the answer is a SolveResult
+(assignments, conflicts, score, search counters). No Session is involved,
+so problems and results pickle to worker processes, can be cached, and the
+algorithm can be measured without a database.
+
+Loading the problem from the database and persisting the result are the job
+of the adapters in timetable_snapshot and timetable_generator.
+
+Pipeline of one solve: subjects are placed (random restart or backtracking,
+see timetable_csp), rooms are given per timeslot (timetable_rooms), then the
+optional local search improves the score (timetable_optimizer).
+"""
+from __future__ import annotations
+
+import multiprocessing
+import random
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from timetable_shared.services.timetable_csp import solve_class_csp
+from timetable_shared.services.timetable_optimizer import (
+    ScoreWeights,
+    optimize_timetables,
+    score_timetables,
+)
+from timetable_shared.services.timetable_rooms import Placement, assign_rooms
+from timetable_shared.services.timetable_snapshot import (
+    GenerationSnapshot,
+    SchoolSnapshot,
+    SlotInfo,
+)
+
+# timeslot_id -> (subject_id, room_id | None)
+Assignment = dict[int, tuple[int, int | None]]
+
+# Randomized greedy passes, retried from scratch on a dead end
+STRATEGY_RANDOM_RESTART = "random_restart"
+# Complete search with forward checking and backjumping (see timetable_csp)
+STRATEGY_BACKTRACKING = "backtracking"
+STRATEGIES = (STRATEGY_RANDOM_RESTART, STRATEGY_BACKTRACKING)
+
+
+# Minimum seconds between two progress reports of a solve
+PROGRESS_INTERVAL = 1.0
+
+# Seconds between two looks of a multi-start worker at the shared stop event
+STOP_POLL_INTERVAL = 0.05
+
+
+class Progress:
+    """
+    Throttled solver progress: `report(attempts, best_score)` is called at
+    most once per `interval` seconds, however often `update` is.
+    """
+
+    def __init__(self, report: Callable[[int, float | None], None], interval: float | None = None) -> None:
+        self.report = report
+        self.interval = PROGRESS_INTERVAL if interval is None else interval
+        self.attempts = 0
+        self.best_score: float | None = None
+        self._last = time.monotonic()
+
+    def update(self, *, attempts: int | None = None, best_score: float | None = None) -> None:
+        if attempts is not None:
+            self.attempts = attempts
+        if best_score is not None and (self.best_score is None or best_score < self.best_score):
+            self.best_score = best_score
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.report(self.attempts, self.best_score)
+
+
+class StopSignal:
+    """
+    stop() callable over an event shared by the workers of a multi-start
+    (a multiprocessing.Manager event, so it pickles to the pool). Each look
+    is a round trip to the manager process, so the event is read at most
+    once per `interval` seconds and stays set once seen.
+    """
+
+    def __init__(self, event, interval: float | None = None) -> None:
+        self.event = event
+        self.interval = STOP_POLL_INTERVAL if interval is None else interval
+        self._stopped = False
+        self._last = 0.0
+
+    def __call__(self) -> bool:
+        if not self._stopped:
+            now = time.monotonic()
+            if now - self._last >= self.interval:
+                self._last = now
+                self._stopped = self.event.is_set()
+        return self._stopped
+
+
+def group_timeslots_by_day(timeslots: Iterable[SlotInfo]) -> dict[int, list[SlotInfo]]:
+    """weekday -> the day's timeslots in hour order."""
+    by_day: dict[int, list[SlotInfo]] = defaultdict(list)
+    for ts in timeslots:
+        by_day[int(ts.weekday)].append(ts)
+    for d in by_day:
+        by_day[d].sort(key=lambda t: int(t.index_in_day))
+    return by_day
+
+
+def get_preferred_timeslots(timeslots_by_day: dict[int, list[SlotInfo]]) -> list[SlotInfo]:
+    """Return timeslots sorted by preference (earlier hours preferred)."""
+    preferred = []
+    for day in sorted(timeslots_by_day.keys()):
+        day_slots = timeslots_by_day[day]
+        # Prefer hours 1-5, avoid 6-7
+        early_slots = [ts for ts in day_slots if 1 <= int(ts.index_in_day) <= 5]
+        late_slots = [ts for ts in day_slots if int(ts.index_in_day) >= 6]
+        preferred.extend(sorted(early_slots, key=lambda t: int(t.index_in_day)))
+        preferred.extend(sorted(late_slots, key=lambda t: int(t.index_in_day)))
+    return preferred
+
+
+def validate_snapshot(snapshot: GenerationSnapshot) -> None:
+    """Raise ValueError when the class's curriculum does not fill its grid exactly."""
+    slot_count = len(snapshot.timeslots)
+    if not slot_count:
+        raise ValueError(f"Timeslot grid '{snapshot.grid}' has no timeslots")
+
+    total_hours = sum(c.hours_per_week for c in snapshot.curriculum)
+    if total_hours != slot_count:
+        raise ValueError(
+            f"Curriculum must sum to {slot_count} (slots in grid '{snapshot.grid}'), got {total_hours}"
+        )
+
+
+class _ClassTables:
+    """
+    Integer-indexed view of one class for the randomized greedy passes.
+
+    Subjects are 0..n-1 (the curriculum items with hours), slots are
+    positions k in the preferred order. The pool (one subject index per
+    weekly hour), the per-day counters and the picks are preallocated once
+    per solve and reset between attempts instead of being rebuilt.
+    """
+
+    __slots__ = ("subject_ids", "teacher_ids", "pool", "order", "picked", "per_day", "_no_lessons", "slot_day")
+
+    def __init__(self, snapshot: GenerationSnapshot, preferred_slots: list[SlotInfo]) -> None:
+        items = [c for c in snapshot.curriculum if c.hours_per_week > 0]
+        days = sorted({ts.weekday for ts in preferred_slots})
+        day_index = {d: i for i, d in enumerate(days)}
+        self.subject_ids = array("l", (c.subject_id for c in items))
+        self.teacher_ids = [c.teacher_id for c in items]
+        self.pool = array("H", (s for s, c in enumerate(items) for _ in range(c.hours_per_week)))
+        self.order = array("H", self.pool)
+        self.picked = array("H", bytes(2 * len(preferred_slots)))
+        # day index * n_subjects + subject -> lessons of the subject that day
+        self.per_day = bytearray(len(days) * len(items))
+        self._no_lessons = bytes(len(self.per_day))
+        self.slot_day = array("H", (day_index[ts.weekday] * len(items) for ts in preferred_slots))
+
+    def reset(self) -> None:
+        self.per_day[:] = self._no_lessons
+        self.order[:] = self.pool
+
+    def allowed_slots(
+        self,
+        snapshot: GenerationSnapshot,
+        preferred_slots: list[SlotInfo],
+        taken_teachers: dict[int, set[int]],
+    ) -> list[int]:
+        """Per subject, a mask with bit k set when its teacher can teach at preferred slot k."""
+        by_teacher: dict[int | None, int] = {None: (1 << len(preferred_slots)) - 1}
+        for teacher_id in self.teacher_ids:
+            if teacher_id in by_teacher:
+                continue
+            bits = 0
+            for k, ts in enumerate(preferred_slots):
+                if snapshot.is_teacher_available(teacher_id, ts.weekday, ts.index_in_day) and (
+                    teacher_id not in taken_teachers.get(ts.id, ())
+                ):
+                    bits |= 1 << k
+            by_teacher[teacher_id] = bits
+        return [by_teacher[teacher_id or None] for teacher_id in self.teacher_ids]
+
+
+def _build_class_assignment(
+    tables: _ClassTables,
+    preferred_slots: list[SlotInfo],
+    allowed: list[int],
+    *,
+    max_same_subject_per_day: int,
+    stats: Counter,
+    rng: random.Random,
+) -> Placement:
+    """
+    One randomized greedy pass over the class's slots, placing subjects only
+    (rooms are given afterwards, see timetable_rooms).
+
+    `allowed` comes from tables.allowed_slots and already excludes teachers
+    busy in other classes. Returns an empty dict when the pass runs into a
+    dead end. stats["buffer_rotations"] counts the pool entries skipped over.
+    The subject order is shuffled with `rng`, the random source of the solve.
+    """
+    tables.reset()
+    order = tables.order
+    per_day = tables.per_day
+    picked = tables.picked
+    slot_day = tables.slot_day
+    rng.shuffle(order)
+    skipped = 0
+
+    for k in range(len(preferred_slots)):
+        base = slot_day[k]
+        # First subject in the pool that fits: per-day cap, teacher free at k
+        for i, s in enumerate(order):
+            if per_day[base + s] < max_same_subject_per_day and allowed[s] >> k & 1:
+                break
+        else:
+            stats["buffer_rotations"] += skipped + len(order)
+            return {}
+        # The subjects skipped over stay at the front, in their (random) order
+        skipped += i
+        del order[i]
+        per_day[base + s] += 1
+        picked[k] = s
+
+    stats["buffer_rotations"] += skipped
+    subject_ids = tables.subject_ids
+    return {ts.id: subject_ids[picked[k]] for k, ts in enumerate(preferred_slots)}
+
+
+def _place_class(
+    snapshot: GenerationSnapshot,
+    tables: _ClassTables,
+    preferred_slots: list[SlotInfo],
+    *,
+    strategy: str,
+    max_same_subject_per_day: int,
+    taken_teachers: dict[int, set[int]],
+    max_attempts: int,
+    stats: Counter | None = None,
+    deadline: float | None = None,
+    progress: Progress | None = None,
+    rng: random.Random | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> tuple[Placement, str | None]:
+    """
+    Place the subjects of one class with the selected strategy.
+    Returns (placement, None) on success or ({}, reason) on failure.
+    `stats` (if given) accumulates attempts / search steps / backtracks.
+    No new attempt starts after `deadline` (a time.monotonic() value) or
+    once `stop()` returns True.
+    `rng` drives the random choices (a fresh unseeded one when None).
+    """
+    stats = stats if stats is not None else Counter()
+    rng = rng or random.Random()
+    if strategy == STRATEGY_BACKTRACKING:
+        result = solve_class_csp(
+            snapshot,
+            max_same_subject_per_day=max_same_subject_per_day,
+            preferred_slots=preferred_slots,
+            taken_teachers=taken_teachers,
+            deadline=deadline,
+            rng=rng,
+            stop=stop,
+        )
+        stats["attempts"] += 1
+        if progress is not None:
+            progress.update(attempts=stats["attempts"])
+        stats["search_steps"] += result.steps
+        stats["backtracks"] += result.backtracks
+        if not result.solved:
+            return {}, result.reason
+        return result.placement, None
+
+    n_slots = len(snapshot.timeslots)
+    allowed = tables.allowed_slots(snapshot, preferred_slots, taken_teachers)
+    for attempt in range(max_attempts):
+        if deadline is not None and time.monotonic() >= deadline:
+            return {}, f"deadline reached after {attempt} attempts"
+        if stop is not None and stop():
+            return {}, f"stopped after {attempt} attempts"
+        stats["attempts"] += 1
+        if progress is not None:
+            progress.update(attempts=stats["attempts"])
+        placement = _build_class_assignment(
+            tables,
+            preferred_slots,
+            allowed,
+            max_same_subject_per_day=max_same_subject_per_day,
+            stats=stats,
+            rng=rng,
+        )
+        if placement and len(placement) == n_slots:
+            return placement, None
+    return {}, f"no complete timetable after {max_attempts} attempts"
+
+
+def _improve(
+    snapshots: dict[int, GenerationSnapshot],
+    assignments: dict[int, Assignment],
+    *,
+    timeslots: list[SlotInfo],
+    occupied_teachers: dict[int, set[int]],
+    occupied_rooms: dict[int, set[int]],
+    max_same_subject_per_day: int,
+    optimize_seconds: float,
+    weights: ScoreWeights | None,
+    seed: int | None,
+    deadline: float | None = None,
+    progress: Progress | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> tuple[dict[int, Assignment], float]:
+    """
+    Run the local-search stage when a budget is given (cut short at
+    `deadline` or by `stop`, keeping the best timetable so far); always
+    return the score.
+    """
+    if deadline is not None:
+        optimize_seconds = min(optimize_seconds, deadline - time.monotonic())
+    if optimize_seconds > 0:
+        result = optimize_timetables(
+            snapshots,
+            assignments,
+            timeslots=timeslots,
+            occupied_teachers=occupied_teachers,
+            occupied_rooms=occupied_rooms,
+            max_same_subject_per_day=max_same_subject_per_day,
+            time_budget=optimize_seconds,
+            weights=weights,
+            seed=seed,
+            on_progress=(lambda best: progress.update(best_score=best)) if progress is not None else None,
+            stop=stop,
+        )
+        return result.assignments, result.score
+    score, _ = score_timetables(
+        snapshots,
+        assignments,
+        timeslots=timeslots,
+        occupied_teachers=occupied_teachers,
+        occupied_rooms=occupied_rooms,
+        weights=weights,
+    )
+    return assignments, score
+
+
+def _expired(deadline: float | None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _lap(timings: dict[str, float], name: str, since: float) -> float:
+    """Add the perf_counter time since `since` to timings[name]; returns now."""
+    now = time.perf_counter()
+    timings[name] = timings.get(name, 0.0) + now - since
+    return now
+
+
+@dataclass
+class SolveResult:
+    """Result of one (possibly remote) solve: empty `assignments` means failure."""
+
+    # class_id -> Assignment
+    assignments: dict[int, Assignment]
+    # class_id -> {"type": ..., "details": ...}, in the ConflictReport format
+    conflicts: dict[int, list[dict]] = field(default_factory=dict)
+    reason: str | None = None
+    score: float | None = None
+    # attempts, buffer_rotations, search_steps, backtracks, joint_restarts, room_fallbacks
+    stats: dict[str, int] = field(default_factory=dict)
+    # Seconds spent per phase of the solve: search, rooms, optimize (see timetable_metrics)
+    timings: dict[str, float] = field(default_factory=dict)
+    # The deadline stopped the search or the optimization early
+    deadline_reached: bool = False
+
+
+def solve_class(
+    snapshot: GenerationSnapshot,
+    *,
+    strategy: str = STRATEGY_RANDOM_RESTART,
+    max_same_subject_per_day: int = 2,
+    max_attempts: int = 100,
+    collect_conflicts: bool = True,
+    optimize_seconds: float = 0.0,
+    weights: ScoreWeights | None = None,
+    seed: int | None = None,
+    deadline: float | None = None,
+    progress: Progress | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> SolveResult:
+    """
+    Solve (and optionally improve) one class. Pure function of its arguments
+    (and the seed), so it can run in a worker process. `deadline` is a
+    time.monotonic() value; no attempt starts after it, nor after `stop()`
+    returns True (a multi-start that already has its result).
+
+    The seed drives a random.Random of this solve only: the global random
+    state is left alone, so concurrent solves in threads stay reproducible.
+    """
+    rng = random.Random(seed)
+
+    # Use preferred timeslots (earlier hours first)
+    preferred_slots = get_preferred_timeslots(group_timeslots_by_day(snapshot.timeslots))
+
+    stats: Counter = Counter()
+    timings: dict[str, float] = {}
+    lap = time.perf_counter()
+    placement, reason = _place_class(
+        snapshot,
+        _ClassTables(snapshot, preferred_slots),
+        preferred_slots,
+        strategy=strategy,
+        max_same_subject_per_day=max_same_subject_per_day,
+        # Teachers busy in other classes (read only: nothing is added for a single class)
+        taken_teachers=snapshot.occupied_teachers,
+        max_attempts=max_attempts,
+        stats=stats,
+        deadline=deadline,
+        progress=progress,
+        rng=rng,
+        stop=stop,
+    )
+    lap = _lap(timings, "search", lap)
+    if not placement:
+        return SolveResult(
+            {}, reason=reason, stats=dict(stats), timings=timings, deadline_reached=_expired(deadline)
+        )
+
+    # Utilizare sali in DB (din snapshot) pentru repartitie uniforma
+    assignments, conflicts = assign_rooms(
+        {snapshot.class_id: snapshot},
+        {snapshot.class_id: placement},
+        timeslots=preferred_slots,
+        occupied_rooms=snapshot.occupied_rooms,
+        room_usage=snapshot.room_usage,
+    )
+    stats["room_fallbacks"] += len(conflicts[snapshot.class_id])
+    lap = _lap(timings, "rooms", lap)
+    assignments, score = _improve(
+        {snapshot.class_id: snapshot},
+        assignments,
+        timeslots=snapshot.timeslots,
+        occupied_teachers=snapshot.occupied_teachers,
+        occupied_rooms=snapshot.occupied_rooms,
+        max_same_subject_per_day=max_same_subject_per_day,
+        optimize_seconds=optimize_seconds,
+        weights=weights,
+        seed=seed,
+        deadline=deadline,
+        progress=progress,
+        stop=stop,
+    )
+    _lap(timings, "optimize", lap)
+    return SolveResult(
+        assignments,
+        conflicts if collect_conflicts else {},
+        score=score,
+        stats=dict(stats),
+        timings=timings,
+        deadline_reached=_expired(deadline),
+    )
+
+
+def solve_school(
+    school: SchoolSnapshot,
+    *,
+    strategy: str = STRATEGY_RANDOM_RESTART,
+    max_same_subject_per_day: int = 2,
+    max_attempts: int = 100,
+    tries_per_class: int = 10,
+    collect_conflicts: frozenset[int] | None = None,
+    optimize_seconds: float = 0.0,
+    weights: ScoreWeights | None = None,
+    seed: int | None = None,
+    deadline: float | None = None,
+    progress: Progress | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> SolveResult:
+    """
+    Joint solve of all classes in `school`, as solve_class. Conflicts are
+    kept for the classes in `collect_conflicts` (all when None).
+    """
+    if collect_conflicts is None:
+        collect_conflicts = frozenset(school.classes)
+    rng = random.Random(seed)
+
+    preferred_slots = get_preferred_timeslots(group_timeslots_by_day(school.timeslots))
+    tables = {cid: _ClassTables(snapshot, preferred_slots) for cid, snapshot in school.classes.items()}
+    teacher_by_subject = {
+        cid: {c.subject_id: c.teacher_id for c in snapshot.curriculum}
+        for cid, snapshot in school.classes.items()
+    }
+
+    order = list(school.classes.keys())
+    rng.shuffle(order)
+
+    placements: dict[int, Placement] = {}
+    # timeslot_id -> teachers busy there (other classes, then the classes placed so
+    # far in the attempt); allocated once and reset at every restart
+    taken_teachers: dict[int, set[int]] = {ts.id: set() for ts in preferred_slots}
+    stats: Counter = Counter()
+    timings: dict[str, float] = {}
+    lap = time.perf_counter()
+    reason = None
+    for attempt in range(max_attempts):
+        if _expired(deadline):
+            _lap(timings, "search", lap)
+            reason = f"deadline reached after {attempt} joint attempts"
+            return SolveResult({}, reason=reason, stats=dict(stats), timings=timings, deadline_reached=True)
+        if stop is not None and stop():
+            _lap(timings, "search", lap)
+            return SolveResult(
+                {}, reason=f"stopped after {attempt} joint attempts", stats=dict(stats), timings=timings
+            )
+        stats["joint_restarts"] += 1
+        for ts_id, busy in taken_teachers.items():
+            busy.clear()
+            busy.update(school.occupied_teachers.get(ts_id, ()))
+
+        placements = {}
+        failed_class_id = None
+        for cid in order:
+            placement, reason = _place_class(
+                school.classes[cid],
+                tables[cid],
+                preferred_slots,
+                strategy=strategy,
+                max_same_subject_per_day=max_same_subject_per_day,
+                taken_teachers=taken_teachers,
+                max_attempts=tries_per_class,
+                stats=stats,
+                deadline=deadline,
+                progress=progress,
+                rng=rng,
+                stop=stop,
+            )
+            if not placement:
+                failed_class_id = cid
+                break
+
+            # Commit the class's teachers to the shared occupancy
+            for ts_id, subj_id in placement.items():
+                teacher_id = teacher_by_subject[cid].get(subj_id)
+                if teacher_id:
+                    taken_teachers[ts_id].add(teacher_id)
+            placements[cid] = placement
+
+        if failed_class_id is None:
+            break
+
+        # Schedule the class that got stuck first on the next attempt
+        order.remove(failed_class_id)
+        order.insert(0, failed_class_id)
+    else:
+        _lap(timings, "search", lap)
+        return SolveResult(
+            {}, reason=f"after {max_attempts} attempts ({reason})", stats=dict(stats), timings=timings
+        )
+    lap = _lap(timings, "search", lap)
+
+    # Rooms for all classes at once, one matching per timeslot
+    assignments, conflicts = assign_rooms(
+        school.classes,
+        placements,
+        timeslots=preferred_slots,
+        occupied_rooms=school.occupied_rooms,
+        room_usage=school.room_usage,
+    )
+    stats["room_fallbacks"] += sum(len(c) for c in conflicts.values())
+    conflicts = {cid: c for cid, c in conflicts.items() if cid in collect_conflicts}
+    lap = _lap(timings, "rooms", lap)
+    assignments, score = _improve(
+        school.classes,
+        assignments,
+        timeslots=school.timeslots,
+        occupied_teachers=school.occupied_teachers,
+        occupied_rooms=school.occupied_rooms,
+        max_same_subject_per_day=max_same_subject_per_day,
+        optimize_seconds=optimize_seconds,
+        weights=weights,
+        seed=seed,
+        deadline=deadline,
+        progress=progress,
+        stop=stop,
+    )
+    _lap(timings, "optimize", lap)
+    return SolveResult(
+        assignments,
+        conflicts,
+        score=score,
+        stats=dict(stats),
+        timings=timings,
+        deadline_reached=_expired(deadline),
+    )
+
+
+# Process pool shared by all multi-start solves of this process (created lazily)
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+# Serves the stop events of the multi-starts (plain multiprocessing events do not pickle)
+_stop_manager = None
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = ProcessPoolExecutor(max_workers=workers)
+            _process_pool_workers = workers
+        return _process_pool
+
+
+def _new_stop_event():
+    global _stop_manager
+    with _process_pool_lock:
+        if _stop_manager is None:
+            _stop_manager = multiprocessing.Manager()
+        return _stop_manager.Event()
+
+
+def solve_multi_start(
+    solve: Callable[..., SolveResult],
+    *,
+    workers: int,
+    seed: int | None,
+    max_attempts: int,
+    wait_for_best: bool,
+    progress: Progress | None = None,
+    **kwargs,
+) -> SolveResult:
+    """
+    Run `solve` with `workers` different seeds in the process pool, splitting
+    `max_attempts` between them. Returns the first complete result, or the
+    best-scoring one when `wait_for_best` (i.e. each worker also optimizes).
+    When every worker fails the result is a failure (empty assignments)
+    carrying the last worker's reason and the attempts of all of them.
+    `progress` stays in this process and is updated as workers finish.
+
+    Once the result is known the workers still running are told to stop
+    (a shared event, see StopSignal), so they leave the pool free for the
+    next solve instead of running to their attempts or deadline.
+    """
+    if workers < 1:
+        raise ValueError(f"solve_multi_start needs at least one worker, got {workers}")
+    base_seed = seed if seed is not None else random.randrange(1 << 30)
+    attempts_per_worker = max(1, -(-max_attempts // workers))
+    pool = _get_process_pool(workers)
+    stop_event = _new_stop_event()
+    futures = [
+        pool.submit(
+            solve,
+            seed=base_seed + i,
+            max_attempts=attempts_per_worker,
+            stop=StopSignal(stop_event),
+            **kwargs,
+        )
+        for i in range(workers)
+    ]
+    best: SolveResult | None = None
+    failure: SolveResult | None = None
+    stats: Counter = Counter()
+    try:
+        for future in as_completed(futures):
+            outcome = future.result()
+            stats.update(outcome.stats)
+            if progress is not None:
+                progress.update(attempts=stats["attempts"], best_score=outcome.score)
+            if not outcome.assignments:
+                failure = outcome
+                continue
+            if not wait_for_best:
+                return outcome
+            if best is None or outcome.score < best.score:
+                best = outcome
+    finally:
+        # Drop the attempts that have not started yet and end the running ones
+        stop_event.set()
+        for future in futures:
+            future.cancel()
+    if best is not None:
+        return best
+    # Every worker finished without a timetable, so `failure` is set
+    return SolveResult(
+        {},
+        reason=failure.reason,
+        stats=dict(stats),
+        timings=failure.timings,
+        deadline_reached=failure.deadline_reached,
+    )
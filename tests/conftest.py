@@ -0,0 +1,89 @@
+"""
+Shared fixtures: an in-memory SQLite database with the shared schema and a
+small hand-built school whose classes share a teacher.
+
+Run from the repository root with `python -m pytest tests`.
+"""
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+# timetable_shared.db builds its engine at import time; never point it at a real server
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "shared"))
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from timetable_shared.db import Base  # noqa: E402
+from timetable_shared.models import (  # noqa: E402
+    Curriculum,
+    Room,
+    SchoolClass,
+    Subject,
+    TimeSlot,
+)
+
+# Teacher 1 teaches MAT in every class; the other subjects have a teacher per class
+SHARED_TEACHER_ID = 1
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        future=True,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+def build_school(db, classes: int = 2, days: int = 5, periods: int = 7, rooms: int = 4) -> list[int]:
+    """
+    `classes` classes on one days x periods grid. Per class: MAT 2 hours a day
+    (teacher 1, shared), the rest split over RO / ENG / BIO with own teachers.
+    Returns the class ids.
+    """
+    for weekday in range(days):
+        for index_in_day in range(1, periods + 1):
+            db.add(TimeSlot(weekday=weekday, index_in_day=index_in_day))
+    subjects = {code: Subject(name=code, short_code=code) for code in ("MAT", "RO", "ENG", "BIO")}
+    db.add_all(subjects.values())
+    db.add_all(Room(name=f"Sala {i}", capacity=30) for i in range(1, rooms + 1))
+    db.flush()
+
+    slots = days * periods
+    rest = slots - 2 * days
+    hours = {"MAT": 2 * days, "RO": rest - 2 * (rest // 3), "ENG": rest // 3, "BIO": rest // 3}
+    class_ids = []
+    for c in range(classes):
+        school_class = SchoolClass(name=f"C{c + 1}")
+        db.add(school_class)
+        db.flush()
+        for n, (code, hours_per_week) in enumerate(hours.items()):
+            teacher_id = SHARED_TEACHER_ID if code == "MAT" else 100 * (c + 1) + n
+            db.add(Curriculum(
+                class_id=school_class.id,
+                subject_id=subjects[code].id,
+                hours_per_week=hours_per_week,
+                teacher_id=teacher_id,
+            ))
+        class_ids.append(school_class.id)
+    db.commit()
+    return class_ids
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from timetable_shared.models import RoomAvailability, TeacherAvailability
+from timetable_shared.services.availability_masks import (
+    availability_version,
+    build_availability_masks,
+    get_availability_masks,
+    invalidate_availability_masks,
+    slot_bit,
+)
+
+
+def test_only_unavailable_rows_set_bits(db):
+    db.add_all([
+        TeacherAvailability(teacher_id=1, weekday=0, index_in_day=1, available=False),
+        TeacherAvailability(teacher_id=1, weekday=2, index_in_day=7, available=False),
+        TeacherAvailability(teacher_id=2, weekday=0, index_in_day=1, available=True),
+        RoomAvailability(room_id=3, weekday=4, index_in_day=12, available=False),
+    ])
+    db.commit()
+
+    masks = build_availability_masks(db)
+
+    assert masks.teacher_blocked == {1: slot_bit(0, 1) | slot_bit(2, 7)}
+    assert not masks.is_teacher_available(1, 2, 7)
+    assert masks.is_teacher_available(2, 0, 1)
+    assert masks.is_teacher_available(None, 0, 1)
+    assert not masks.is_room_available(3, 4, 12)
+    assert build_availability_masks(db, teacher_ids=[2], room_ids=[]).teacher_blocked == {}
+
+
+def test_cached_masks_follow_the_availability_version(session_factory):
+    reader, writer = session_factory(), session_factory()
+    masks = get_availability_masks(reader)
+    assert masks.is_teacher_available(1, 0, 1)
+    assert get_availability_masks(session_factory()) is masks
+
+    writer.add(TeacherAvailability(teacher_id=1, weekday=0, index_in_day=1, available=False))
+    invalidate_availability_masks(writer)
+    writer.commit()
+
+    # Any session (request, job, other process) sees the write once it is committed
+    assert availability_version(reader) == 1
+    assert not get_availability_masks(reader).is_teacher_available(1, 0, 1)
+    assert get_availability_masks(session_factory()) is get_availability_masks(reader)
+
+
+def test_rolled_back_write_keeps_the_version(session_factory):
+    writer = session_factory()
+    writer.add(RoomAvailability(room_id=3, weekday=0, index_in_day=1, available=False))
+    invalidate_availability_masks(writer)
+    writer.rollback()
+
+    assert availability_version(writer) == 0
+    assert get_availability_masks(writer).is_room_available(3, 0, 1)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from timetable_shared.services import rabbitmq_client
+
+
+class FakeBlockingConnection:
+    published = []
+
+    def __init__(self, params):
+        pass
+
+    def channel(self):
+        return self
+
+    def queue_declare(self, queue, durable):
+        assert durable
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((routing_key, json.loads(body)))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def published(monkeypatch):
+    monkeypatch.setattr(rabbitmq_client.pika, "BlockingConnection", FakeBlockingConnection)
+    FakeBlockingConnection.published = []
+    return FakeBlockingConnection.published
+
+
+def test_class_jobs_go_to_the_queue_of_their_lane(published):
+    assert rabbitmq_client.publish_timetable_generation_job(3, 30)
+    assert rabbitmq_client.publish_timetable_generation_job(
+        4, 40, "backtracking", lane=rabbitmq_client.LANE_INTERACTIVE
+    )
+
+    assert published == [
+        ("timetable_generation", {"job_id": 30, "class_id": 3}),
+        ("timetable_generation_interactive", {"job_id": 40, "class_id": 4, "strategy": "backtracking"}),
+    ]
+
+
+def test_school_jobs_go_to_the_queue_of_their_lane(published):
+    assert rabbitmq_client.publish_school_generation_job([1, 2], [10, 20], lane=rabbitmq_client.LANE_INTERACTIVE)
+    assert rabbitmq_client.publish_school_generation_job([1, 2], [11, 21])
+
+    assert [queue for queue, _ in published] == ["timetable_generation_interactive", "timetable_generation"]
+    assert published[0][1] == {"mode": "school", "job_ids": [10, 20], "class_ids": [1, 2]}
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+from timetable_shared.models import TimetableEntry, TimetableJob
+
+from conftest import ROOT, build_school
+
+
+def _load_worker():
+    path = ROOT / "services" / "scheduling-engine-service" / "app" / "main.py"
+    spec = importlib.util.spec_from_file_location("scheduling_engine_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+worker = _load_worker()
+
+
+class FakeChannel:
+    is_open = True
+
+    def __init__(self):
+        self.published = []
+        self.acked = []
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((routing_key, body, dict(properties.headers)))
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+
+def _delivery(attempts=None, queue="timetable_generation"):
+    headers = {worker.ATTEMPTS_HEADER: attempts} if attempts is not None else None
+    return (7, SimpleNamespace(headers=headers), queue)
+
+
+def test_settle_acks_a_done_message():
+    ch = FakeChannel()
+    worker._settle(ch, _delivery(), b"{}", worker.OUTCOME_DONE)
+    assert ch.published == [] and ch.acked == [7]
+
+
+def test_settle_retries_with_backoff_then_dead_letters():
+    ch = FakeChannel()
+    worker._settle(ch, _delivery(), b"{}", worker.OUTCOME_RETRY)
+    worker._settle(ch, _delivery(attempts=2), b"{}", worker.OUTCOME_RETRY)
+    worker._settle(ch, _delivery(attempts=worker.GENERATION_MAX_ATTEMPTS - 1), b"{}", worker.OUTCOME_RETRY)
+
+    (first, _, first_headers), (second, _, _), (last, _, last_headers) = ch.published
+    assert first == f"timetable_generation.retry.{worker._retry_delay(1)}s"
+    assert first_headers[worker.ATTEMPTS_HEADER] == 1
+    assert second == f"timetable_generation.retry.{worker._retry_delay(3)}s"
+    assert last == worker.DEAD_LETTER_QUEUE
+    assert last_headers["x-original-queue"] == "timetable_generation"
+    assert ch.acked == [7, 7, 7]
+
+
+def test_settle_dead_letters_at_once():
+    ch = FakeChannel()
+    worker._settle(ch, _delivery(), b"oops", worker.OUTCOME_DEAD)
+    assert [target for target, _, _ in ch.published] == [worker.DEAD_LETTER_QUEUE]
+
+
+def test_retry_delay_doubles_up_to_the_cap():
+    delays = [worker._retry_delay(attempt) for attempt in range(1, 12)]
+    assert delays == sorted(delays)
+    assert delays[1] == 2 * delays[0]
+    assert delays[-1] == worker.GENERATION_RETRY_MAX_SECONDS
+
+
+@pytest.fixture
+def job(db):
+    (class_id,) = build_school(db, classes=1)
+    job = TimetableJob(class_id=class_id, status="pending")
+    db.add(job)
+    db.commit()
+    return job
+
+
+def _fail_generation(monkeypatch, error):
+    def generate(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(worker, "generate_timetable_for_class", generate)
+
+
+def test_transient_failure_keeps_the_job_retrying(db, job, monkeypatch):
+    _fail_generation(monkeypatch, RuntimeError("connection reset"))
+
+    outcome = worker.process_job(job.id, job.class_id, db, attempt=2)
+
+    db.refresh(job)
+    assert outcome == worker.OUTCOME_RETRY
+    assert (job.status, job.failed_attempts, job.completed_at) == (worker.JOB_RETRYING, 2, None)
+    assert job.error_message == "connection reset"
+
+
+def test_last_attempt_fails_the_job(db, job, monkeypatch):
+    _fail_generation(monkeypatch, RuntimeError("connection reset"))
+
+    outcome = worker.process_job(job.id, job.class_id, db, attempt=worker.GENERATION_MAX_ATTEMPTS)
+
+    db.refresh(job)
+    assert outcome == worker.OUTCOME_RETRY  # _settle sends it to the dead-letter queue
+    assert job.status == "failed" and job.completed_at is not None
+
+
+def test_deterministic_failure_is_not_retried(db, job, monkeypatch):
+    _fail_generation(monkeypatch, ValueError("curriculum does not fill the grid"))
+
+    assert worker.process_job(job.id, job.class_id, db) == worker.OUTCOME_DONE
+    db.refresh(job)
+    assert job.status == "failed" and job.failed_attempts is None
+
+
+def test_unknown_job_is_dead_lettered(db, job, session_factory):
+    body = json.dumps({"job_id": job.id + 1, "class_id": job.class_id}).encode()
+
+    assert worker.handle_message(body, session_factory) == worker.OUTCOME_DEAD
+    assert worker.handle_message(b"not json", session_factory) == worker.OUTCOME_DEAD
+
+
+def test_failure_outside_the_job_is_recorded(db, job, session_factory, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(worker, "process_job", broken)
+    body = json.dumps({"job_id": job.id, "class_id": job.class_id}).encode()
+
+    assert worker.handle_message(body, session_factory, attempt=1) == worker.OUTCOME_RETRY
+    db.refresh(job)
+    assert (job.status, job.failed_attempts) == (worker.JOB_RETRYING, 1)
+
+
+@pytest.fixture
+def notifications(monkeypatch):
+    sent = []
+    monkeypatch.setattr(
+        "timetable_shared.services.rabbitmq_client.publish_notification_event",
+        lambda event_type, event_data: sent.append((event_type, event_data)) or True,
+    )
+    return sent
+
+
+def _jobs(db, class_ids):
+    jobs = [TimetableJob(class_id=class_id, status="pending") for class_id in class_ids]
+    db.add_all(jobs)
+    db.commit()
+    return jobs
+
+
+def _message(job):
+    return {"job_id": job.id, "class_id": job.class_id}
+
+
+def test_batch_solves_the_newest_job_of_each_class_jointly(db, monkeypatch):
+    class_ids = build_school(db, classes=2)
+    old, first, second = _jobs(db, [class_ids[0], class_ids[0], class_ids[1]])
+    joint, alone = [], []
+    monkeypatch.setattr(
+        worker, "process_school_job", lambda *args, **kwargs: joint.append((args, kwargs)) or worker.OUTCOME_DONE
+    )
+    monkeypatch.setattr(worker, "process_job", lambda *args: alone.append(args) or worker.OUTCOME_DONE)
+
+    outcomes = worker.process_batch([_message(old), _message(first), _message(second)], db, [1, 2, 1])
+
+    assert outcomes == [worker.OUTCOME_DONE] * 3
+    [(args, kwargs)] = joint
+    assert args[:2] == ([first.id, second.id], class_ids) and kwargs == {"coalesced": True}
+    assert alone == [(old.id, class_ids[0], db, worker.STRATEGY_RANDOM_RESTART, 1)]
+
+
+def test_failed_joint_run_falls_back_to_one_class_at_a_time(db, monkeypatch):
+    class_ids = build_school(db, classes=2)
+    jobs = _jobs(db, class_ids)
+    alone = []
+    monkeypatch.setattr(worker, "process_school_job", lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, "process_job", lambda *args: alone.append(args[0]) or worker.OUTCOME_RETRY)
+
+    assert worker.process_batch([_message(job) for job in jobs], db) == [worker.OUTCOME_RETRY] * 2
+    assert alone == [job.id for job in jobs]
+
+
+def test_batch_supersedes_the_older_duplicate(db, notifications):
+    class_ids = build_school(db, classes=2)
+    old, first, second = _jobs(db, [class_ids[0], class_ids[0], class_ids[1]])
+
+    outcomes = worker.process_batch([_message(old), _message(first), _message(second)], db)
+
+    assert outcomes == [worker.OUTCOME_DONE] * 3
+    for job in (old, first, second):
+        db.refresh(job)
+    assert old.status == worker.JOB_SUPERSEDED
+    assert (first.status, second.status) == ("completed", "completed")
+    assert db.query(TimetableEntry).count() == 35 * 2
+
+
+def test_superseded_job_is_acked_without_solving(db, notifications, monkeypatch):
+    (class_id,) = build_school(db, classes=1)
+    old, new = _jobs(db, [class_id, class_id])
+    _fail_generation(monkeypatch, AssertionError("must not solve"))
+
+    assert worker.process_job(old.id, class_id, db) == worker.OUTCOME_DONE
+    db.refresh(old)
+    assert old.status == worker.JOB_SUPERSEDED and old.completed_at is not None
+    assert notifications == []
+
+
+class FakeConnection:
+    is_open = True
+
+    def __init__(self):
+        self.timers = []
+
+    def call_later(self, delay, callback):
+        self.timers.append(callback)
+        return callback
+
+    def remove_timeout(self, timer):
+        self.timers.remove(timer)
+
+
+def _dispatcher(monkeypatch, **kwargs):
+    dispatcher = worker.JobDispatcher(pool="thread", **kwargs)
+    submitted = []
+
+    def submit(bodies, attempts):
+        submitted.append([json.loads(body)["job_id"] for body in bodies])
+        return Future()  # never finishes: the worker stays busy
+
+    monkeypatch.setattr(dispatcher, "_submit", submit)
+    return dispatcher, submitted
+
+
+def _dispatch(dispatcher, connection, job_id, lane=worker.LANE_BULK):
+    body = json.dumps({"job_id": job_id, "class_id": job_id}).encode()
+    dispatcher.dispatch(connection, FakeChannel(), SimpleNamespace(delivery_tag=job_id), None, body, lane)
+
+
+def test_dispatcher_batches_bulk_class_jobs(monkeypatch):
+    dispatcher, submitted = _dispatcher(monkeypatch, concurrency=4, batch_size=3, batch_window=0.5)
+    connection = FakeConnection()
+
+    _dispatch(dispatcher, connection, 1)
+    _dispatch(dispatcher, connection, 2)
+    assert submitted == [] and len(connection.timers) == 1
+    _dispatch(dispatcher, connection, 3)  # the batch is full
+    assert submitted == [[1, 2, 3]] and connection.timers == []
+
+    _dispatch(dispatcher, connection, 4)
+    _dispatch(dispatcher, connection, 5, lane=worker.LANE_INTERACTIVE)  # starts at once
+    assert submitted == [[1, 2, 3], [5]]
+    connection.timers[0]()  # the batch window ends
+    assert submitted == [[1, 2, 3], [5], [4]]
+
+
+def test_interactive_lane_is_favoured_but_bulk_still_runs(monkeypatch):
+    dispatcher, submitted = _dispatcher(monkeypatch, concurrency=6, interactive_weight=2)
+    connection = FakeConnection()
+    dispatcher._running = dispatcher.concurrency  # busy: everything waits in the lanes
+    for job_id in (1, 2):
+        _dispatch(dispatcher, connection, job_id)
+    for job_id in (11, 12, 13, 14):
+        _dispatch(dispatcher, connection, job_id, lane=worker.LANE_INTERACTIVE)
+    assert submitted == []
+
+    dispatcher._running = 0
+    dispatcher._pump()
+
+    assert submitted == [[11], [12], [1], [13], [14], [2]]
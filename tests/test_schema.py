@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from sqlalchemy import create_engine, inspect, text
+
+from timetable_shared.db import Base
+from timetable_shared.schema import upgrade_schema
+
+
+def test_upgrade_adds_columns_of_newer_versions():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        # time_slots and timetable_jobs as created before timeslot grids and job metrics
+        connection.execute(text(
+            "CREATE TABLE time_slots (id INTEGER PRIMARY KEY, weekday SMALLINT NOT NULL, "
+            "index_in_day SMALLINT NOT NULL, CONSTRAINT uq_timeslot_weekday_index UNIQUE (weekday, index_in_day))"
+        ))
+        connection.execute(text("INSERT INTO time_slots (weekday, index_in_day) VALUES (0, 1)"))
+        connection.execute(text(
+            "CREATE TABLE timetable_jobs (id INTEGER PRIMARY KEY, class_id INTEGER NOT NULL, "
+            "status VARCHAR(20) NOT NULL, created_at DATETIME NOT NULL, started_at DATETIME, "
+            "completed_at DATETIME, error_message VARCHAR(500))"
+        ))
+    Base.metadata.create_all(engine)
+
+    statements = upgrade_schema(engine, Base.metadata)
+
+    inspector = inspect(engine)
+    assert {"grid"} <= {c["name"] for c in inspector.get_columns("time_slots")}
+    assert {"metrics", "deadline_seconds"} <= {c["name"] for c in inspector.get_columns("timetable_jobs")}
+    assert any("ix_time_slots_grid" in statement for statement in statements)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT grid FROM time_slots")).scalar() == "standard"
+    # Up to date: nothing left to do
+    assert upgrade_schema(engine, Base.metadata) == []
+
+
+def test_fresh_database_needs_no_upgrade():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    assert upgrade_schema(engine, Base.metadata) == []
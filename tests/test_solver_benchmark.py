@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import sys
+
+import pytest
+
+from timetable_shared.db import Base
+from timetable_shared.models import Curriculum, TimeSlot
+
+from conftest import ROOT
+
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import solver_benchmark  # noqa: E402
+from synthetic_school import SchoolSpec, build_synthetic_school, curriculum_hours  # noqa: E402
+
+
+@pytest.mark.parametrize("subjects, tightness", [(13, 0.0), (13, 0.3), (13, 1.0), (8, 0.9), (18, 0.5)])
+def test_curriculum_hours_fill_the_week_under_the_cap(subjects, tightness):
+    hours = curriculum_hours(subjects, tightness, cap=2)
+
+    assert len(hours) == subjects and sum(hours) == 35
+    assert min(hours) >= 1 and max(hours) <= 2 * 5
+    assert hours == sorted(hours, reverse=True)
+
+
+def test_curriculum_hours_reject_impossible_specs():
+    with pytest.raises(ValueError):
+        curriculum_hours(3, 0.5, cap=2)  # 3 subjects x 10 hours < 35
+    with pytest.raises(ValueError):
+        curriculum_hours(0, 0.5, cap=2)
+
+
+def test_synthetic_school_is_reproducible(session_factory):
+    spec = SchoolSpec(classes=3, rooms=3, seed=7)
+
+    def build():
+        with session_factory() as db:
+            school = build_synthetic_school(db, spec)
+            curricula = sorted(
+                db.query(Curriculum.class_id, Curriculum.subject_id, Curriculum.hours_per_week, Curriculum.teacher_id)
+            )
+            slots = db.query(TimeSlot).count()
+            for table in reversed(Base.metadata.sorted_tables):
+                db.execute(table.delete())
+            db.commit()
+        return school, curricula, slots
+
+    first, curricula, slots = build()
+    second, again, _ = build()
+
+    assert (first.hours, first.teacher_ids) == (second.hours, second.teacher_ids)
+    assert [row[1:] for row in curricula] == [row[1:] for row in again]
+    assert slots == 35
+    assert sum(first.hours.values()) == 35 and "SPORT" in first.hours
+
+
+def test_benchmark_writes_a_report_and_compares_with_it(tmp_path):
+    output = tmp_path / "bench.json"
+    args = ["--scenario", "small", "--strategy", "random_restart", "--repeats", "1", "--no-memory"]
+
+    assert solver_benchmark.main(args + ["--classes", "2", "--output", str(output)]) == 0
+
+    report = json.loads(output.read_text())
+    assert {(g["scenario"], g["mode"]) for g in report["summary"]} == {("small", "per_class"), ("small", "school")}
+    assert all(g["success_rate"] == 1.0 for g in report["summary"])
+    assert report["meta"]["scenarios"]["small"]["classes"] == 2
+    assert solver_benchmark.main(args + ["--classes", "2", "--compare", str(output)]) == 0
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from timetable_shared.models import Curriculum, GenerationCache, TeacherAvailability
+from timetable_shared.services import timetable_cache
+from timetable_shared.services.timetable_cache import (
+    generation_fingerprint,
+    load_cached_result,
+    prune_cache,
+    store_cached_result,
+)
+from timetable_shared.services.timetable_snapshot import load_generation_snapshot, load_school_snapshot
+
+from conftest import SHARED_TEACHER_ID, build_school
+
+
+def _fingerprint(db, class_id, **params):
+    params.setdefault("seed", 1)
+    params.setdefault("strategy", "random_restart")
+    return generation_fingerprint(load_generation_snapshot(db, class_id), **params)
+
+
+def test_fingerprint_is_stable(db):
+    first, second = build_school(db)
+    assert _fingerprint(db, first) == _fingerprint(db, first)
+    assert _fingerprint(db, first) != _fingerprint(db, second)
+    assert generation_fingerprint(load_school_snapshot(db, [first, second]), seed=1) == generation_fingerprint(
+        load_school_snapshot(db, [second, first]), seed=1
+    )
+
+
+def test_fingerprint_changes_with_parameters(db):
+    (class_id,) = build_school(db, classes=1)
+    base = _fingerprint(db, class_id)
+    assert _fingerprint(db, class_id, seed=2) != base
+    assert _fingerprint(db, class_id, strategy="backtracking") != base
+
+
+def test_fingerprint_changes_with_inputs(db):
+    (class_id,) = build_school(db, classes=1)
+    base = _fingerprint(db, class_id)
+
+    db.add(TeacherAvailability(teacher_id=SHARED_TEACHER_ID, weekday=0, index_in_day=1, available=False))
+    db.commit()
+    blocked = _fingerprint(db, class_id)
+    assert blocked != base
+
+    # Availability of a teacher the class does not have is not an input
+    db.add(TeacherAvailability(teacher_id=9999, weekday=0, index_in_day=1, available=False))
+    db.commit()
+    assert _fingerprint(db, class_id) == blocked
+
+    db.query(Curriculum).filter_by(class_id=class_id, teacher_id=SHARED_TEACHER_ID).update(
+        {Curriculum.teacher_id: 42}
+    )
+    db.commit()
+    assert _fingerprint(db, class_id) != blocked
+
+
+def test_cached_result_round_trip(db):
+    store_cached_result(db, "a" * 64, {3: {10: (1, 2), 11: (4, None)}}, {3: [{"type": "x"}]}, 1.5)
+
+    assignments, conflicts, score = load_cached_result(db, "a" * 64)
+
+    assert assignments == {3: {10: (1, 2), 11: (4, None)}}
+    assert conflicts == {3: [{"type": "x"}]}
+    assert score == 1.5
+    assert db.get(GenerationCache, "a" * 64).last_hit_at is not None
+    assert load_cached_result(db, "b" * 64) is None
+
+
+def _entry(db, key, created_days_ago, hit_days_ago=None):
+    now = datetime.utcnow()
+    db.add(GenerationCache(
+        fingerprint=key,
+        class_ids="1",
+        payload="{}",
+        created_at=now - timedelta(days=created_days_ago),
+        last_hit_at=now - timedelta(days=hit_days_ago) if hit_days_ago is not None else None,
+    ))
+
+
+def _keys(db):
+    return sorted(key for (key,) in db.query(GenerationCache.fingerprint))
+
+
+def test_prune_drops_entries_unused_past_the_ttl(db):
+    _entry(db, "old", created_days_ago=40)
+    _entry(db, "old-but-hit", created_days_ago=40, hit_days_ago=1)
+    _entry(db, "new", created_days_ago=1)
+    db.commit()
+
+    assert prune_cache(db, ttl_days=30, max_entries=0) == 1
+    assert _keys(db) == ["new", "old-but-hit"]
+
+
+def test_prune_keeps_the_most_recently_used_entries(db):
+    _entry(db, "a", created_days_ago=5)
+    _entry(db, "b", created_days_ago=4)
+    _entry(db, "c", created_days_ago=9, hit_days_ago=0)
+    _entry(db, "d", created_days_ago=3)
+    db.commit()
+
+    assert prune_cache(db, ttl_days=0, max_entries=2) == 2
+    assert _keys(db) == ["c", "d"]
+
+
+def test_store_prunes_to_the_cap(db, monkeypatch):
+    monkeypatch.setattr(timetable_cache, "CACHE_MAX_ENTRIES", 2)
+    _entry(db, "a", created_days_ago=2)
+    _entry(db, "b", created_days_ago=1)
+    db.commit()
+
+    store_cached_result(db, "c", {1: {}}, {}, None)
+
+    assert _keys(db) == ["b", "c"]
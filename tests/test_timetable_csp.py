@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import random
+from collections import Counter
+
+from timetable_shared.models import TeacherAvailability
+from timetable_shared.services.timetable_csp import (
+    STATUS_BUDGET_EXHAUSTED,
+    STATUS_INFEASIBLE,
+    solve_class_csp,
+)
+from timetable_shared.services.timetable_snapshot import load_generation_snapshot
+
+from conftest import SHARED_TEACHER_ID, build_school
+
+
+def assert_valid_placement(snapshot, placement, *, cap=2, taken_teachers=None):
+    taken_teachers = taken_teachers or {}
+    teacher_of = {c.subject_id: c.teacher_id for c in snapshot.curriculum}
+    assert set(placement) == {ts.id for ts in snapshot.timeslots}
+    assert Counter(placement.values()) == {c.subject_id: c.hours_per_week for c in snapshot.curriculum}
+    slot_of = {ts.id: ts for ts in snapshot.timeslots}
+    per_day = Counter((slot_of[ts_id].weekday, s) for ts_id, s in placement.items())
+    assert max(per_day.values()) <= cap
+    for ts_id, subject_id in placement.items():
+        ts = slot_of[ts_id]
+        teacher_id = teacher_of[subject_id]
+        assert snapshot.is_teacher_available(teacher_id, ts.weekday, ts.index_in_day)
+        assert teacher_id not in taken_teachers.get(ts_id, ())
+
+
+def _snapshot(db, classes=1):
+    class_ids = build_school(db, classes=classes)
+    return load_generation_snapshot(db, class_ids[0])
+
+
+def test_solves_a_class(db):
+    snapshot = _snapshot(db)
+    result = solve_class_csp(snapshot, rng=random.Random(1))
+    assert result.solved
+    assert_valid_placement(snapshot, result.placement)
+
+
+def test_respects_availability_and_busy_teachers(db):
+    (class_id,) = build_school(db, classes=1)
+    # The shared teacher is away on the first two hours of every day...
+    for weekday in range(5):
+        for index_in_day in (1, 2):
+            db.add(TeacherAvailability(
+                teacher_id=SHARED_TEACHER_ID, weekday=weekday, index_in_day=index_in_day, available=False
+            ))
+    db.commit()
+    snapshot = load_generation_snapshot(db, class_id)
+    # ...and teaching another class in the last hour of every day
+    taken = {
+        ts.id: {SHARED_TEACHER_ID} for ts in snapshot.timeslots if ts.index_in_day == 7
+    }
+
+    result = solve_class_csp(snapshot, taken_teachers=taken, rng=random.Random(2))
+
+    assert result.solved
+    assert_valid_placement(snapshot, result.placement, taken_teachers=taken)
+
+
+def test_keeps_fixed_cells(db):
+    snapshot = _snapshot(db)
+    mat = next(c.subject_id for c in snapshot.curriculum if c.teacher_id == SHARED_TEACHER_ID)
+    fixed = {ts.id: mat for ts in snapshot.timeslots if ts.weekday == 0 and ts.index_in_day in (6, 7)}
+
+    result = solve_class_csp(snapshot, fixed=fixed, rng=random.Random(3))
+
+    assert result.solved
+    assert all(result.placement[ts_id] == mat for ts_id in fixed)
+    assert_valid_placement(snapshot, result.placement)
+
+
+def test_reports_infeasible_inputs(db):
+    snapshot = _snapshot(db)
+    # Ten MAT hours cannot fit with at most one per day over five days
+    result = solve_class_csp(snapshot, max_same_subject_per_day=1)
+    assert result.status == STATUS_INFEASIBLE and result.reason
+
+    mat = next(c.subject_id for c in snapshot.curriculum if c.teacher_id == SHARED_TEACHER_ID)
+    monday = [ts.id for ts in snapshot.timeslots if ts.weekday == 0][:3]
+    result = solve_class_csp(snapshot, fixed={ts_id: mat for ts_id in monday})
+    assert result.status == STATUS_INFEASIBLE
+
+
+def test_finds_the_only_slots_a_teacher_has_left(db):
+    (class_id,) = build_school(db, classes=1)
+    snapshot = load_generation_snapshot(db, class_id)
+    mat = next(c for c in snapshot.curriculum if c.teacher_id == SHARED_TEACHER_ID)
+    # The shared teacher is free in exactly the ten slots MAT needs (two per day)
+    free = {(weekday, index_in_day) for weekday in range(5) for index_in_day in (3, 5)}
+    taken = {
+        ts.id: {SHARED_TEACHER_ID}
+        for ts in snapshot.timeslots
+        if (ts.weekday, ts.index_in_day) not in free
+    }
+
+    result = solve_class_csp(snapshot, taken_teachers=taken, rng=random.Random(4))
+
+    assert result.solved
+    slot_of = {ts.id: ts for ts in snapshot.timeslots}
+    assert {
+        (slot_of[ts_id].weekday, slot_of[ts_id].index_in_day)
+        for ts_id, s in result.placement.items()
+        if s == mat.subject_id
+    } == free
+
+
+def test_gives_up_when_the_step_budget_runs_out(db):
+    snapshot = _snapshot(db)
+    result = solve_class_csp(snapshot, max_steps=3)
+    assert result.status == STATUS_BUDGET_EXHAUSTED
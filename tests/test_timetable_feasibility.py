@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from timetable_shared.models import TeacherAvailability
+from timetable_shared.services.timetable_feasibility import check_class_feasibility, check_school_feasibility
+from timetable_shared.services.timetable_snapshot import load_generation_snapshot, load_school_snapshot
+
+from conftest import SHARED_TEACHER_ID, build_school
+
+# Teachers of the first class in build_school
+ENG_TEACHER_ID, BIO_TEACHER_ID = 102, 103
+
+
+def _block(db, teacher_id, slots):
+    db.add_all(
+        TeacherAvailability(teacher_id=teacher_id, weekday=weekday, index_in_day=index_in_day, available=False)
+        for weekday, index_in_day in slots
+    )
+    db.commit()
+
+
+def test_solvable_school_passes(db):
+    class_ids = build_school(db, classes=3)
+    reports = check_school_feasibility(load_school_snapshot(db, class_ids))
+    assert all(report.feasible for report in reports.values())
+    assert reports[class_ids[0]].max_placeable_hours == 35
+
+
+def test_per_day_cap_bound(db):
+    (class_id,) = build_school(db, classes=1)
+    report = check_class_feasibility(load_generation_snapshot(db, class_id), max_same_subject_per_day=1)
+    assert not report.feasible
+    assert report.max_placeable_hours is None  # the counting bounds already failed
+    assert report.conflicts[0]["type"] == "no_solution"
+
+
+def test_teacher_without_enough_free_slots(db):
+    (class_id,) = build_school(db, classes=1)
+    # MAT needs 10 hours; its teacher is away on four of the five days
+    _block(db, SHARED_TEACHER_ID, [(weekday, i) for weekday in (1, 2, 3, 4) for i in range(1, 8)])
+
+    report = check_class_feasibility(load_generation_snapshot(db, class_id))
+
+    assert [c["type"] for c in report.conflicts] == ["teacher_unavailable"]
+    assert f"Teacher {SHARED_TEACHER_ID} teaches" in report.conflicts[0]["details"]
+
+
+def test_teacher_free_slots_under_the_per_day_cap(db):
+    (class_id,) = build_school(db, classes=1)
+    # 14 free slots on two days, but at most 2 MAT hours a day: 4 < 10
+    _block(db, SHARED_TEACHER_ID, [(weekday, i) for weekday in (2, 3, 4) for i in range(1, 8)])
+
+    report = check_class_feasibility(load_generation_snapshot(db, class_id))
+
+    assert [c["type"] for c in report.conflicts] == ["teacher_unavailable"]
+    assert "allow at most 4 with 2 per day" in report.conflicts[0]["details"]
+
+
+def test_flow_bound_catches_teachers_competing_for_slots(db):
+    (class_id,) = build_school(db, classes=1)
+    # ENG and BIO (8 hours each) are free only in the same ten slots: each fits alone, not both
+    away = [(weekday, i) for weekday in (2, 3, 4) for i in range(1, 8)] + [(1, i) for i in range(4, 8)]
+    _block(db, ENG_TEACHER_ID, away)
+    _block(db, BIO_TEACHER_ID, away)
+
+    report = check_class_feasibility(load_generation_snapshot(db, class_id), max_same_subject_per_day=7)
+
+    assert report.max_placeable_hours == 35 - 6
+    assert [c["type"] for c in report.conflicts] == ["no_solution"]
+    assert f"{ENG_TEACHER_ID}, {BIO_TEACHER_ID}" in report.conflicts[0]["details"]
+
+
+def test_shared_teacher_bound_across_classes(db):
+    # Teacher 1 teaches 10 MAT hours in each of four classes: 40 > 35 slots
+    class_ids = build_school(db, classes=4)
+
+    reports = check_school_feasibility(load_school_snapshot(db, class_ids))
+
+    for class_id in class_ids:
+        assert [c["type"] for c in reports[class_id].conflicts] == ["teacher_unavailable"]
+        assert "across classes" in reports[class_id].conflicts[0]["details"]
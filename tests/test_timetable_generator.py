@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import json
+import time
+from collections import Counter
+
+import pytest
+from sqlalchemy import and_
+
+from timetable_shared.models import Curriculum, Subject, TimetableEntry, TimetableJob
+from timetable_shared.services.timetable_generator import (
+    GenerationDeadlineExceeded,
+    GenerationInfeasible,
+    GenerationSuperseded,
+    JOB_SUPERSEDED,
+    _job_progress,
+    generate_timetable_for_class,
+    generate_timetables_for_school,
+    supersede_older_jobs,
+    superseded_classes,
+)
+from timetable_shared.services.timetable_snapshot import load_generation_snapshot
+from timetable_shared.services.timetable_solver import STRATEGIES
+
+from conftest import SHARED_TEACHER_ID, build_school
+
+
+def teacher_double_bookings(db) -> list[tuple[int, int]]:
+    """(timeslot_id, teacher_id) pairs with more than one lesson."""
+    rows = (
+        db.query(TimetableEntry.timeslot_id, Curriculum.teacher_id)
+        .join(
+            Curriculum,
+            and_(
+                Curriculum.class_id == TimetableEntry.class_id,
+                Curriculum.subject_id == TimetableEntry.subject_id,
+            ),
+        )
+        .all()
+    )
+    return [key for key, n in Counter(rows).items() if n > 1]
+
+
+def room_double_bookings(db) -> list[tuple[int, int]]:
+    rows = db.query(TimetableEntry.timeslot_id, TimetableEntry.room_id).filter(
+        TimetableEntry.room_id.isnot(None)
+    )
+    return [key for key, n in Counter(rows).items() if n > 1]
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_classes_solved_one_after_another_share_teacher_without_overlap(db, strategy):
+    class_ids = build_school(db, classes=3)
+
+    for seed, class_id in enumerate(class_ids):
+        generate_timetable_for_class(db, class_id, seed=seed, strategy=strategy)
+
+    assert db.query(TimetableEntry).count() == 35 * len(class_ids)
+    assert teacher_double_bookings(db) == []
+    assert room_double_bookings(db) == []
+
+
+def test_class_snapshot_sees_other_classes_teachers(db):
+    first, second = build_school(db, classes=2)
+    generate_timetable_for_class(db, first, seed=1)
+
+    snapshot = load_generation_snapshot(db, second)
+
+    busy = {ts_id for ts_id, teachers in snapshot.occupied_teachers.items() if SHARED_TEACHER_ID in teachers}
+    assert len(busy) == 10
+    # Only the class's own teachers are tracked
+    assert set().union(*snapshot.occupied_teachers.values()) == {SHARED_TEACHER_ID}
+
+
+def test_class_precheck_counts_teacher_hours_in_other_classes(db):
+    # 4 classes x 10 MAT hours need 40 slots of teacher 1; only 35 exist
+    class_ids = build_school(db, classes=4)
+    for seed, class_id in enumerate(class_ids[:3]):
+        generate_timetable_for_class(db, class_id, seed=seed)
+
+    with pytest.raises(GenerationInfeasible):
+        generate_timetable_for_class(db, class_ids[3], seed=3)
+    assert teacher_double_bookings(db) == []
+
+
+def test_school_solve_has_no_overlap(db):
+    class_ids = build_school(db, classes=3)
+
+    generate_timetables_for_school(db, class_ids, seed=1)
+
+    assert db.query(TimetableEntry).count() == 35 * len(class_ids)
+    assert teacher_double_bookings(db) == []
+    assert room_double_bookings(db) == []
+
+
+def test_school_precheck_rejects_an_overbooked_shared_teacher(db):
+    # Teacher 1 would need 40 hours in a 35-slot week
+    class_ids = build_school(db, classes=4)
+
+    with pytest.raises(GenerationInfeasible, match=r"40 hours/week across classes 1, 2, 3, 4"):
+        generate_timetables_for_school(db, class_ids, seed=1, max_attempts=3)
+    assert db.query(TimetableEntry).count() == 0
+
+
+def test_deadline_stops_the_solve(db):
+    (class_id,) = build_school(db, classes=1)
+
+    with pytest.raises(GenerationDeadlineExceeded, match="deadline reached"):
+        generate_timetable_for_class(db, class_id, seed=1, deadline_seconds=0)
+    assert db.query(TimetableEntry).count() == 0
+
+
+def test_progress_commits_nothing_pending_on_the_callers_session(db):
+    (class_id,) = build_school(db, classes=1)
+    job = TimetableJob(class_id=class_id, status="processing")
+    db.add(job)
+    db.commit()
+    progress = _job_progress(db, [job.id], time.monotonic())
+
+    db.add(Subject(name="Pending", short_code="PEN"))
+    progress.report(7, 12.5)
+    db.rollback()
+
+    assert (job.progress_attempts, job.progress_best_score) == (7, 12.5)
+    assert db.query(Subject).filter_by(name="Pending").count() == 0
+
+
+def test_job_records_phase_timings_and_counters(db):
+    (class_id,) = build_school(db, classes=1)
+    job = TimetableJob(class_id=class_id, status="processing")
+    db.add(job)
+    db.commit()
+    stats = {}
+
+    generate_timetable_for_class(db, class_id, seed=1, job_id=job.id, use_cache=False, stats=stats)
+
+    db.refresh(job)
+    metrics = json.loads(job.metrics)
+    assert {"load", "precheck", "search", "rooms", "persist"} <= set(metrics["phases"])
+    assert metrics["counters"]["attempts"] >= 1
+    assert metrics["counters"]["db_statements"] > 0
+    assert stats["attempts"] == metrics["counters"]["attempts"] and stats["search_seconds"] >= 0
+
+
+def test_failed_job_keeps_its_metrics(db):
+    (class_id,) = build_school(db, classes=1)
+    job = TimetableJob(class_id=class_id, status="processing")
+    db.add(job)
+    db.commit()
+
+    with pytest.raises(GenerationInfeasible):
+        generate_timetable_for_class(db, class_id, seed=1, job_id=job.id, max_same_subject_per_day=1)
+
+    db.refresh(job)
+    metrics = json.loads(job.metrics)
+    assert "precheck" in metrics["phases"] and "search" not in metrics["phases"]
+
+
+def test_only_the_newest_live_job_of_a_class_counts(db):
+    first, second = build_school(db, classes=2)
+    jobs = [
+        TimetableJob(class_id=first, status="completed"),
+        TimetableJob(class_id=first, status="pending"),
+        TimetableJob(class_id=first, status="pending"),
+        TimetableJob(class_id=second, status="pending"),
+        TimetableJob(class_id=second, status="failed"),
+    ]
+    db.add_all(jobs)
+    db.commit()
+    done, old, new, other, failed = jobs
+
+    assert superseded_classes(db, {first: old.id, second: other.id}) == {first}
+    assert superseded_classes(db, {first: new.id, second: other.id}) == set()
+
+    supersede_older_jobs(db, [new])
+    db.commit()
+    db.expire_all()
+    assert [job.status for job in jobs] == ["completed", JOB_SUPERSEDED, "pending", "pending", "failed"]
+
+
+def test_superseded_job_persists_nothing(db):
+    (class_id,) = build_school(db, classes=1)
+    old, new = TimetableJob(class_id=class_id, status="processing"), TimetableJob(class_id=class_id, status="pending")
+    db.add_all([old, new])
+    db.commit()
+
+    with pytest.raises(GenerationSuperseded):
+        generate_timetable_for_class(db, class_id, seed=1, job_id=old.id)
+
+    db.refresh(old)
+    assert old.status == JOB_SUPERSEDED
+    assert db.query(TimetableEntry).count() == 0
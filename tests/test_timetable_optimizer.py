@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from collections import Counter
+
+import pytest
+
+from timetable_shared.services.timetable_generator import generate_timetables_for_school
+from timetable_shared.services.timetable_optimizer import optimize_timetables, score_timetables
+from timetable_shared.services.timetable_snapshot import load_school_snapshot
+
+from conftest import build_school
+from test_timetable_csp import assert_valid_placement
+
+
+def _solved_school(db, classes=2):
+    class_ids = build_school(db, classes=classes)
+    entries = generate_timetables_for_school(db, class_ids, seed=1)
+    assignments = {
+        cid: {e.timeslot_id: (e.subject_id, e.room_id) for e in class_entries}
+        for cid, class_entries in entries.items()
+    }
+    # The stored timetables of the solved classes are not fixed occupancy
+    return load_school_snapshot(db, class_ids), assignments
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_never_worsens_the_score_and_keeps_hard_constraints(db, seed):
+    school, assignments = _solved_school(db)
+    kwargs = dict(
+        timeslots=school.timeslots,
+        occupied_teachers=school.occupied_teachers,
+        occupied_rooms=school.occupied_rooms,
+    )
+    before, _ = score_timetables(school.classes, assignments, **kwargs)
+
+    result = optimize_timetables(school.classes, assignments, max_moves=3000, seed=seed, **kwargs)
+
+    assert result.initial_score == pytest.approx(before)
+    assert result.score <= result.initial_score
+    assert result.score == pytest.approx(score_timetables(school.classes, result.assignments, **kwargs)[0])
+    teachers, rooms = Counter(), Counter()
+    for class_id, snapshot in school.classes.items():
+        cells = result.assignments[class_id]
+        assert_valid_placement(snapshot, {ts_id: subject_id for ts_id, (subject_id, _) in cells.items()})
+        teacher_of = {c.subject_id: c.teacher_id for c in snapshot.curriculum}
+        slot_of = {ts.id: ts for ts in snapshot.timeslots}
+        for ts_id, (subject_id, room_id) in cells.items():
+            teachers[ts_id, teacher_of[subject_id]] += 1
+            if room_id is not None:
+                ts = slot_of[ts_id]
+                assert snapshot.is_room_available(room_id, ts.weekday, ts.index_in_day)
+                rooms[ts_id, room_id] += 1
+    assert max(teachers.values()) == 1
+    assert max(rooms.values()) == 1
+
+
+def test_same_seed_same_result(db):
+    school, assignments = _solved_school(db)
+
+    runs = [
+        optimize_timetables(school.classes, assignments, timeslots=school.timeslots, max_moves=2000, seed=4)
+        for _ in range(2)
+    ]
+
+    assert runs[0].assignments == runs[1].assignments
+    assert runs[0].score == runs[1].score
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from timetable_shared.models import Room, TimeSlot, TimetableEntry
+from timetable_shared.services import timetable_persistence
+from timetable_shared.services.timetable_persistence import apply_plan, diff_assignments, persist_assignments
+
+from conftest import build_school
+
+
+def _stored(db, class_id):
+    return {
+        e.timeslot_id: (e.subject_id, e.room_id, e.version, e.id)
+        for e in db.query(TimetableEntry).filter_by(class_id=class_id)
+    }
+
+
+def _setup(db):
+    (class_id,) = build_school(db, classes=1)
+    slots = [ts.id for ts in db.query(TimeSlot).order_by(TimeSlot.id)][:4]
+    rooms = [r.id for r in db.query(Room).order_by(Room.id)]
+    assignment = {ts_id: (1, rooms[0]) for ts_id in slots}
+    persist_assignments(db, {class_id: assignment})
+    return class_id, slots, rooms, assignment
+
+
+def test_upsert_returns_the_stored_rows(db, monkeypatch):
+    monkeypatch.setattr(timetable_persistence, "UPSERT_CHUNK_ROWS", 3)  # several statements
+    class_ids = build_school(db, classes=2)
+    slots = [ts.id for ts in db.query(TimeSlot).order_by(TimeSlot.id)][:5]
+    room_id = db.query(Room.id).order_by(Room.id).first()[0]
+    assignments = {cid: {ts_id: (1, room_id if cid == class_ids[0] else None) for ts_id in slots} for cid in class_ids}
+
+    entries = persist_assignments(db, assignments)
+
+    for cid in class_ids:
+        assert [e.timeslot_id for e in entries[cid]] == slots
+        assert {e.id: (e.timeslot_id, e.subject_id, e.room_id, e.version) for e in entries[cid]} == {
+            e.id: (e.timeslot_id, e.subject_id, e.room_id, e.version)
+            for e in db.query(TimetableEntry).filter_by(class_id=cid).populate_existing()
+        }
+
+
+def test_persisting_again_keeps_entry_ids(db):
+    class_id, slots, rooms, assignment = _setup(db)
+    before = _stored(db, class_id)
+    new = {ts_id: (2, rooms[1]) for ts_id in slots[:3]}
+
+    entries = persist_assignments(db, {class_id: new})
+
+    assert {e.timeslot_id: (e.subject_id, e.room_id, e.version, e.id) for e in entries[class_id]} == {
+        ts_id: (2, rooms[1], before[ts_id][2] + 1, before[ts_id][3]) for ts_id in slots[:3]
+    }
+    # The cell the new result no longer uses is gone
+    assert set(_stored(db, class_id)) == set(slots[:3])
+
+
+def test_unchanged_result_plans_no_writes(db):
+    class_id, _, _, assignment = _setup(db)
+
+    plan = diff_assignments(db, {class_id: assignment})
+
+    assert not plan.changed
+    assert plan.changes[class_id].unchanged == 4
+    entries = apply_plan(db, plan)
+    assert [e.timeslot_id for e in entries[class_id]] == sorted(assignment)
+    assert not plan.changes[class_id].changed
+
+
+def test_only_changed_cells_are_written(db):
+    class_id, slots, rooms, assignment = _setup(db)
+    before = _stored(db, class_id)
+    new = dict(assignment)
+    new[slots[0]] = (2, rooms[0])  # other subject
+    new[slots[1]] = (1, None)  # room dropped
+    del new[slots[2]]  # cell removed
+    spare = db.query(TimeSlot.id).filter(TimeSlot.id.notin_(slots)).order_by(TimeSlot.id).first()[0]
+    new[spare] = (3, rooms[1])  # new cell
+
+    plan = diff_assignments(db, {class_id: new})
+    assert len(plan.rows) == 3 and plan.deleted_ids == [before[slots[2]][3]]
+    entries = apply_plan(db, plan)
+
+    changes = plan.changes[class_id]
+    assert changes.as_dict() == {"created": 1, "updated": 2, "deleted": 1, "unchanged": 1}
+    assert sorted(changes.updated) == sorted([before[slots[0]][3], before[slots[1]][3]])
+    after = _stored(db, class_id)
+    assert {ts_id: v[:2] for ts_id, v in after.items()} == new
+    # Untouched cells keep their row and version
+    assert after[slots[3]] == before[slots[3]]
+    assert {e.timeslot_id: (e.subject_id, e.room_id) for e in entries[class_id]} == new
+
+
+def test_rewrite_everything(db):
+    class_id, _, _, assignment = _setup(db)
+
+    plan = diff_assignments(db, {class_id: assignment}, only_changed=False)
+
+    assert len(plan.rows) == 4 and not plan.kept
+    apply_plan(db, plan)
+    assert len(plan.changes[class_id].updated) == 4
+    assert {ts_id: v[:2] for ts_id, v in _stored(db, class_id).items()} == assignment
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+
+import pytest
+
+from timetable_shared.models import (
+    Curriculum,
+    Room,
+    RoomAvailability,
+    TeacherAvailability,
+    TimeSlot,
+    TimetableEntry,
+    TimetableJob,
+)
+from timetable_shared.services import rabbitmq_client, timetable_repair
+from timetable_shared.services.timetable_generator import generate_timetable_for_class
+from timetable_shared.services.timetable_repair import (
+    REPAIR_CHANGED,
+    REPAIR_INCOMPLETE,
+    REPAIR_QUEUED,
+    repair_or_regenerate,
+    repair_timetable_for_class,
+)
+
+from conftest import SHARED_TEACHER_ID, build_school
+from test_timetable_generator import room_double_bookings, teacher_double_bookings
+
+# ENG teacher of the first class in build_school
+ENG_TEACHER_ID = 102
+
+
+def _solved_school(db, classes=2):
+    class_ids = build_school(db, classes=classes)
+    for seed, class_id in enumerate(class_ids):
+        generate_timetable_for_class(db, class_id, seed=seed)
+    return class_ids
+
+
+def _subject_of_teacher(db, class_id, teacher_id):
+    return (
+        db.query(Curriculum.subject_id)
+        .filter(Curriculum.class_id == class_id, Curriculum.teacher_id == teacher_id)
+        .scalar()
+    )
+
+
+def test_repair_removes_teacher_double_booking(db):
+    first, second = _solved_school(db)
+    mat = _subject_of_teacher(db, first, SHARED_TEACHER_ID)
+    busy = {
+        e.timeslot_id
+        for e in db.query(TimetableEntry).filter_by(class_id=second, subject_id=mat)
+    }
+    # Swap a MAT hour of the first class onto a slot where the second class has MAT
+    clash = db.query(TimetableEntry).filter(
+        TimetableEntry.class_id == first,
+        TimetableEntry.timeslot_id.in_(busy),
+        TimetableEntry.subject_id != mat,
+    ).first()
+    moved = db.query(TimetableEntry).filter(
+        TimetableEntry.class_id == first,
+        TimetableEntry.timeslot_id.notin_(busy),
+        TimetableEntry.subject_id == mat,
+    ).first()
+    clash.subject_id, moved.subject_id = mat, clash.subject_id
+    db.commit()
+    assert teacher_double_bookings(db)
+
+    result = repair_timetable_for_class(db, first)
+
+    assert result.affected_cells >= 1
+    assert teacher_double_bookings(db) == []
+    assert room_double_bookings(db) == []
+    assert db.query(TimetableEntry).filter_by(class_id=first).count() == 35
+
+
+def test_repair_never_picks_a_blocked_room(db):
+    (class_id,) = _solved_school(db, classes=1)
+    entry = db.query(TimetableEntry).filter_by(class_id=class_id).first()
+    timeslot = db.get(TimeSlot, entry.timeslot_id)
+    for room in db.query(Room):
+        db.add(RoomAvailability(
+            room_id=room.id,
+            weekday=timeslot.weekday,
+            index_in_day=timeslot.index_in_day,
+            available=False,
+        ))
+    db.commit()
+
+    result = repair_timetable_for_class(db, class_id)
+
+    db.refresh(entry)
+    assert entry.room_id is None
+    assert [c["type"] for c in result.conflicts] == ["room_unavailable"]
+
+
+@pytest.fixture
+def published(monkeypatch):
+    published = []
+    monkeypatch.setattr(
+        rabbitmq_client,
+        "publish_timetable_generation_job",
+        lambda class_id, job_id, strategy=None, lane=rabbitmq_client.LANE_BULK: published.append(
+            (class_id, job_id, lane)
+        ) or True,
+    )
+    return published
+
+
+def test_unrepairable_class_gets_a_generation_job(db, published):
+    first, second = _solved_school(db)
+    # The first class's ENG teacher is away four days a week: eight hours fit nowhere
+    db.add_all(
+        TeacherAvailability(teacher_id=ENG_TEACHER_ID, weekday=weekday, index_in_day=i, available=False)
+        for weekday in (1, 2, 3, 4)
+        for i in range(1, 8)
+    )
+    older = TimetableJob(class_id=first, status="pending")
+    db.add(older)
+    db.commit()
+
+    statuses = repair_or_regenerate(db, [first, second])
+
+    assert statuses[first] == REPAIR_QUEUED
+    job = db.query(TimetableJob).filter_by(status="pending").one()
+    assert job.class_id == first and job.id != older.id
+    assert published == [(first, job.id, rabbitmq_client.LANE_BULK)]
+    # The pending job is superseded as by POST /generate
+    db.refresh(older)
+    assert older.status == "superseded"
+
+
+def test_incomplete_curriculum_queues_nothing(db, published):
+    first, second = _solved_school(db)
+    # One row of the curriculum edited: it no longer sums to the grid
+    db.query(Curriculum).filter_by(class_id=first, teacher_id=SHARED_TEACHER_ID).update(
+        {Curriculum.hours_per_week: 9}
+    )
+    db.commit()
+
+    statuses = repair_or_regenerate(db, [first, second])
+
+    assert statuses[first] == REPAIR_INCOMPLETE
+    assert db.query(TimetableJob).count() == 0 and published == []
+
+
+def test_busy_teachers_queue_a_job_instead_of_waiting(db, published, monkeypatch):
+    @contextmanager
+    def busy(db, class_ids):
+        yield False
+
+    (class_id,) = _solved_school(db, classes=1)
+    entries = {e.id: (e.subject_id, e.room_id) for e in db.query(TimetableEntry)}
+    db.add(TeacherAvailability(teacher_id=SHARED_TEACHER_ID, weekday=0, index_in_day=1, available=False))
+    db.commit()
+    monkeypatch.setattr(timetable_repair, "try_teacher_locks", busy)
+
+    statuses = repair_or_regenerate(db, [class_id])
+
+    assert statuses == {class_id: REPAIR_QUEUED}
+    assert [class_id for class_id, _, _ in published] == [class_id]
+    assert {e.id: (e.subject_id, e.room_id) for e in db.query(TimetableEntry)} == entries
+    monkeypatch.undo()
+    assert repair_or_regenerate(db, [class_id]) == {class_id: REPAIR_CHANGED}
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import itertools
+import random
+
+import pytest
+
+from timetable_shared.services.timetable_rooms import assign_rooms, min_cost_assignment
+from timetable_shared.services.timetable_snapshot import load_school_snapshot
+
+from conftest import build_school
+
+
+def _cost(costs, columns):
+    return sum(costs[i][j] for i, j in enumerate(columns))
+
+
+def _brute_force(costs):
+    m = len(costs[0])
+    return min(_cost(costs, columns) for columns in itertools.permutations(range(m), len(costs)))
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    n = rng.randint(1, 5)
+    m = rng.randint(n, 6)
+    costs = [[rng.choice([0.0, 1.0, 2.5, 7.0, 1_000.0, rng.random() * 50]) for _ in range(m)] for _ in range(n)]
+
+    columns = min_cost_assignment(costs)
+
+    assert len(columns) == n and len(set(columns)) == n
+    assert all(0 <= j < m for j in columns)
+    assert _cost(costs, columns) == pytest.approx(_brute_force(costs))
+
+
+def test_empty_and_trivial():
+    assert min_cost_assignment([]) == []
+    assert min_cost_assignment([[5.0, 1.0, 3.0]]) == [1]
+    assert min_cost_assignment([[1.0, 2.0], [1.0, 100.0]]) == [1, 0]
+
+
+def test_rooms_are_not_shared_within_a_timeslot(db):
+    class_ids = build_school(db, classes=3, rooms=4)
+    school = load_school_snapshot(db, class_ids)
+    first_slot = school.timeslots[0]
+    # Outside the solve, rooms 1 and 2 are taken at the first slot
+    rooms = sorted(r.id for r in school.classes[class_ids[0]].rooms)
+    occupied = {first_slot.id: set(rooms[:2])}
+    placements = {
+        cid: {ts.id: snapshot.curriculum[0].subject_id for ts in school.timeslots}
+        for cid, snapshot in school.classes.items()
+    }
+
+    assignments, conflicts = assign_rooms(
+        school.classes, placements, timeslots=school.timeslots, occupied_rooms=occupied, room_usage={}
+    )
+
+    for ts in school.timeslots:
+        used = [assignments[cid][ts.id][1] for cid in class_ids]
+        taken = [room_id for room_id in used if room_id is not None]
+        assert len(taken) == len(set(taken))
+        assert not set(taken) & occupied.get(ts.id, set())
+    # Two free rooms for three classes at the first slot: one class goes without
+    assert sum(assignments[cid][first_slot.id][1] is None for cid in class_ids) == 1
+    assert sum(len(c) for c in conflicts.values()) == 1
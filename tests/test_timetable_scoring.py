@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from timetable_shared.services import timetable_scoring
+from timetable_shared.services.timetable_persistence import persist_assignments
+from timetable_shared.services.timetable_scoring import (
+    build_timetable_array,
+    class_terms,
+    load_timetable_array,
+    timetable_terms,
+)
+from timetable_shared.services.timetable_snapshot import load_school_snapshot
+
+from conftest import build_school
+
+pytest.importorskip("numpy")
+
+
+def _random_school(db, seed):
+    """Three classes with random (clashing, gappy) timetables, one class left outside the set."""
+    rng = random.Random(seed)
+    class_ids = build_school(db, classes=4)
+    school = load_school_snapshot(db, class_ids)
+    rooms = sorted(r.id for r in school.classes[class_ids[0]].rooms)
+    assignments = {
+        cid: {
+            ts.id: (rng.choice(snapshot.curriculum).subject_id, rng.choice(rooms + [None]))
+            for ts in school.timeslots
+            if rng.random() < 0.8
+        }
+        for cid, snapshot in school.classes.items()
+    }
+    return school, assignments
+
+
+def _terms(school, assignments, outside):
+    inside = {cid: a for cid, a in assignments.items() if cid != outside}
+    outside_teachers, outside_rooms = {}, {}
+    teacher_of = {c.subject_id: c.teacher_id for c in school.classes[outside].curriculum}
+    for ts_id, (subject_id, room_id) in assignments[outside].items():
+        outside_teachers.setdefault(ts_id, set()).add(teacher_of[subject_id])
+        if room_id is not None:
+            outside_rooms.setdefault(ts_id, set()).add(room_id)
+    arr = build_timetable_array(
+        school.classes,
+        inside,
+        timeslots=school.timeslots,
+        occupied_teachers=outside_teachers,
+        occupied_rooms=outside_rooms,
+    )
+    return arr, timetable_terms(arr, max_same_subject_per_day=2), class_terms(arr, max_same_subject_per_day=2)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_numpy_and_pure_python_terms_match(db, monkeypatch, seed):
+    school, assignments = _random_school(db, seed)
+    outside = max(assignments)
+
+    arr, terms, per_class = _terms(school, assignments, outside)
+    assert arr.vectorized
+    monkeypatch.setattr(timetable_scoring, "np", None)
+    plain, plain_terms, plain_per_class = _terms(school, assignments, outside)
+
+    assert isinstance(plain.subjects, list)
+    assert plain_terms == pytest.approx(terms)
+    assert plain_per_class == per_class
+    assert terms["teacher_conflicts"] > 0 and terms["room_conflicts"] > 0
+
+
+def test_terms_of_a_known_timetable(db):
+    class_ids = build_school(db, classes=2)
+    school = load_school_snapshot(db, class_ids)
+    mat = next(c.subject_id for c in school.classes[class_ids[0]].curriculum if c.teacher_id == 1)
+    monday = {ts.index_in_day: ts.id for ts in school.timeslots if ts.weekday == 0}
+    # Class 1: MAT at hours 1, 3, 4 and 6 on Monday; class 2: MAT at hour 3 (the shared teacher clashes)
+    assignments = {
+        class_ids[0]: {monday[i]: (mat, None) for i in (1, 3, 4, 6)},
+        class_ids[1]: {monday[3]: (mat, None)},
+    }
+
+    arr = build_timetable_array(school.classes, assignments, timeslots=school.timeslots)
+    terms = timetable_terms(arr, max_same_subject_per_day=2)
+
+    assert terms["late_hours"] == 1
+    assert terms["student_gaps"] == 2
+    assert terms["subject_day_overflow"] == 2
+    assert terms["teacher_conflicts"] == 1
+    assert class_terms(arr)[class_ids[0]] == {"late_hours": 1, "student_gaps": 2}
+
+
+def test_stored_timetables_load_into_the_same_array(db):
+    school, assignments = _random_school(db, 1)
+    # The stored cells need not satisfy the hard constraints
+    persist_assignments(db, assignments)
+
+    loaded = load_timetable_array(db)
+    built = build_timetable_array(school.classes, assignments, timeslots=school.timeslots)
+
+    assert loaded.class_ids == built.class_ids
+    for layer in ("subjects", "teachers", "rooms"):
+        assert (getattr(loaded, layer) == getattr(built, layer)).all()
+    assert timetable_terms(loaded) == pytest.approx(timetable_terms(built))
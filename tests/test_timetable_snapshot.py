@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from timetable_shared.models import (
+    Curriculum,
+    Room,
+    RoomAvailability,
+    SchoolClass,
+    TeacherAvailability,
+    TimeSlot,
+    TimetableEntry,
+    UserProfile,
+)
+from timetable_shared.services.timetable_generator import generate_timetable_for_class
+from timetable_shared.services.timetable_snapshot import load_generation_snapshot
+
+from conftest import SHARED_TEACHER_ID, build_school
+
+
+def test_snapshot_matches_the_database(db):
+    class_id, other_id = build_school(db, classes=2)
+    db.add(Room(name="Cabinet", capacity=5))
+    db.add_all(UserProfile(username=f"student{i}", class_id=class_id) for i in range(10))
+    db.add(TeacherAvailability(teacher_id=SHARED_TEACHER_ID, weekday=1, index_in_day=3, available=False))
+    db.add(TeacherAvailability(teacher_id=SHARED_TEACHER_ID, weekday=1, index_in_day=4, available=True))
+    first_room = db.query(Room).order_by(Room.id).first()
+    db.add(RoomAvailability(room_id=first_room.id, weekday=0, index_in_day=1, available=False))
+    slots = db.query(TimeSlot).order_by(TimeSlot.id).all()
+    other_subject = db.query(Curriculum.subject_id).filter_by(class_id=other_id).first()[0]
+    # Entries of another class occupy rooms; the class's own entries do not
+    db.add_all(
+        TimetableEntry(class_id=cid, subject_id=other_subject, timeslot_id=ts.id, room_id=first_room.id)
+        for cid, ts in ((other_id, slots[0]), (other_id, slots[1]), (class_id, slots[2]))
+    )
+    db.commit()
+
+    snapshot = load_generation_snapshot(db, class_id)
+
+    assert {(c.subject_id, c.hours_per_week, c.teacher_id) for c in snapshot.curriculum} == {
+        (c.subject_id, c.hours_per_week, c.teacher_id) for c in db.query(Curriculum).filter_by(class_id=class_id)
+    }
+    assert [(ts.id, ts.weekday, ts.index_in_day) for ts in sorted(snapshot.timeslots, key=lambda ts: ts.id)] == [
+        (ts.id, ts.weekday, ts.index_in_day) for ts in slots
+    ]
+    assert snapshot.student_count == 10
+    assert "Cabinet" not in {r.name for r in snapshot.rooms}  # too small for ten students
+    assert len(snapshot.rooms) == 4
+    assert snapshot.occupied_rooms == {slots[0].id: {first_room.id}, slots[1].id: {first_room.id}}
+    assert snapshot.room_usage == {first_room.id: 2}
+    assert not snapshot.is_teacher_available(SHARED_TEACHER_ID, 1, 3)
+    assert snapshot.is_teacher_available(SHARED_TEACHER_ID, 1, 4)
+    assert snapshot.is_teacher_available(SHARED_TEACHER_ID, 2, 3)
+    assert not snapshot.is_room_available(first_room.id, 0, 1)
+    assert snapshot.is_room_available(first_room.id, 0, 2)
+
+
+def test_class_on_its_own_grid_sees_other_grids_by_position(db):
+    standard_id, short_id = build_school(db, classes=2)
+    db.add_all(TimeSlot(grid="short", weekday=d, index_in_day=i) for d in range(5) for i in range(1, 7))
+    db.get(SchoolClass, short_id).timeslot_grid = "short"
+    # 30 hours for the 5 x 6 grid
+    db.query(Curriculum).filter_by(class_id=short_id, hours_per_week=9).update({Curriculum.hours_per_week: 4})
+    room = db.query(Room).order_by(Room.id).first()
+    monday_first = db.query(TimeSlot).filter_by(grid="standard", weekday=0, index_in_day=1).one()
+    mat = db.query(Curriculum.subject_id).filter_by(class_id=standard_id, teacher_id=SHARED_TEACHER_ID).scalar()
+    db.add(TimetableEntry(class_id=standard_id, subject_id=mat, timeslot_id=monday_first.id, room_id=room.id))
+    db.commit()
+
+    snapshot = load_generation_snapshot(db, short_id)
+
+    short_slots = {ts.id: ts for ts in db.query(TimeSlot).filter_by(grid="short")}
+    assert snapshot.grid == "short"
+    assert {ts.id for ts in snapshot.timeslots} == set(short_slots)
+    (own_ts_id,) = snapshot.occupied_rooms
+    assert (short_slots[own_ts_id].weekday, short_slots[own_ts_id].index_in_day) == (0, 1)
+    assert snapshot.occupied_rooms[own_ts_id] == {room.id}
+    assert snapshot.occupied_teachers == {own_ts_id: {SHARED_TEACHER_ID}}
+
+    entries = generate_timetable_for_class(db, short_id, seed=1)
+
+    assert len(entries) == 30 and {e.timeslot_id for e in entries} == set(short_slots)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import pickle
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from timetable_shared.models import TeacherAvailability
+from timetable_shared.services.timetable_snapshot import load_generation_snapshot, load_school_snapshot
+from timetable_shared.services.timetable_solver import (
+    STRATEGIES,
+    StopSignal,
+    _build_class_assignment,
+    _ClassTables,
+    get_preferred_timeslots,
+    group_timeslots_by_day,
+    solve_class,
+    solve_multi_start,
+    solve_school,
+)
+
+from conftest import SHARED_TEACHER_ID, build_school
+from test_timetable_csp import assert_valid_placement
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_same_seed_same_timetable(db, strategy):
+    (class_id,) = build_school(db, classes=1)
+    snapshot = load_generation_snapshot(db, class_id)
+
+    first = solve_class(snapshot, strategy=strategy, seed=11)
+    random.seed(0)  # the global random state plays no part
+    second = solve_class(snapshot, strategy=strategy, seed=11)
+
+    assert first.assignments and first.assignments == second.assignments
+
+
+def test_seeded_solves_are_reproducible_in_threads(db):
+    class_ids = build_school(db, classes=2)
+    snapshot = load_generation_snapshot(db, class_ids[0])
+    school = load_school_snapshot(db, class_ids)
+    seeds = list(range(6))
+    expected = {seed: solve_class(snapshot, seed=seed).assignments for seed in seeds}
+    expected_school = solve_school(school, seed=3).assignments
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often, in the middle of the solves
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda seed: solve_class(snapshot, seed=seed).assignments, seeds * 4))
+            school_results = list(pool.map(lambda _: solve_school(school, seed=3).assignments, range(4)))
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert results == [expected[seed] for seed in seeds * 4]
+    assert school_results == [expected_school] * 4
+
+
+def test_multi_start_returns_a_valid_timetable(db):
+    (class_id,) = build_school(db, classes=1)
+    snapshot = load_generation_snapshot(db, class_id)
+
+    outcome = solve_multi_start(
+        solve_class, snapshot=snapshot, workers=2, seed=5, max_attempts=40, wait_for_best=False
+    )
+
+    assert outcome.assignments
+    placement = {ts_id: subject_id for ts_id, (subject_id, _) in outcome.assignments[class_id].items()}
+    assert_valid_placement(snapshot, placement)
+
+
+def test_multi_start_reports_an_explicit_failure(db):
+    (class_id,) = build_school(db, classes=1)
+    snapshot = load_generation_snapshot(db, class_id)
+
+    # Ten MAT hours cannot fit with at most one per day
+    outcome = solve_multi_start(
+        solve_class,
+        snapshot=snapshot,
+        workers=2,
+        seed=5,
+        max_attempts=4,
+        wait_for_best=False,
+        max_same_subject_per_day=1,
+    )
+
+    assert outcome is not None and not outcome.assignments
+    assert outcome.reason and outcome.stats["attempts"] == 4
+
+
+def test_stop_ends_search_and_optimization(db):
+    (class_id,) = build_school(db, classes=1)
+    snapshot = load_generation_snapshot(db, class_id)
+
+    stopped = solve_class(snapshot, seed=1, stop=lambda: True)
+    assert not stopped.assignments and stopped.reason == "stopped after 0 attempts"
+
+    event = threading.Event()
+    timer = threading.Timer(0.2, event.set)
+    timer.start()
+    started = time.monotonic()
+    try:
+        outcome = solve_class(snapshot, seed=1, optimize_seconds=30, stop=StopSignal(event, interval=0))
+    finally:
+        timer.cancel()
+    # The optimizer gave up its 30 s budget and kept its best timetable
+    assert time.monotonic() - started < 5
+    assert outcome.assignments and outcome.score is not None
+
+
+def test_snapshots_and_results_survive_pickling(db):
+    class_ids = build_school(db, classes=2)
+    snapshot = load_generation_snapshot(db, class_ids[0])
+    school = load_school_snapshot(db, class_ids)
+
+    copy = pickle.loads(pickle.dumps(snapshot))
+    result = solve_class(copy, seed=2)
+
+    assert result.assignments == solve_class(snapshot, seed=2).assignments
+    assert pickle.loads(pickle.dumps(result)).assignments == result.assignments
+    school_result = solve_school(pickle.loads(pickle.dumps(school)), seed=2)
+    assert school_result.assignments == solve_school(school, seed=2).assignments
+
+
+def _greedy_reference(snapshot, preferred_slots, taken_teachers, cap, rng):
+    """The greedy pass on plain dicts and lists: first subject of the shuffled pool that fits."""
+    pool = [c for c in snapshot.curriculum for _ in range(c.hours_per_week)]
+    rng.shuffle(pool)
+    per_day = Counter()
+    placement = {}
+    for ts in preferred_slots:
+        for i, item in enumerate(pool):
+            if per_day[ts.weekday, item.subject_id] < cap and (
+                item.teacher_id is None
+                or snapshot.is_teacher_available(item.teacher_id, ts.weekday, ts.index_in_day)
+                and item.teacher_id not in taken_teachers.get(ts.id, ())
+            ):
+                break
+        else:
+            return {}
+        del pool[i]
+        per_day[ts.weekday, item.subject_id] += 1
+        placement[ts.id] = item.subject_id
+    return placement
+
+
+def test_greedy_tables_match_a_dict_reference(db):
+    (class_id,) = build_school(db, classes=1)
+    db.add_all(
+        TeacherAvailability(teacher_id=SHARED_TEACHER_ID, weekday=weekday, index_in_day=1, available=False)
+        for weekday in range(5)
+    )
+    db.commit()
+    snapshot = load_generation_snapshot(db, class_id)
+    preferred_slots = get_preferred_timeslots(group_timeslots_by_day(snapshot.timeslots))
+    taken = {ts.id: {SHARED_TEACHER_ID} for ts in snapshot.timeslots if ts.index_in_day == 7}
+    tables = _ClassTables(snapshot, preferred_slots)
+    allowed = tables.allowed_slots(snapshot, preferred_slots, taken)
+
+    outcomes = []
+    for seed in range(200):
+        placement = _build_class_assignment(
+            tables,
+            preferred_slots,
+            allowed,
+            max_same_subject_per_day=2,
+            stats=Counter(),
+            rng=random.Random(seed),
+        )
+        assert placement == _greedy_reference(snapshot, preferred_slots, taken, 2, random.Random(seed))
+        outcomes.append(bool(placement))
+    # Both dead ends and complete passes were compared
+    assert any(outcomes) and not all(outcomes)